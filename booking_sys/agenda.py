@@ -0,0 +1,156 @@
+"""
+Calendar index of bookings.
+
+Bookings are grouped by day and sorted by time within a day, and
+the days are kept in order, so the bookings of a day are one lookup
+and the bookings of a range of days are a slice found by bisection,
+instead of a scan of all bookings with a list membership test.
+Bookings are also indexed by customer's name and day, so the
+bookings of a customer are one lookup and a duplicate check is
+a membership test. Bookings can be added and removed one by one.
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from booking_sys import validation as valid
+
+
+def _time(booking):
+    """
+    Returns the minute of the day of a booking(int) to sort
+    by, an invalid time goes first.
+    """
+    return valid.minute_of_day(booking["TIME"]) or 0
+
+
+def day_number(day):
+    """
+    Takes in a date(str in dd-mm-yyyy format or date). Returns
+    its ordinal number(int), or None if it is not a valid date.
+    """
+    if isinstance(day, date):
+        return day.toordinal()
+    return valid.day_number(day)
+
+
+class Agenda:
+    """
+    Bookings(dictionaries with DATE, TIME and NAME) by day and by
+    customer. Bookings with an invalid date are left out.
+    """
+    def __init__(self, bookings=()):
+        self._bookings = {}
+        self._names = {}
+        for booking in bookings:
+            day = day_number(booking["DATE"])
+            if day is not None:
+                self._bookings.setdefault(day, []).append(booking)
+                self._names.setdefault(booking["NAME"], {})[day] = booking
+        for day_bookings in self._bookings.values():
+            day_bookings.sort(key=_time)
+        self._days = sorted(self._bookings)
+
+    def __len__(self):
+        return sum(map(len, self._bookings.values()))
+
+    def __iter__(self):
+        return iter(self.between(None, None))
+
+    def on(self, day):
+        """
+        Takes in a date(str or date). Returns bookings of the day
+        sorted by time(list).
+        """
+        return list(self._bookings.get(day_number(day), []))
+
+    def between(self, first, last):
+        """
+        Takes in the first and the last date(str or date,
+        inclusive), None for no limit. Returns bookings of these
+        days sorted by date and time(list).
+        """
+        start = 0 if first is None else bisect_left(self._days,
+                                                    day_number(first))
+        end = (len(self._days) if last is None
+               else bisect_right(self._days, day_number(last)))
+        return [booking for day in self._days[start:end]
+                for booking in self._bookings[day]]
+
+    def select(self, period):
+        """
+        Takes in a period: a date(str or date), a tuple of the first
+        and the last date, a list of dates or None for all days.
+        Returns bookings of the period sorted by date and time(list).
+        """
+        if period is None:
+            return self.between(None, None)
+        if isinstance(period, tuple):
+            return self.between(*period)
+        if isinstance(period, (str, date)):
+            return self.on(period)
+        days = sorted({day_number(day) for day in period} - {None})
+        return [booking for day in days
+                for booking in self._bookings.get(day, [])]
+
+    def of(self, name):
+        """
+        Takes in a customer's name(str). Returns bookings of
+        the customer sorted by date(list).
+        """
+        days = self._names.get(name, {})
+        return [days[day] for day in sorted(days)]
+
+    def has(self, name, day):
+        """
+        Takes in a customer's name(str) and a date(str or date).
+        Checks if the customer has a booking on the day.
+        Returns boolean.
+        """
+        return day_number(day) in self._names.get(name, {})
+
+    def find(self, name, day):
+        """
+        Takes in a customer's name(str) and a date(str or date).
+        Returns the customer's booking on the day or None.
+        """
+        return self._names.get(name, {}).get(day_number(day))
+
+    def add(self, booking):
+        """
+        Adds a booking(dict). Returns False if its date is
+        invalid, True otherwise.
+        """
+        day = day_number(booking["DATE"])
+        if day is None:
+            return False
+        if day not in self._bookings:
+            insort(self._days, day)
+        insort(self._bookings.setdefault(day, []), booking, key=_time)
+        self._names.setdefault(booking["NAME"], {})[day] = booking
+        return True
+
+    def remove(self, name, day):
+        """
+        Takes in a customer's name(str) and a date(str or date).
+        Removes the customer's booking on the day. Returns
+        the booking(dict) or None if there is none.
+        """
+        day = day_number(day)
+        days = self._names.get(name, {})
+        booking = days.get(day)
+        if booking is None:
+            return None
+        day_bookings = self._bookings[day]
+        day_bookings[:] = [item for item in day_bookings
+                           if item is not booking]
+        # another booking of the customer on the day takes its place
+        others = [item for item in day_bookings if item["NAME"] == name]
+        if others:
+            days[day] = others[-1]
+        else:
+            del days[day]
+            if not days:
+                del self._names[name]
+        if not day_bookings:
+            del self._bookings[day]
+            del self._days[bisect_left(self._days, day)]
+        return booking
@@ -2,6 +2,7 @@
 Authorisation.
 """
 import getpass
+from booking_sys.spreadsheet import get_data
 
 
 def check_password(user, password):
@@ -29,15 +30,19 @@ def authorise(user):
     return False
 
 
-def staff_login(data):
+def staff_login(data=None):
     """
     Logs in a member of staff. Takes staff data
     list of dictionaries. Returns user(dict).
+    If data is not passed, it is fetched after the name
+    is entered, so connecting overlaps with typing.
     """
     print("\n\t\tWelcome to Your Booking System!")
     while True:
         entered_name = input("\nEnter your name or enter 'new' "
                              "if you are a new member of staff: ")
+        if data is None:
+            data = get_data("staff")
         import booking_sys.customer as customer
         user = customer.search(entered_name, "NAME", data)
         if user is not None:
@@ -0,0 +1,586 @@
+"""
+Storage backends used by the spreadsheet module.
+
+A backend stores worksheets as lists of rows, the first row
+being the header. Every backend provides the same methods:
+get_values, get_range, get_tail, append_rows, update_cells,
+batch_update, batch_get_values, get_columns, find_rows,
+metadata and revision.
+Rows and columns are counted from 1, like in the spreadsheet.
+SqliteBackend can also answer filtered reads with select().
+"""
+import sqlite3
+import threading
+from itertools import zip_longest
+import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from gspread.utils import (rowcol_to_a1, a1_to_rowcol, absolute_range_name,
+                           fill_gaps)
+from booking_sys.throttle import throttled
+
+
+LAST_COLUMN = "ZZ"
+# tables of SqliteBackend, columns in the order of worksheet columns
+TABLES = {
+    "staff": ("NAME", "PASSWORD", "CONTACT"),
+    "customers": ("NAME", "PHONE", "EMAIL", "BD", "NUM OF BOOKINGS",
+                  "CANCELLED"),
+    "bookings": ("DATE", "TIME", "NAME", "PEOPLE", "CREATED", "CONF",
+                 "CANC"),
+    "events": ("AT", "EVENT", "NAME", "DATE", "CHANGES")}
+# dates are stored as dd-mm-yyyy text, this expression
+# turns them into yyyymmdd, which sorts in date order
+DAY = ('substr("DATE", 7, 4) || substr("DATE", 4, 2) '
+       '|| substr("DATE", 1, 2)')
+# {index name: (table, indexed columns or expressions)}
+INDEXES = {
+    "bookings_day": ("bookings", (DAY, )),
+    "bookings_name_date": ("bookings", ('"NAME"', '"DATE"')),
+    "customers_name": ("customers", ('"NAME"', )),
+    "staff_name": ("staff", ('"NAME"', ))}
+
+
+class GspreadBackend:
+    """
+    Keeps data in Google Spreadsheet. Takes in a function that
+    opens a gspread spreadsheet, it is called once, on the first
+    request. Requests are rate limited and retried, see throttle.
+    """
+    def __init__(self, connect):
+        self.connect = connect
+        self._sheet = None
+        self._lock = threading.RLock()
+        # {title: gspread worksheet}, see worksheet()
+        self._worksheets = {}
+
+    @property
+    def sheet(self):
+        """
+        Returns the opened spreadsheet, connects if needed.
+        """
+        with self._lock:
+            if self._sheet is None:
+                self._sheet = self.connect()
+            return self._sheet
+
+    def worksheet(self, title):
+        """
+        Returns a worksheet handle. All handles are fetched in one
+        request on the first call and fetched again only when
+        a title is missing, e.g. after a tab was added or renamed.
+        """
+        with self._lock:
+            if title not in self._worksheets:
+                self._worksheets = {handle.title: handle
+                                    for handle in self._fetch_worksheets()}
+            try:
+                return self._worksheets[title]
+            except KeyError as error:
+                raise gspread.exceptions.WorksheetNotFound(title) from error
+
+    @throttled
+    def _fetch_worksheets(self):
+        """
+        Returns handles of all worksheets.
+        """
+        return self.sheet.worksheets()
+
+    def metadata(self, worksheet):
+        """
+        Returns a dictionary with id, title, number of rows and
+        number of columns of a worksheet, without a request.
+        """
+        handle = self.worksheet(worksheet)
+        return {"id": handle.id, "title": handle.title,
+                "rows": handle.row_count, "cols": handle.col_count}
+
+    @throttled
+    def revision(self):
+        """
+        Returns the version of the spreadsheet file in Drive(str),
+        it changes with every edit. A small metadata request,
+        no cells are downloaded.
+        """
+        response = self.sheet.client.request(
+            "get", f"{DRIVE_FILES_API_V3_URL}/{self.sheet.id}",
+            params={"fields": "version,modifiedTime",
+                    "supportsAllDrives": True})
+        metadata = response.json()
+        return metadata.get("version") or metadata.get("modifiedTime")
+
+    @throttled
+    def get_values(self, worksheet):
+        """
+        Returns all rows of a worksheet as a list of lists.
+        """
+        return self.worksheet(worksheet).get_values()
+
+    @throttled
+    def batch_get_values(self, worksheets):
+        """
+        Returns all rows of several worksheets fetched in one
+        request as a dictionary {worksheet: list of lists}.
+        """
+        response = self.sheet.values_batch_get(
+            [absolute_range_name(worksheet) for worksheet in worksheets])
+        return {worksheet: fill_gaps(value_range.get("values", []))
+                for (worksheet, value_range)
+                in zip(worksheets, response["valueRanges"])}
+
+    @throttled
+    def get_columns(self, worksheet, cols):
+        """
+        Returns values of columns(list of column numbers) of every
+        row, the header first, as a list of lists. Only these
+        columns are downloaded, in one request.
+        """
+        letters = [rowcol_to_a1(1, col)[:-1] for col in cols]
+        response = self.sheet.values_batch_get(
+            [absolute_range_name(worksheet, f"{letter}:{letter}")
+             for letter in letters], params={"majorDimension": "COLUMNS"})
+        columns = [(value_range.get("values") or [[]])[0]
+                   for value_range in response["valueRanges"]]
+        return [list(row) for row in zip_longest(*columns, fillvalue="")]
+
+    @throttled
+    def get_range(self, worksheet, first, last=None):
+        """
+        Returns rows from first to last(inclusive) as a list
+        of lists. Reads to the end of a worksheet if last is None.
+        """
+        last = "" if last is None else last
+        return self.worksheet(worksheet).get_values(
+            f"A{first}:{LAST_COLUMN}{last}")
+
+    @throttled
+    def get_tail(self, worksheet, first):
+        """
+        Returns the header and rows from first to the end of
+        a worksheet, fetched in one request, as a tuple.
+        """
+        response = self.sheet.values_batch_get(
+            [absolute_range_name(worksheet, f"A1:{LAST_COLUMN}1"),
+             absolute_range_name(worksheet, f"A{first}:{LAST_COLUMN}")])
+        (header, tail) = [value_range.get("values", [])
+                          for value_range in response["valueRanges"]]
+        header = header[0] if header else []
+        # empty cells at the end of rows are left out of the response
+        return (header, fill_gaps(tail, cols=len(header)) if tail else tail)
+
+    def append_rows(self, worksheet, rows):
+        """
+        Appends rows(list of lists) to the end of a worksheet.
+        Returns the number of the first appended row.
+        """
+        # the handle is fetched first, its request is retried freely
+        return self._append_rows(self.worksheet(worksheet), rows)
+
+    @throttled(idempotent=False)
+    def _append_rows(self, handle, rows):
+        """
+        Appends rows to a worksheet handle. Not retried after
+        errors which may come after the rows were appended.
+        Returns the number of the first appended row.
+        """
+        response = handle.append_rows(rows)
+        updated = response["updates"]["updatedRange"]
+        return a1_to_rowcol(updated.split("!")[-1].split(":")[0])[0]
+
+    def update_cells(self, worksheet, cells):
+        """
+        Writes new values to cells in one request. Takes in a list
+        of (row, col, value) tuples. Values are written as text.
+        """
+        self.batch_update({worksheet: cells})
+
+    @throttled
+    def batch_update(self, updates):
+        """
+        Writes cells of several worksheets in one request. Takes
+        in a dictionary {worksheet: list of (row, col, value)}.
+        """
+        data = [{"range": absolute_range_name(worksheet,
+                                              rowcol_to_a1(row, col)),
+                 "values": [["'" + str(value)]]}
+                for (worksheet, cells) in updates.items()
+                for (row, col, value) in cells]
+        self.sheet.values_batch_update(
+            body={"valueInputOption": "USER_ENTERED", "data": data})
+
+    @throttled
+    def find_rows(self, worksheet, query):
+        """
+        Returns numbers of rows where every column of query(dict)
+        has the requested value.
+        """
+        sheet = self.worksheet(worksheet)
+        header = sheet.row_values(1)
+        (first, *others) = query.items()
+        cells = sheet.findall(first[1], in_column=header.index(first[0]) + 1)
+        rows = [cell.row for cell in cells]
+        if not others or not rows:
+            return rows
+        # one request for all candidate rows instead of one per row
+        values = sheet.batch_get([f"A{row}:{LAST_COLUMN}{row}"
+                                  for row in rows])
+        return [row for (row, value) in zip(rows, values)
+                if value and _matches(header, value[0], others)]
+
+
+class MemoryBackend:
+    """
+    Keeps data in process memory. Takes in a dictionary
+    {worksheet name: list of rows}. Used for tests, benchmarks
+    and working offline.
+    """
+    def __init__(self, data=None):
+        self.data = {}
+        # counts writes, see revision()
+        self.version = 0
+        for (name, rows) in (data or {}).items():
+            self.data[name] = [_to_text(row) for row in rows]
+
+    def revision(self):
+        """
+        Returns the number of writes so far(str), like
+        the version of a spreadsheet file in Drive.
+        """
+        return str(self.version)
+
+    def _rows(self, worksheet):
+        try:
+            return self.data[worksheet]
+        except KeyError as error:
+            raise gspread.exceptions.WorksheetNotFound(worksheet) from error
+
+    def get_values(self, worksheet):
+        """
+        Returns all rows of a worksheet as a list of lists.
+        """
+        return [list(row) for row in self._rows(worksheet)]
+
+    def batch_get_values(self, worksheets):
+        """
+        Returns all rows of several worksheets as a dictionary
+        {worksheet: list of lists}.
+        """
+        return {worksheet: self.get_values(worksheet)
+                for worksheet in worksheets}
+
+    def get_columns(self, worksheet, cols):
+        """
+        Returns values of columns(list of column numbers) of every
+        row, the header first, as a list of lists.
+        """
+        return [[row[col - 1] if col <= len(row) else "" for col in cols]
+                for row in self._rows(worksheet)]
+
+    def get_range(self, worksheet, first, last=None):
+        """
+        Returns rows from first to last(inclusive) as a list
+        of lists. Reads to the end of a worksheet if last is None.
+        """
+        rows = self._rows(worksheet)[first - 1:last]
+        return [list(row) for row in rows]
+
+    def get_tail(self, worksheet, first):
+        """
+        Returns the header and rows from first to the end
+        of a worksheet as a tuple.
+        """
+        rows = self._rows(worksheet)
+        header = list(rows[0]) if rows else []
+        return (header, [list(row) for row in rows[first - 1:]])
+
+    def append_rows(self, worksheet, rows):
+        """
+        Appends rows(list of lists) to the end of a worksheet.
+        Returns the number of the first appended row.
+        """
+        values = self._rows(worksheet)
+        values.extend(_to_text(row) for row in rows)
+        self.version += 1
+        return len(values) - len(rows) + 1
+
+    def metadata(self, worksheet):
+        """
+        Returns a dictionary with id, title, number of rows and
+        number of columns of a worksheet.
+        """
+        rows = self._rows(worksheet)
+        return {"id": list(self.data).index(worksheet), "title": worksheet,
+                "rows": len(rows), "cols": max(map(len, rows), default=0)}
+
+    def update_cells(self, worksheet, cells):
+        """
+        Writes new values to cells. Takes in a list
+        of (row, col, value) tuples.
+        """
+        rows = self._rows(worksheet)
+        self.version += 1
+        for (row, col, value) in cells:
+            while len(rows) < row:
+                rows.append([])
+            line = rows[row - 1]
+            line.extend([""] * (col - len(line)))
+            line[col - 1] = str(value)
+
+    def batch_update(self, updates):
+        """
+        Writes cells of several worksheets. Takes in a dictionary
+        {worksheet: list of (row, col, value)}.
+        """
+        for worksheet in updates:
+            self._rows(worksheet)
+        for (worksheet, cells) in updates.items():
+            self.update_cells(worksheet, cells)
+
+    def find_rows(self, worksheet, query):
+        """
+        Returns numbers of rows where every column of query(dict)
+        has the requested value.
+        """
+        (header, *rows) = self._rows(worksheet)
+        return [num for (num, row) in enumerate(rows, start=2)
+                if _matches(header, row, query.items())]
+
+
+class SqliteBackend:
+    """
+    Keeps data in a SQLite database file, one table per worksheet
+    (see TABLES) with indexes for frequent lookups (see INDEXES).
+    The database is opened on the first request, in WAL mode, so
+    several terminals can read while one writes. Row numbers
+    are kept in the "row" column: the header is row 1.
+    """
+    def __init__(self, path, tables=None):
+        self.path = path
+        self.tables = dict(TABLES if tables is None else tables)
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        """
+        Returns the database connection, opens the database
+        and creates missing tables and indexes if needed.
+        """
+        with self._lock:
+            if self._conn is None:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    for (table, columns) in self.tables.items():
+                        names = ", ".join(f'{_quote(name)} TEXT NOT NULL '
+                                          "DEFAULT ''" for name in columns)
+                        conn.execute(f"CREATE TABLE IF NOT EXISTS "
+                                     f"{_quote(table)} ("
+                                     f'"row" INTEGER PRIMARY KEY, {names})')
+                    for (index, (table, keys)) in INDEXES.items():
+                        if table in self.tables:
+                            conn.execute(f"CREATE INDEX IF NOT EXISTS "
+                                         f"{_quote(index)} ON "
+                                         f"{_quote(table)} "
+                                         f"({', '.join(keys)})")
+                self._conn = conn
+            return self._conn
+
+    def revision(self):
+        """
+        Returns a marker(str) which changes with every write to
+        the database, made by this or another connection.
+        """
+        with self._lock:
+            (version, ) = self.conn.execute(
+                "PRAGMA data_version").fetchone()
+            return f"{version}.{self.conn.total_changes}"
+
+    def _columns(self, worksheet):
+        try:
+            return self.tables[worksheet]
+        except KeyError as error:
+            raise gspread.exceptions.WorksheetNotFound(worksheet) from error
+
+    def _select(self, worksheet, where="", params=(), names=None):
+        """
+        Returns rows(list of lists) of a table which match
+        an SQL condition, in the order of row numbers. Takes
+        in names of columns to return, all if None.
+        """
+        if names is None:
+            names = self._columns(worksheet)
+        columns = ", ".join(map(_quote, names))
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT {columns} FROM {_quote(worksheet)} {where} "
+                'ORDER BY "row"', params)
+            return [list(row) for row in cursor]
+
+    def get_values(self, worksheet):
+        """
+        Returns all rows of a worksheet as a list of lists.
+        """
+        return [list(self._columns(worksheet))] + self._select(worksheet)
+
+    def batch_get_values(self, worksheets):
+        """
+        Returns all rows of several worksheets as a dictionary
+        {worksheet: list of lists}.
+        """
+        return {worksheet: self.get_values(worksheet)
+                for worksheet in worksheets}
+
+    def get_columns(self, worksheet, cols):
+        """
+        Returns values of columns(list of column numbers) of every
+        row, the header first, as a list of lists.
+        """
+        columns = self._columns(worksheet)
+        names = [columns[col - 1] for col in cols]
+        return [names] + self._select(worksheet, names=names)
+
+    def get_range(self, worksheet, first, last=None):
+        """
+        Returns rows from first to last(inclusive) as a list
+        of lists. Reads to the end of a worksheet if last is None.
+        """
+        header = [list(self._columns(worksheet))] if first <= 1 else []
+        if last is None:
+            rows = self._select(worksheet, 'WHERE "row" >= ?', (first, ))
+        else:
+            rows = self._select(worksheet, 'WHERE "row" BETWEEN ? AND ?',
+                                (first, last))
+        return header + rows
+
+    def get_tail(self, worksheet, first):
+        """
+        Returns the header and rows from first to the end
+        of a worksheet as a tuple.
+        """
+        return (list(self._columns(worksheet)),
+                self._select(worksheet, 'WHERE "row" >= ?', (first, )))
+
+    def append_rows(self, worksheet, rows):
+        """
+        Appends rows(list of lists) to the end of a worksheet.
+        Returns the number of the first appended row.
+        """
+        columns = self._columns(worksheet)
+        with self._lock, self.conn as conn:
+            (last, ) = conn.execute(
+                f'SELECT MAX("row") FROM {_quote(worksheet)}').fetchone()
+            first = (last or 1) + 1
+            conn.executemany(
+                f"INSERT INTO {_quote(worksheet)} "
+                f'("row", {", ".join(map(_quote, columns))}) '
+                f"VALUES (?{', ?' * len(columns)})",
+                [[num] + _to_text(row)[:len(columns)]
+                 + [""] * (len(columns) - len(row))
+                 for (num, row) in enumerate(rows, start=first)])
+        return first
+
+    def metadata(self, worksheet):
+        """
+        Returns a dictionary with id, title, number of rows and
+        number of columns of a worksheet.
+        """
+        columns = self._columns(worksheet)
+        with self._lock:
+            (count, ) = self.conn.execute(
+                f"SELECT COUNT(*) FROM {_quote(worksheet)}").fetchone()
+        return {"id": list(self.tables).index(worksheet), "title": worksheet,
+                "rows": count + 1, "cols": len(columns)}
+
+    def update_cells(self, worksheet, cells):
+        """
+        Writes new values to cells. Takes in a list
+        of (row, col, value) tuples.
+        """
+        self.batch_update({worksheet: cells})
+
+    def batch_update(self, updates):
+        """
+        Writes cells of several worksheets in one transaction.
+        Takes in a dictionary {worksheet: list of (row, col, value)}.
+        Nothing is written if one of the cells does not exist.
+        """
+        statements = []
+        for (worksheet, cells) in updates.items():
+            columns = self._columns(worksheet)
+            for (row, col, value) in cells:
+                if row < 2 or not 1 <= col <= len(columns):
+                    raise gspread.exceptions.GSpreadException(
+                        f"{worksheet} has no cell ({row}, {col})")
+                statements.append(
+                    (f"UPDATE {_quote(worksheet)} SET "
+                     f'{_quote(columns[col - 1])} = ? WHERE "row" = ?',
+                     (str(value), row)))
+        with self._lock, self.conn as conn:
+            for (statement, params) in statements:
+                conn.execute(statement, params)
+
+    def find_rows(self, worksheet, query):
+        """
+        Returns numbers of rows where every column of query(dict)
+        has the requested value.
+        """
+        (where, params) = self._where(worksheet, query)
+        with self._lock:
+            cursor = self.conn.execute(
+                f'SELECT "row" FROM {_quote(worksheet)} {where} '
+                'ORDER BY "row"', params)
+            return [row for (row, ) in cursor]
+
+    def select(self, worksheet, query=None, since=None):
+        """
+        Returns the header and rows(list of lists) where every column
+        of query(dict) has the requested value and DATE is not before
+        since(date), answered with indexes.
+        """
+        (where, params) = self._where(worksheet, query or {})
+        if since is not None:
+            where += (" AND " if where else "WHERE ") + f"{DAY} >= ?"
+            params += (since.strftime("%Y%m%d"), )
+        return ([list(self._columns(worksheet))]
+                + self._select(worksheet, where, params))
+
+    def _where(self, worksheet, query):
+        """
+        Returns an SQL condition and its parameters, which
+        matches rows with all values of query(dict).
+        """
+        columns = self._columns(worksheet)
+        for name in query:
+            if name not in columns:
+                raise gspread.exceptions.GSpreadException(
+                    f"{worksheet} has no column {name}")
+        where = " AND ".join(f"{_quote(name)} = ?" for name in query)
+        return (f"WHERE {where}" if where else "",
+                tuple(str(value) for value in query.values()))
+
+
+def _quote(name):
+    """
+    Returns a table or column name quoted for SQL.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _to_text(row):
+    """
+    Converts all values of a row to strings, the way
+    the spreadsheet returns them.
+    """
+    return [str(value) for value in row]
+
+
+def _matches(header, row, conditions):
+    """
+    Checks if a row(list) has all values of conditions
+    ((column, value) pairs). Returns boolean.
+    """
+    for (column, value) in conditions:
+        col = header.index(column)
+        if col >= len(row) or row[col] != value:
+            return False
+    return True
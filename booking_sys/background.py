@@ -0,0 +1,88 @@
+"""
+Background threads repeating a task, used by the journal, mirror
+and replica modules, and errors of database requests.
+
+The state of a thread is a dictionary with the "thread", a "stop"
+event, the last "error" and fields of the module using it.
+"""
+import sqlite3
+import threading
+import time
+import gspread
+import requests
+from google.auth.exceptions import GoogleAuthError
+
+
+# errors of database requests, raised after retries run out
+DB_ERRORS = (gspread.exceptions.GSpreadException,
+             requests.exceptions.RequestException, sqlite3.Error)
+# errors of requests which may connect first: reading
+# credentials and getting a token
+CONNECT_ERRORS = DB_ERRORS + (OSError, ValueError, GoogleAuthError)
+
+
+def new_state(**fields):
+    """
+    Returns the state(dict) of a thread which is not started,
+    with other fields(keyword arguments) of the caller.
+    """
+    return {"thread": None, "stop": threading.Event(), "error": None,
+            **fields}
+
+
+def start(state, task, interval, at_once=False, needed=None,
+          errors=(), done=None):
+    """
+    Starts a background thread calling task() every interval
+    seconds, the first time at once if at_once is True. It ends
+    when needed() returns False, if given. Errors(tuple of types)
+    raised by task() are stored in state and the thread goes on,
+    the time of a call without an error is stored under done(str).
+    Does nothing if the thread is already running. Returns the
+    thread.
+    """
+    thread = state["thread"]
+    if thread is not None and thread.is_alive():
+        return thread
+    state["stop"].clear()
+
+    def run():
+        first = at_once
+        while ((needed is None or needed())
+               and (first or not state["stop"].wait(interval))):
+            first = False
+            try:
+                task()
+            except errors as error:
+                # the next call may succeed
+                state["error"] = str(error)
+            else:
+                if errors:
+                    state["error"] = None
+                if done:
+                    state[done] = time.time()
+
+    thread = threading.Thread(target=run, daemon=True)
+    state["thread"] = thread
+    thread.start()
+    return thread
+
+
+def is_running(state):
+    """
+    Checks if the thread of state is running and not asked
+    to stop. Returns boolean.
+    """
+    thread = state["thread"]
+    return (thread is not None and thread.is_alive()
+            and not state["stop"].is_set())
+
+
+def stop(state):
+    """
+    Stops the thread of state and waits for it.
+    """
+    state["stop"].set()
+    thread = state["thread"]
+    if thread is not None:
+        thread.join()
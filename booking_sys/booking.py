@@ -2,8 +2,14 @@
 Includes bookings specific functions.
 """
 import re
-from datetime import datetime, date, timedelta
-from booking_sys.spreadsheet import get_data, update_worksheet, update_data
+from datetime import date, timedelta
+from booking_sys.spreadsheet import (get_data, get_columns, log_event,
+                                     log_events,
+                                     update_data, batch, new_row, as_dict,
+                                     stale_note, changes_since, schema)
+from booking_sys import events
+from booking_sys.agenda import Agenda
+from booking_sys.capacity import Availability, is_limited
 from booking_sys.customer import find_customer, get_customer, search
 from booking_sys import validation as valid
 from booking_sys.decorators import pretty_print, loop_menu_qx
@@ -25,12 +31,19 @@ def active(data):
     """
     Filters out past and cancelled bookings.
     Takes in a list of dictionaries as an argument.
-    Returns a list of dictionaries.
+    Returns a list of dictionaries. Bookings with an invalid
+    date are reported and left out.
     """
+    first = date.today().toordinal()
     try:
-        filtered = [item for item in data if
-                    (valid.to_date(item["DATE"]) >= date.today()) and
-                    (item["CANC"] != "yes")]
+        filtered = []
+        for item in data:
+            day = valid.day_number(item["DATE"])
+            if day is None:
+                print(f"Booking of {item.get('NAME')} has an invalid "
+                      f"date: '{item['DATE']}'.")
+            elif day >= first and item["CANC"] != "yes":
+                filtered.append(item)
         return filtered
     except (TypeError, ValueError):
         print(f"{data} is {type(data)}. Argument should be a list.")
@@ -49,21 +62,110 @@ def confirmed(booking):
         print(f"{booking} is {type(booking)}. Argument should be a dict.")
 
 
+# active bookings by day and by customer, see calendar()
+CALENDAR = {"mark": None, "day": None, "agenda": None}
+# {(day, name): Availability} built from the agenda of calendar()
+# at its mark, see availability()
+AVAILABILITY = {"mark": None, "agenda": None, "days": {}}
+
+
+def _apply(agenda, event):
+    """
+    Applies a logged event(see events module) to an agenda of
+    active bookings, like events.fold() applies it to rows.
+    Returns False if the agenda has to be built again instead.
+    """
+    changes = events.changes_of(event)
+    (name, day) = event[2:4]
+    if event[1] == events.CREATED:
+        if not agenda.has(name, day):  # e.g. already read with the rows
+            booking = {column: str(changes.get(column, ""))
+                       for column in schema("bookings")["columns"]}
+            if active([booking]):
+                agenda.add(booking)
+        return True
+    booking = agenda.remove(name, day)
+    if booking is None:
+        # a past or cancelled booking stays inactive unless rescheduled
+        return event[1] in (events.CONFIRMED, events.CANCELLED)
+    for (column, value) in changes.items():
+        if column in booking:
+            booking[column] = str(value)
+    if active([booking]):
+        agenda.add(booking)
+    return True
+
+
+def calendar():
+    """
+    Returns an agenda of active bookings(see agenda module).
+    Bookings created, rescheduled or cancelled since the last call
+    are applied to it one by one. It is built again from all
+    bookings only when they have changed otherwise, e.g. they
+    were written back by compaction, or on a new day.
+    """
+    (logged, mark) = changes_since("bookings", CALENDAR["mark"])
+    agenda = CALENDAR["agenda"]
+    if (logged is None or CALENDAR["day"] != date.today()
+            or not all(_apply(agenda, event) for event in logged)):
+        bookings = active(get_data("bookings", since=date.today()))
+        agenda = Agenda(bookings or [])
+    CALENDAR.update(mark=mark, day=date.today(), agenda=agenda)
+    return agenda
+
+
 def cust_bookings(name):
     """
     Selects all active bookings of a customer.
     Takes in a customer's name(str) and returns a
-    list of dictionaries.
+    list of dictionaries sorted by date.
+    """
+    try:
+        return calendar().of(name)
+    except TypeError:
+        return []  # not a name
+
+
+def _same_mark(mark, other):
+    """
+    Checks if two marks returned by changes_since() are the same
+    and known. Returns boolean.
+    """
+    return (mark is not None and other is not None and mark[0] == other[0]
+            and mark[1] is other[1] and mark[2] == other[2])
+
+
+def availability(day, name=None):
+    """
+    Takes in a date(str) and a customer's name(str) whose booking
+    on the day is being changed, so it is left out. Returns
+    seats and tables taken on the day(see capacity module). It is
+    counted again only when bookings have changed since.
     """
-    bookings = get_data("bookings")
-    return [item for item in active(bookings) if item["NAME"] == name]
+    return _availability(calendar(), day, name)
+
+
+def _availability(agenda, day, name=None):
+    """
+    Returns seats and tables taken on the day like availability(),
+    takes in the agenda just returned by calendar().
+    """
+    if (agenda is not AVAILABILITY["agenda"]
+            or not _same_mark(CALENDAR["mark"], AVAILABILITY["mark"])):
+        AVAILABILITY.update(mark=CALENDAR["mark"], agenda=agenda, days={})
+    days = AVAILABILITY["days"]
+    if (day, name) not in days:
+        days[(day, name)] = Availability(item for item in agenda.on(day)
+                                         if item["NAME"] != name)
+    return days[(day, name)]
 
 
 @loop_menu_qx("\t",
               "x - <== ",
               "press 1 - View bookings\n\t"
               "press 2 - Add a booking\n\t"
-              "press 3 - Edit bookings\n\t",
+              "press 3 - Edit bookings\n\t"
+              "press 4 - Add recurring bookings\n\t",
               "Invalid input. Please, use options above.")
 def bookings_menu(*args):
     """
@@ -80,6 +182,11 @@ def bookings_menu(*args):
         return new_booking(user, customer)
     if user_input == "3":
         return edit_bookings()
+    if user_input == "4":
+        customer = find_customer()
+        if customer in [None, "q", "x"]:
+            return customer
+        return recurring_booking(user, customer)
     return False  # for invalid input
 
 
@@ -97,22 +204,19 @@ def view_bookings_menu(*args):
     argument.
     """
     (user_input, ) = args
-    bookings_data = active(get_data("bookings"))
+    bookings_data = calendar()
     # time periods
-    tomorrow = dd_mm_yyyy(str(date.today() + timedelta(days=1)))
-    week = [today]
-    for i in range(1, 7):
-        week.append(dd_mm_yyyy(str(date.today() + timedelta(days=i))))
-    all_time = [dct['DATE'] for dct in bookings_data]
+    tomorrow = date.today() + timedelta(days=1)
+    week = (date.today(), date.today() + timedelta(days=6))
 
     if user_input == "1":
-        print_bookings(bookings_data, today, "today")
+        print_bookings(bookings_data, date.today(), "today")
     elif user_input == "2":
         print_bookings(bookings_data, tomorrow, "tomorrow")
     elif user_input == "3":
         print_bookings(bookings_data, week, "the upcoming week")
     elif user_input == "4":
-        print_bookings(bookings_data, all_time, "all time")
+        print_bookings(bookings_data, None, "all time")
     else:
         return False  # for invalid input
     return True
@@ -124,16 +228,16 @@ def view_bookings_menu(*args):
 def print_bookings(data, period, string):
     """
     Selects bookings data out of given range and prints it.
-    Takes in data(list of dictionaries), time range(str) and
-    a string to name it in the print output.
-    """
-    # filter booking for the period
-    bookings = [bkng for bkng in data if
-                (bkng["DATE"] == period or
-                 bkng["DATE"] in period)]
-    bookings.sort(key=lambda booking:
-                  (datetime.strptime(booking["DATE"], "%d-%m-%Y"),
-                   datetime.strptime(booking['TIME'], '%H:%M')))
+    Takes in data(list of dictionaries or an agenda), time range
+    (a date, a list of dates, a tuple of the first and the last
+    date or None for all, see Agenda.select) and a string to name
+    it in the print output.
+    """
+    agenda = data if isinstance(data, Agenda) else Agenda(data)
+    bookings = agenda.select(period)
+    note = stale_note("bookings")
+    if note:
+        print(note)
     print(f"\tYou have {len(bookings)} booking(s) for {string}:\n")
 
     for item in bookings:
@@ -163,7 +267,7 @@ def new_date(*args):
     valid_date = valid.date_input(user_input)
     duplicates = has_duplicates(valid_date, customer["NAME"])
     if valid_date and duplicates is False:
-        bookings = active(get_data("bookings"))
+        bookings = active(get_data("bookings", since=date.today()))
         print_bookings(bookings, valid_date, valid_date)
         return valid_date
     if duplicates:
@@ -177,14 +281,22 @@ def new_date(*args):
               "Invalid time.")
 def new_time(*args):
     """
-    Takes in user_input(str) and validates time: if it's
-    correect format. Returns valid time or False for invalid
-    input.
+    Takes in user_input(str) and optionally a date(str) and
+    a customer's name(str) of the booking, and validates time:
+    if it's correect format and, if seats are limited, a table is
+    free then. Returns valid time, None if no table is free or
+    False for invalid input.
     """
-    (user_input, ) = args
-    if valid.time_input(user_input) is True:
-        return user_input
-    return False
+    (user_input, *booking) = args
+    if valid.time_input(user_input) is not True:
+        return False
+    if booking and is_limited():
+        tables = availability(*booking)
+        if not tables.can_seat(user_input):
+            free = ", ".join(tables.free_times()) or "none"
+            print(f"\t\tNo free tables at {user_input}. Free times: {free}")
+            return None
+    return user_input
 
 
 @loop_menu_qx("\t\t",
@@ -193,16 +305,26 @@ def new_time(*args):
               "Not a number. Please, use a number.")
 def num_of_people(*args):
     """
-    Takes in user_input(str), validates that it is a number.
-    Returns valid value(str) or False for invalid input.
+    Takes in user_input(str) and optionally a date(str), a time(str)
+    and a customer's name(str) of the booking, validates that it is
+    a number and, if seats are limited, the party can be seated.
+    Returns valid value(str), None if it can't be seated or False
+    for invalid input.
     """
-    (user_input, ) = args
+    (user_input, *booking) = args
     try:
         num = int(user_input)
     except ValueError:
         return False
-    else:
-        return str(num)
+    if booking and is_limited():
+        (day, time, name) = booking
+        tables = availability(day, name)
+        if not tables.can_seat(time, num):
+            free = ", ".join(tables.free_times(num)) or "none"
+            print(f"\t\tNo free tables for {num} at {time}. "
+                  f"Free times: {free}")
+            return None
+    return str(num)
 
 
 def new_booking(user, customer):
@@ -216,6 +338,128 @@ def new_booking(user, customer):
     day = new_date(customer)
     if day in ["x", "q"]:
         return day
+    time = new_time(day, name)
+    if time in ["x", "q"]:
+        return time
+    num = num_of_people(day, time, name)
+    if num in ["x", "q"]:
+        return num
+
+    new = new_row("bookings", {"DATE": day, "TIME": time, "NAME": name,
+                               "PEOPLE": num, "CREATED": created,
+                               "CONF": "-"})
+    log_event("bookings", events.CREATED, as_dict("bookings", new))
+    increment_bookings(customer)
+    print_bookings([as_dict("bookings", new)], day, day)
+    return None  # to stay in the loop of the current menu
+
+
+# days between bookings made by recurring_dates()
+REPEAT_DAYS = {"1": 7, "2": 14}
+# most bookings made at once
+MAX_REPEATS = 52
+
+
+def repeat(first, days, times):
+    """
+    Takes in the first date(str), days between bookings(int) and
+    a number of bookings(int). Returns dates(list of str).
+    """
+    start = valid.to_date(first)
+    return [(start + timedelta(days=days * num)).strftime("%d-%m-%Y")
+            for num in range(times)]
+
+
+@loop_menu_qx("\t\t",
+              "x - <== // q - home",
+              "press 1 - Weekly\n\t\t"
+              "press 2 - Fortnightly\n\t\t"
+              "press 3 - List of dates\n\t\t",
+              "Invalid input. Please, use options above.")
+def recurring_dates(*args):
+    """
+    Displays menu to choose how bookings repeat. Takes in
+    user_input(str). Returns dates(list of str).
+    """
+    (user_input, ) = args
+    if user_input in REPEAT_DAYS:
+        return repeat_dates(REPEAT_DAYS[user_input])
+    if user_input == "3":
+        return date_list()
+    return False  # for invalid input
+
+
+@loop_menu_qx("\t\t",
+              "",
+              "First date and number of bookings (dd-/.mm-/.yyyy n): ",
+              f"Invalid input. Enter a date and a number up to {MAX_REPEATS}.")
+def repeat_dates(*args):
+    """
+    Takes in user_input(str) with the first date and a number of
+    bookings and days between bookings(int). Returns dates(list
+    of str) or False for invalid input.
+    """
+    (user_input, days) = args
+    try:
+        (first, times) = user_input.split()
+        times = int(times)
+    except ValueError:
+        return False
+    first = valid.date_input(first)
+    if first is False or not 0 < times <= MAX_REPEATS:
+        return False
+    return repeat(first, days, times)
+
+
+@loop_menu_qx("\t\t",
+              "",
+              "Dates separated by spaces (dd-/.mm-/.yyyy): ",
+              "Invalid date.")
+def date_list(*args):
+    """
+    Takes in user_input(str) with dates. Returns valid dates(list
+    of str) in order, or False if any is invalid.
+    """
+    (user_input, ) = args
+    dates = [valid.date_input(day) for day in user_input.split()]
+    if not dates or False in dates or len(dates) > MAX_REPEATS:
+        return False
+    return sorted(set(dates), key=valid.day_number)
+
+
+def check_dates(dates, name, time, people):
+    """
+    Takes in dates(list of str), a customer's name(str), time(str)
+    and number of people(int). Checks every date for a booking of
+    the customer and, if seats are limited, free tables, in one
+    pass over active bookings. Returns a tuple: dates which can be
+    booked(list) and refused dates with reasons(dict).
+    """
+    agenda = calendar()
+    free = []
+    refused = {}
+    for day in dates:
+        if agenda.has(name, day):
+            refused[day] = "already booked"
+        elif is_limited() and not _availability(agenda, day).can_seat(
+                time, people):
+            refused[day] = "no free tables"
+        else:
+            free.append(day)
+    return (free, refused)
+
+
+def recurring_booking(user, customer):
+    """
+    Creates bookings of a customer on several dates at the same
+    time: every week, every other week or on a list of dates.
+    Writes all of them in one request and updates the customer's
+    number of bookings once.
+    """
+    name = customer["NAME"]
+    dates = recurring_dates()
+    if dates in ["x", "q", None]:
+        return dates
     time = new_time()
     if time in ["x", "q"]:
         return time
@@ -223,10 +467,18 @@ def new_booking(user, customer):
     if num in ["x", "q"]:
         return num
 
-    new = [day, time, name, num, created, "-", ""]
-    update_worksheet(new, "bookings")
-    increment_bookings(customer)
-    print_bookings([dict(zip(KEYS, new))], day, day)
+    (free, refused) = check_dates(dates, name, time, int(num))
+    for (day, reason) in refused.items():
+        print(f"\t\t{day} is skipped: {reason}.")
+    if not free:
+        print("\t\tThere are no dates to book.")
+        return None
+    new = [as_dict("bookings", new_row("bookings", {
+        "DATE": day, "TIME": time, "NAME": name, "PEOPLE": num,
+        "CREATED": user["NAME"], "CONF": "-"})) for day in free]
+    log_events("bookings", events.CREATED, new)
+    increment_bookings(customer, len(new))
+    print_bookings(new, free, "the new dates")
     return None  # to stay in the loop of the current menu
 
 
@@ -255,7 +507,7 @@ def edit_bookings(*args):
     """
     (user_input, ) = args
     if user_input == "1":
-        bookings_data = active(get_data("bookings"))
+        bookings_data = active(get_data("bookings", since=date.today()))
         return confirm(to_confirm(bookings_data))
     if user_input in ["2", "3"]:
         booking = find_bookings()
@@ -277,6 +529,7 @@ def confirm(bookings):
     """
     if bookings is None:
         return bookings
+    # every answer is saved before the next booking is shown
     for booking in bookings:
         print_bookings([booking], today, "today")
         user_inp = input("\n\t\t\t" + "x - <== // q - home\n\t\t\t"
@@ -284,8 +537,8 @@ def confirm(bookings):
                          "press 2 - Skip\n\t\t\t"
                          "press 3 - Cancel\n\t\t\t")
         if user_inp == "1":
-            booking.update({"CONF": "yes"})
-            update_data("bookings", booking, "CONF", "yes")
+            log_event("bookings", events.CONFIRMED, booking,
+                      {"CONF": "yes"})
         elif user_inp == "2":
             continue
         elif user_inp == "3":
@@ -329,22 +582,23 @@ def reschedule(booking):
     user_date = update_date(booking)
     if user_date in ["x", "q"]:
         return user_date
-    bookings = active(get_data("bookings"))
+    bookings = active(get_data("bookings", since=date.today()))
     print_bookings(bookings, user_date, user_date)
 
-    user_time = new_time()
+    user_time = new_time(user_date, booking["NAME"])
     if user_time in ["x", "q"]:
         return user_time
 
-    num = num_of_people()
+    num = num_of_people(user_date, user_time, booking["NAME"])
     if num in ["x", "q"]:
         return num
 
     print("\t\tSaving .....")
+    changes = {"TIME": user_time, "PEOPLE": num}
     if user_date != booking["DATE"]:
-        update_data("bookings", booking, "DATE", user_date)
-    update_data("bookings", booking, "TIME", user_time)
-    update_data("bookings", booking, "PEOPLE", num)
+        changes = {"DATE": user_date, **changes}
+    with batch():
+        log_event("bookings", events.RESCHEDULED, booking, changes)
     return None  # to stay in the loop of the current menu
 
 
@@ -360,8 +614,8 @@ def find_bookings(*args):
     invalid input.
     """
     (user_input, ) = args
-    customers = get_data("customers")
-    if user_input in [dct["NAME"] for dct in customers]:
+    names = get_columns("customers", ["NAME"])[1:]
+    if [user_input] in names:
         bookings = cust_bookings(user_input)
         all_time = [dct["DATE"] for dct in bookings]
         print_bookings(bookings, all_time, "all time")
@@ -407,10 +661,11 @@ def cancel(booking):
     new booking status and increments the customer's stats of
     cancelled bookings.
     """
-    update_data("bookings", booking, "CANC", "yes")
-    customer = get_customer(booking["NAME"])
-    new_value = str(int(customer["CANCELLED"]) + 1)
-    update_data("customers", customer, "CANCELLED", new_value)
+    with batch():
+        log_event("bookings", events.CANCELLED, booking, {"CANC": "yes"})
+        customer = get_customer(booking["NAME"])
+        new_value = str(int(customer["CANCELLED"]) + 1)
+        update_data("customers", customer, "CANCELLED", new_value)
 
 
 def has_duplicates(user_date, name):
@@ -418,22 +673,22 @@ def has_duplicates(user_date, name):
     Takes in a date(str) and a name(str). Checks if a customer
     already has a booking for this date. Returns boolean.
     """
-    customer_bookings = cust_bookings(name)
-    if user_date in [dct["DATE"] for dct in customer_bookings]:
+    agenda = calendar()
+    if agenda.has(name, user_date):
         print(f"\n\t\t!!!Booking for {user_date} already exists!!!")
-        print_bookings(customer_bookings, user_date, user_date)
+        print_bookings(agenda.of(name), user_date, user_date)
         return True
     return False
 
 
-def increment_bookings(customer):
+def increment_bookings(customer, count=1):
     """
-    Takes in a customer(dict). Increments number of bookings
-    a customer has, when a new booking is created.
+    Takes in a customer(dict) and a number of new bookings(int).
+    Increments number of bookings a customer has, when new
+    bookings are created.
     """
-    new_number = str(int(customer["NUM OF BOOKINGS"]) + 1)
+    new_number = str(int(customer["NUM OF BOOKINGS"]) + count)
     update_data("customers", customer, "NUM OF BOOKINGS", new_number)
 
 
 today = dd_mm_yyyy(str(date.today()))
-KEYS = get_data("bookings")[0]
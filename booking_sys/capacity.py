@@ -0,0 +1,147 @@
+"""
+Seating capacity of the restaurant and free tables.
+
+A booking takes its tables for BOOKING_MINUTES from its time.
+The day, from OPENS until the last booking is over, is split into
+slots of SLOT_MINUTES. Covers and tables taken in every slot are
+counted in one pass over the bookings of the day, adding them
+where a booking starts and taking them away where it ends (a sweep
+line), so whether a party can be seated at a time is answered from
+the few slots it would take, however many bookings the day has.
+Counting is done once per day until bookings change, see
+booking.availability(). OPENS and LAST_BOOKING are checked when
+the module is imported.
+"""
+import os
+from itertools import accumulate
+from booking_sys import validation as valid
+
+
+# covers seated at once, 0 for no limit
+SEATS = int(os.environ.get("SEATS", "0"))
+# tables, 0 for no limit
+TABLES = int(os.environ.get("TABLES", "0"))
+# seats at a table, a bigger party takes more tables,
+# 0 for a table for every party
+TABLE_SEATS = int(os.environ.get("TABLE_SEATS", "0"))
+BOOKING_MINUTES = int(os.environ.get("BOOKING_MINUTES", "90"))
+SLOT_MINUTES = int(os.environ.get("SLOT_MINUTES", "15"))
+# the first and the last time a booking can start
+OPENS = os.environ.get("OPENS", "12:00")
+LAST_BOOKING = os.environ.get("LAST_BOOKING", "21:30")
+
+
+def setting_minute(name, value):
+    """
+    Takes in a name and a value(str) of a time setting. Returns
+    minutes since midnight(int). Raises ValueError if the value
+    is not a time in hh:mm format.
+    """
+    minute = valid.minute_of_day(value)
+    if minute is None:
+        raise ValueError(f"{name} must be a time in hh:mm format, "
+                         f"not '{value}'")
+    return minute
+
+
+# checked once, when the module is imported
+OPENS_MINUTE = setting_minute("OPENS", OPENS)
+LAST_MINUTE = setting_minute("LAST_BOOKING", LAST_BOOKING)
+if LAST_MINUTE < OPENS_MINUTE:
+    raise ValueError("LAST_BOOKING must not be before OPENS")
+
+
+def is_limited():
+    """
+    Checks if seats or tables are limited. Returns boolean.
+    """
+    return SEATS > 0 or TABLES > 0
+
+
+def tables_for(people):
+    """
+    Takes in a number of people(int). Returns the number
+    of tables(int) they take.
+    """
+    if TABLE_SEATS <= 0:
+        return 1
+    return max(1, -(-people // TABLE_SEATS))
+
+
+def as_time(minute):
+    """
+    Takes in minutes since midnight(int). Returns a time(str)
+    in hh:mm format.
+    """
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class Availability:
+    """
+    Covers and tables taken in every slot of a day, counted
+    from bookings(dictionaries with TIME and PEOPLE) of the day.
+    Bookings with an invalid time are left out.
+    """
+    def __init__(self, bookings=()):
+        self._opens = OPENS_MINUTE
+        self._last = LAST_MINUTE
+        size = self._slot_after(self._last + BOOKING_MINUTES)
+        covers = [0] * (size + 1)
+        tables = [0] * (size + 1)
+        for booking in bookings:
+            minute = valid.minute_of_day(booking["TIME"])
+            if minute is None:
+                continue
+            try:
+                people = int(booking["PEOPLE"])
+            except (ValueError, TypeError):
+                people = 0
+            (first, end) = self._span(minute, size)
+            if first >= end:
+                continue  # outside opening hours
+            covers[first] += people
+            covers[end] -= people
+            tables[first] += tables_for(people)
+            tables[end] -= tables_for(people)
+        self._covers = list(accumulate(covers[:size]))
+        self._tables = list(accumulate(tables[:size]))
+
+    def _slot_after(self, minute):
+        """
+        Returns the number of the first slot(int) which starts
+        at the minute or later.
+        """
+        return max(0, -(-(minute - self._opens) // SLOT_MINUTES))
+
+    def _span(self, minute, size):
+        """
+        Returns numbers of the first slot and of the slot after
+        the last one(tuple) taken by a booking at the minute.
+        """
+        first = max(0, (minute - self._opens) // SLOT_MINUTES)
+        end = min(size, self._slot_after(minute + BOOKING_MINUTES))
+        return (first, end)
+
+    def can_seat(self, time, people=1):
+        """
+        Takes in a time(str) in hh:mm format and a number of
+        people(int). Checks if they can be seated then and
+        until the booking is over. Returns boolean.
+        """
+        minute = valid.minute_of_day(time)
+        if minute is None or not self._opens <= minute <= self._last:
+            return False
+        (first, end) = self._span(minute, len(self._covers))
+        covers = max(self._covers[first:end], default=0)
+        tables = max(self._tables[first:end], default=0)
+        return ((SEATS <= 0 or covers + people <= SEATS) and
+                (TABLES <= 0 or tables + tables_for(people) <= TABLES))
+
+    def free_times(self, people=1):
+        """
+        Takes in a number of people(int). Returns times(list of
+        str) at the start of every slot when they can be seated.
+        """
+        return [as_time(minute) for minute in
+                range(self._opens, self._last + 1, SLOT_MINUTES)
+                if self.can_seat(as_time(minute), people)]
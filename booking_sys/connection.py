@@ -0,0 +1,134 @@
+"""
+One pooled HTTP session shared by all Google API requests.
+
+The gspread client, Drive requests and token refreshes use
+the same keep-alive connections. The access token is kept in
+TOKEN_FILE until it expires, so a short session does not ask
+for a new token when it starts.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import AuthorizedSession, Request
+from booking_sys.snapshot import open_private
+
+
+TOKEN_FILE = os.environ.get("TOKEN_FILE", "token.json")
+# open connections kept per host
+POOL_SIZE = int(os.environ.get("POOL_SIZE", "10"))
+# hosts with a pool: sheets, drive and token endpoints
+POOL_HOSTS = 4
+# a stored token is used only if it is valid for longer
+TOKEN_MARGIN = timedelta(minutes=5)
+LOCK = threading.Lock()
+STATE = {"session": None, "saved": None}
+
+
+def _utcnow():
+    """
+    Returns the current UTC time without a time zone,
+    like expiry of google-auth credentials.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _owner(credentials):
+    """
+    Returns what a stored token belongs to(str): the account
+    and scopes of credentials.
+    """
+    account = getattr(credentials, "service_account_email", "")
+    scopes = " ".join(sorted(getattr(credentials, "scopes", None) or []))
+    return f"{account} {scopes}"
+
+
+def load_token(credentials):
+    """
+    Gives credentials the stored access token if it belongs
+    to them and is not about to expire. Returns boolean.
+    """
+    try:
+        with open(TOKEN_FILE, encoding="utf-8") as file:
+            stored = json.load(file)
+        expiry = datetime.fromisoformat(stored["expiry"])
+        if (stored["owner"] != _owner(credentials)
+                or expiry - _utcnow() < TOKEN_MARGIN):
+            return False
+    except (OSError, ValueError, KeyError, TypeError):
+        # no token yet or a damaged file, a new token is made
+        return False
+    credentials.token = stored["token"]
+    credentials.expiry = expiry
+    STATE["saved"] = stored["token"]
+    return True
+
+
+def save_token(credentials):
+    """
+    Stores the access token of credentials, readable only by
+    the owner of the file, unless it is stored already.
+    """
+    token = credentials.token
+    if not token or credentials.expiry is None or token == STATE["saved"]:
+        return
+    stored = {"owner": _owner(credentials), "token": token,
+              "expiry": credentials.expiry.isoformat()}
+    temp = f"{TOKEN_FILE}.tmp"
+    with open_private(temp, "w", encoding="utf-8") as file:
+        json.dump(stored, file)
+    os.replace(temp, TOKEN_FILE)
+    STATE["saved"] = token
+
+
+def shared_session(credentials):
+    """
+    Returns the HTTP session for credentials, made on the first
+    call. A stored token is used if there is a valid one and
+    a new token is stored after every refresh.
+    """
+    with LOCK:
+        session = STATE["session"]
+        if session is not None and session.credentials is credentials:
+            return session
+        load_token(credentials)
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS,
+                              pool_maxsize=POOL_SIZE)
+        refresher = requests.Session()
+        refresher.mount("https://", adapter)
+        session = AuthorizedSession(credentials,
+                                    auth_request=Request(refresher))
+        session.mount("https://", adapter)
+
+        def store_token(response, **_):
+            try:
+                save_token(credentials)
+            except OSError:
+                pass  # the next session makes a new token
+            return response
+
+        session.hooks["response"].append(store_token)
+        STATE["session"] = session
+        return session
+
+
+def pool_stats(session=None):
+    """
+    Returns counters of the connection pools(dict): requests
+    sent, "pool hits" - requests sent over an open connection
+    and "pool misses" - new connections.
+    """
+    session = session or STATE["session"]
+    sent = opened = 0
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool in map(pools.get, pools.keys()):
+                if pool is None:
+                    continue  # closed meanwhile
+                sent += pool.num_requests
+                opened += pool.num_connections
+    return {"requests sent": sent, "pool hits": sent - opened,
+            "pool misses": opened}
@@ -1,15 +1,13 @@
 """
 Includes customers specific functions.
 """
-from booking_sys.spreadsheet import get_data, update_worksheet
+from booking_sys.spreadsheet import (get_data, update_worksheet, new_row,
+                                     as_dict, stale_note)
 from booking_sys import validation as valid
 from booking_sys import stats
 from booking_sys.decorators import pretty_print, loop_menu_qx
 
 
-KEYS = get_data("customers")[0]
-
-
 def search(value, attr, data):
     """
     Finds and returns an element from data
@@ -24,9 +22,11 @@ def search(value, attr, data):
 
 def get_customer(name):
     """
-    Returns a dictionary with a customer of a given name.
+    Returns a dictionary with a customer of a given name
+    or None. Rows are read in one request, which fills the
+    cache, or looked up by an index if the database has one.
     """
-    customers = get_data("customers")
+    customers = get_data("customers", {"NAME": name})
     return search(name, "NAME", customers)
 
 
@@ -83,6 +83,9 @@ def print_customer(customer):
     Takes in a customer(dict). Prints out information
     about the requested customer.
     """
+    note = stale_note("customers")
+    if note:
+        print(note)
     print(f"\t{customer['NAME']} - {customer['PHONE']}, "
           f"birthday: {customer['BD']}\n"
           f"\tbookings history: {customer['NUM OF BOOKINGS']}, "
@@ -181,6 +184,8 @@ def create_customer(name):
     if birthday in ["x", "q"]:
         return birthday
     # process data and update spreadsheet
-    new_data = [name, phone, email, birthday, 1, 0]
+    new_data = new_row("customers", {"NAME": name, "PHONE": phone,
+                                     "EMAIL": email, "BD": birthday,
+                                     "NUM OF BOOKINGS": 1, "CANCELLED": 0})
     update_worksheet(new_data, "customers")
-    return dict(zip(KEYS, new_data))
+    return as_dict("customers", new_data)
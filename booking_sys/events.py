@@ -0,0 +1,129 @@
+"""
+Event logs of worksheets.
+
+Instead of changing cells of a row in place, a change is appended
+to the event log of the worksheet, so no row has to be found before
+writing and two terminals never overwrite each other's cells.
+Current rows are the worksheet itself, the last snapshot, with
+events logged since applied in order, see fold(). From time to time
+folded rows are written back to the worksheet and a "compacted"
+event marks the events they include. Events are never deleted,
+they are the history of changes.
+"""
+import json
+from datetime import datetime
+
+
+COLUMNS = ("AT", "EVENT", "NAME", "DATE", "CHANGES")
+CREATED = "created"
+CONFIRMED = "confirmed"
+RESCHEDULED = "rescheduled"
+CANCELLED = "cancelled"
+COMPACTED = "compacted"
+# columns which tell rows apart, see spreadsheet.KEY_COLUMNS
+KEY = ("NAME", "DATE")
+
+
+def _now():
+    """
+    Returns the current time(str) in dd-mm-yyyy hh:mm:ss format.
+    """
+    return datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+
+
+def new_event(kind, row, changes):
+    """
+    Takes in a kind of event(str), the changed row(dict) as it
+    was before and changes(dict of column names and values),
+    for a created row all its values. Returns an event(list).
+    """
+    return [_now(), kind, row.get("NAME", ""), row.get("DATE", ""),
+            json.dumps(changes)]
+
+
+def marker(through):
+    """
+    Takes in the number of the last event(int) included in
+    the worksheet. Returns a "compacted" event(list).
+    """
+    return [_now(), COMPACTED, "", "", json.dumps({"through": through})]
+
+
+def changes_of(event):
+    """
+    Returns changes(dict) of an event, empty if they are
+    missing or damaged.
+    """
+    try:
+        changes = json.loads(event[4])
+    except (IndexError, ValueError):
+        return {}
+    return changes if isinstance(changes, dict) else {}
+
+
+def tail(values):
+    """
+    Takes in rows of an event log, the header first. Returns
+    a tuple: the number of the last event included in the
+    worksheet(int) and events after it(list of lists).
+    """
+    through = 1
+    for num in range(len(values) - 1, 0, -1):
+        if values[num][1:2] == [COMPACTED]:
+            through = int(changes_of(values[num]).get("through", 1))
+            break
+    return (through, [event for event in values[through:]
+                      if len(event) > 1 and event[1] != COMPACTED])
+
+
+def fold(values, events):
+    """
+    Takes in rows of a worksheet, the header first, and events.
+    Applies events to rows in order, in place. Events of rows
+    which do not exist are skipped. A created row which ends up
+    equal to a row of the worksheet with the same key is left out:
+    it was written back already, by a compaction whose "compacted"
+    event is not read yet or which was interrupted before writing
+    it. Returns the rows.
+    """
+    if not values:
+        return values
+    header = values[0]
+    positions = {name: num for (num, name) in enumerate(header)}
+    cols = [positions.get(name) for name in KEY]
+
+    def key(row):
+        return tuple(row[col] if col is not None and col < len(row) else ""
+                     for col in cols)
+
+    def padded(row):
+        return list(row) + [""] * (len(header) - len(row))
+
+    size = len(values)
+    # the last row with a key wins, like in spreadsheet.build_index
+    index = {key(row): num for (num, row) in enumerate(values) if num}
+    for event in events:
+        changes = changes_of(event)
+        if event[1] == CREATED:
+            values.append([str(changes.get(name, "")) for name in header])
+            index[key(values[-1])] = len(values) - 1
+            continue
+        num = index.get(tuple(event[2:4]))
+        if num is None:
+            continue
+        row = values[num]
+        old = key(row)
+        for (name, value) in changes.items():
+            if name in positions:
+                row.extend([""] * (positions[name] + 1 - len(row)))
+                row[positions[name]] = str(value)
+        if key(row) != old:
+            if index.get(old) == num:
+                del index[old]
+            index[key(row)] = num
+    written = {}
+    for row in values[1:size]:
+        written.setdefault(key(row), []).append(padded(row))
+    values[size:] = [row for row in values[size:]
+                     if padded(row) not in written.get(key(row), [])]
+    return values
@@ -0,0 +1,150 @@
+"""
+Journal of writes which could not be saved to the database yet.
+
+Writes are stored as lines of JSON in a local append-only file
+and replayed in order once the database is available again.
+A line is either an operation with an "id" or a {"done": id}
+marker written after the operation has been replayed. An operation
+replayed just before a crash, without its marker, is replayed
+again, so replaying has to be safe to repeat.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from booking_sys import background
+
+
+JOURNAL_FILE = os.environ.get("JOURNAL_FILE", "journal.jsonl")
+# seconds between replay attempts
+REPLAY_EVERY = 10
+LOCK = threading.RLock()
+# held by the one replay running at a time, see replay()
+REPLAYING = threading.Lock()
+STATE = background.new_state(replayed=0, skipped=0)
+
+
+def _read_lines():
+    """
+    Returns all entries of the journal file as a list of dictionaries.
+    """
+    if not os.path.exists(JOURNAL_FILE):
+        return []
+    entries = []
+    with open(JOURNAL_FILE, encoding="utf-8") as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a line cut short by a crash
+    return entries
+
+
+def _write(entry):
+    """
+    Appends an entry(dict) to the journal file and makes sure
+    it is on disk before returning.
+    """
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def has_pending():
+    """
+    Checks if there are operations to replay. The journal file
+    is removed once everything is replayed. Returns boolean.
+    """
+    return os.path.exists(JOURNAL_FILE)
+
+
+def pending():
+    """
+    Returns operations which are not replayed yet, in the order
+    they were recorded, every id once.
+    """
+    with LOCK:
+        entries = _read_lines()
+    done = {entry["done"] for entry in entries if "done" in entry}
+    operations = []
+    for entry in entries:
+        if "id" in entry and entry["id"] not in done:
+            done.add(entry["id"])
+            operations.append(entry)
+    return operations
+
+
+def record(operation):
+    """
+    Appends an operation(dict) to the journal, gives it an id
+    if it has none. An operation with an id already in the
+    journal is not recorded again. Returns the id.
+    """
+    operation.setdefault("id", uuid.uuid4().hex)
+    operation.setdefault("time", time.time())
+    with LOCK:
+        if all(entry.get("id") != operation["id"]
+               for entry in _read_lines()):
+            _write(operation)
+    return operation["id"]
+
+
+def replay(apply):
+    """
+    Calls apply(operation) for every pending operation in order,
+    also for ones recorded meanwhile, and marks it done. Stops at
+    the first error and raises it. Removes the journal file when
+    all operations are done. LOCK is not held while applying, so
+    slow requests do not hold up recording new operations.
+    Returns the number of replayed operations.
+    """
+    count = 0
+    with REPLAYING:
+        try:
+            while True:
+                with LOCK:
+                    operations = pending()
+                    if not operations:
+                        if has_pending():
+                            os.remove(JOURNAL_FILE)
+                        break
+                for operation in operations:
+                    if apply(operation) is False:
+                        STATE["skipped"] += 1
+                    with LOCK:
+                        _write({"done": operation["id"]})
+                    count += 1
+        finally:
+            STATE["replayed"] += count
+    return count
+
+
+def start(task, interval=REPLAY_EVERY):
+    """
+    Starts a background thread calling task() every interval
+    seconds while there are pending operations. Does nothing
+    if the thread is already running. Returns the thread.
+    """
+    return background.start(STATE, task, interval, needed=has_pending)
+
+
+def stop():
+    """
+    Stops the background thread and waits for it.
+    """
+    background.stop(STATE)
+
+
+def status():
+    """
+    Returns a dictionary describing the journal: file, number
+    of pending operations, when the oldest was recorded, number
+    of replayed and skipped operations and the last error.
+    """
+    operations = pending()
+    return {"file": JOURNAL_FILE, "pending": len(operations),
+            "oldest": operations[0]["time"] if operations else None,
+            "replayed": STATE["replayed"], "skipped": STATE["skipped"],
+            "error": STATE["error"]}
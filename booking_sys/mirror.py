@@ -0,0 +1,82 @@
+"""
+Copies worksheets from one storage backend to another, e.g.
+from the local SQLite database to the Google sheet, so the sheet
+stays a readable copy of the data kept in SQLite.
+"""
+import os
+from booking_sys import background
+
+
+# seconds between copies made by the background thread
+MIRROR_EVERY = float(os.environ.get("MIRROR_EVERY", "300"))
+STATE = background.new_state(mirrored=None)
+
+
+def mirror(source, target, worksheets):
+    """
+    Makes worksheets of target equal to source: changed cells
+    are written in one request and missing rows are appended.
+    Rows which only target has are kept. Returns the number of
+    written cells and appended rows as a tuple.
+    """
+    old = target.batch_get_values(list(worksheets))
+    new = source.batch_get_values(list(worksheets))
+    updates = {}
+    appended = 0
+    for worksheet in worksheets:
+        (cells, rows) = diff(old[worksheet], new[worksheet])
+        if cells:
+            updates[worksheet] = cells
+        if rows:
+            target.append_rows(worksheet, rows)
+            appended += len(rows)
+    if updates:
+        target.batch_update(updates)
+    return (sum(map(len, updates.values())), appended)
+
+
+def diff(before, after):
+    """
+    Compares rows of a worksheet(lists of lists). Returns a tuple:
+    cells of after which differ((row, col, value) tuples) and rows
+    after has at the end in addition.
+    """
+    cells = [(row, col, value)
+             for (row, (was, now)) in enumerate(zip(before, after), start=1)
+             for (col, value) in enumerate(now, start=1)
+             if (was[col - 1] if col <= len(was) else "") != value]
+    return (cells, after[len(before):])
+
+
+def is_empty(backend, worksheets):
+    """
+    Checks if worksheets of a backend have no rows but
+    the header. Returns boolean.
+    """
+    return all(backend.metadata(worksheet)["rows"] <= 1
+               for worksheet in worksheets)
+
+
+def start(copy, interval=MIRROR_EVERY):
+    """
+    Starts a background thread calling copy(), e.g. mirror()
+    of two backends, every interval seconds. Does nothing if
+    the thread is already running. Returns the thread.
+    """
+    return background.start(STATE, copy, interval,
+                            errors=background.DB_ERRORS, done="mirrored")
+
+
+def stop():
+    """
+    Stops the background thread and waits for it.
+    """
+    background.stop(STATE)
+
+
+def status():
+    """
+    Returns a dictionary with the time of the last copy
+    and the last error.
+    """
+    return {"mirrored": STATE["mirrored"], "error": STATE["error"]}
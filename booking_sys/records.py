@@ -0,0 +1,71 @@
+"""
+Compact records of worksheet rows.
+
+A record keeps the values of a row in a tuple and shares
+the mapping of column names with all rows of the worksheet,
+so thousands of rows do not carry a dictionary each. Records
+are read and changed like dictionaries: record["DATE"],
+record.get("CONF"), record.update({"CONF": "yes"}).
+"""
+from collections.abc import MutableMapping
+from functools import lru_cache
+
+
+@lru_cache(maxsize=32)
+def columns_of(header):
+    """
+    Takes in a header(tuple of column names). Returns a dictionary
+    of column names and positions, shared by all records with
+    the same header. If a name repeats, the last column wins.
+    """
+    return {name: num for (num, name) in enumerate(header)}
+
+
+class Record(MutableMapping):
+    """
+    A row of a worksheet which behaves like a dictionary of
+    column names and values. Equal to a dictionary with
+    the same items.
+    """
+    __slots__ = ("_columns", "_values")
+
+    def __init__(self, columns, values):
+        self._columns = columns
+        self._values = tuple(values)
+
+    def __getitem__(self, name):
+        num = self._columns[name]
+        if num >= len(self._values):
+            raise KeyError(name)
+        return self._values[num]
+
+    def __setitem__(self, name, value):
+        num = self._columns[name]
+        values = self._values
+        if num >= len(values):
+            values += ("", ) * (num + 1 - len(values))
+        self._values = values[:num] + (value, ) + values[num + 1:]
+
+    def __delitem__(self, name):
+        raise TypeError("columns of a record can not be deleted")
+
+    def __iter__(self):
+        size = len(self._values)
+        return (name for (name, num) in self._columns.items() if num < size)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+def to_records(values):
+    """
+    Takes in rows of a worksheet(list of lists), the first row
+    is the header. Returns a list of records.
+    """
+    if not values:
+        return []
+    columns = columns_of(tuple(values[0]))
+    return [Record(columns, row) for row in values[1:]]
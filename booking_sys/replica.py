@@ -0,0 +1,49 @@
+"""
+Keeps the in-process copy of worksheets fresh from a background
+thread, so menus read it at once instead of waiting for the
+network. The copy is the cache of the spreadsheet module, which
+also receives every write made in this process.
+"""
+import os
+from booking_sys import background
+
+
+# seconds between refreshes, 0 turns the thread off
+REPLICA_EVERY = float(os.environ.get("REPLICA_EVERY", "0"))
+STATE = background.new_state(refreshed=None)
+
+
+def start(refresh, interval=REPLICA_EVERY):
+    """
+    Starts a background thread calling refresh() at once and
+    then every interval seconds. Does nothing if the thread is
+    already running or interval is 0. Returns the thread or None.
+    Errors keep the copy, see status() and is_running().
+    """
+    if interval <= 0:
+        return None
+    return background.start(STATE, refresh, interval, at_once=True,
+                            errors=background.CONNECT_ERRORS,
+                            done="refreshed")
+
+
+def is_running():
+    """
+    Checks if the background thread is running. Returns boolean.
+    """
+    return background.is_running(STATE)
+
+
+def stop():
+    """
+    Stops the background thread and waits for it.
+    """
+    background.stop(STATE)
+
+
+def status():
+    """
+    Returns a dictionary with the time of the last refresh
+    and the last error.
+    """
+    return {"refreshed": STATE["refreshed"], "error": STATE["error"]}
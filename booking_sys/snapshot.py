@@ -0,0 +1,123 @@
+"""
+Local binary snapshot of worksheets for a fast start.
+
+File layout, integers are little-endian:
+    magic(8 bytes) | revision length(uint16) | revision(utf-8)
+    | number of worksheets(uint16)
+    | for each worksheet: name length(uint16) | name(utf-8)
+                          | offset(uint64) | length(uint64)
+    | worksheet data
+Worksheet data is utf-8 text: cells separated by CELL,
+rows separated by ROW. The file is memory-mapped when loaded,
+so only the requested worksheets are read and decoded.
+"""
+import mmap
+import os
+import struct
+
+
+MAGIC = b"BKSNAP01"
+CELL = "\x1f"
+ROW = "\x1e"
+
+
+def encode(values):
+    """
+    Takes in rows of a worksheet(list of lists). Returns them
+    as bytes. Raises ValueError if a cell holds a separator.
+    """
+    text = ROW.join(CELL.join(map(str, row)) for row in values)
+    separators = (max(len(values) - 1, 0)
+                  + sum(max(len(row) - 1, 0) for row in values))
+    if text.count(ROW) + text.count(CELL) != separators:
+        raise ValueError("a cell holds a snapshot separator")
+    return text.encode("utf-8")
+
+
+def decode(data):
+    """
+    Takes in bytes made by encode(). Returns rows(list of lists).
+    """
+    if not data:
+        return []
+    return [row.split(CELL) for row in data.decode("utf-8").split(ROW)]
+
+
+def _private(path, flags):
+    """
+    Opens a new file only the owner can read and write.
+    Returns the file descriptor(int).
+    """
+    return os.open(path, flags | os.O_EXCL, 0o600)
+
+
+def open_private(path, mode="wb", **kwargs):
+    """
+    Opens a new file only the owner can read and write, for
+    temporary files replacing private ones. A file left at the
+    path, e.g. by a crash, is removed first, it may be readable
+    by others. Takes in open() arguments. Returns the file.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    return open(path, mode, opener=_private, **kwargs)
+
+
+def save(path, data, revision=""):
+    """
+    Writes worksheets(dict {name: list of rows}) and a revision
+    marker(str) to a snapshot file. The old file is replaced at
+    once, so readers never see a half-written snapshot. Only
+    the owner can read the file.
+    """
+    blobs = [(name.encode("utf-8"), encode(values))
+             for (name, values) in data.items()]
+    stamp = revision.encode("utf-8")
+    head = MAGIC + struct.pack("<H", len(stamp)) + stamp
+    head += struct.pack("<H", len(blobs))
+    offset = len(head) + sum(2 + len(name) + 16 for (name, _) in blobs)
+    for (name, blob) in blobs:
+        head += struct.pack("<H", len(name)) + name
+        head += struct.pack("<QQ", offset, len(blob))
+        offset += len(blob)
+    temp = f"{path}.tmp"
+    with open_private(temp) as file:
+        file.write(head)
+        for (_, blob) in blobs:
+            file.write(blob)
+    os.replace(temp, path)
+
+
+def load(path, worksheets=None):
+    """
+    Reads a snapshot file, only the given worksheets if any.
+    Returns a tuple (revision, {name: list of rows}) or None
+    if there is no valid snapshot.
+    """
+    try:
+        with open(path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(MAGIC)] != MAGIC:
+                return None
+            pos = len(MAGIC)
+            (size, ) = struct.unpack_from("<H", view, pos)
+            revision = view[pos + 2:pos + 2 + size].decode("utf-8")
+            pos += 2 + size
+            (count, ) = struct.unpack_from("<H", view, pos)
+            pos += 2
+            data = {}
+            for _ in range(count):
+                (size, ) = struct.unpack_from("<H", view, pos)
+                name = view[pos + 2:pos + 2 + size].decode("utf-8")
+                pos += 2 + size
+                (offset, length) = struct.unpack_from("<QQ", view, pos)
+                pos += 16
+                if offset + length > len(view):
+                    return None
+                if worksheets is None or name in worksheets:
+                    data[name] = decode(view[offset:offset + length])
+            return (revision, data)
+    except (OSError, ValueError, struct.error):
+        # missing, empty or damaged file, UnicodeDecodeError
+        # is a ValueError
+        return None
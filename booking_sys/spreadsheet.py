@@ -1,9 +1,25 @@
 """
 Includes functions related to interactions with Goggle Spreadsheets API.
 """
+import os
 import sys
+import time
+import threading
+from itertools import count
+from contextlib import contextmanager
+from functools import lru_cache
 from google.oauth2.service_account import Credentials
 import gspread
+from booking_sys.backends import GspreadBackend, SqliteBackend
+from booking_sys.background import DB_ERRORS, CONNECT_ERRORS
+from booking_sys import throttle
+from booking_sys import connection
+from booking_sys import journal
+from booking_sys import mirror
+from booking_sys import replica
+from booking_sys import snapshot
+from booking_sys import events
+from booking_sys.records import to_records
 
 
 SCOPE = [
@@ -11,94 +27,1207 @@ SCOPE = [
     "https://www.googleapis.com/auth/drive.file",
     "https://www.googleapis.com/auth/drive"
     ]
-CREDS = Credentials.from_service_account_file('creds.json')
-SCOPED_CRED = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CRED)
-SHEET = GSPREAD_CLIENT.open('My_booking')
+CREDS_FILE = 'creds.json'
+SHEET_NAME = 'My_booking'
+# path of a SQLite database to keep data in instead of the sheet,
+# which then becomes a copy updated in the background
+SQLITE_FILE = os.environ.get("SQLITE_FILE", "")
+# worksheets fetched together, see load_all()
+WORKSHEETS = ("staff", "customers", "bookings")
+# seconds a fetched worksheet is reused for, 0 turns caching off
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "60"))
+# {worksheet: {"time": when fetched, "loaded": when fully fetched,
+#              "values": list of rows,
+#              "revision": of the spreadsheet when fetched,
+#              "index": row locator, built on the first update,
+#              "stamp": changes with every change of the rows}}
+CACHE = {}
+# source of cache entry stamps, see changes_since()
+STAMPS = count(1)
+# counts changes of cached rows made by this process, so a background
+# refresh does not overwrite rows written while it was fetching
+LOCAL = {"writes": 0}
+# seconds the last known revision of the spreadsheet is trusted for
+REVISION_EVERY = float(os.environ.get("REVISION_EVERY", "5"))
+REVISION = {"value": None, "time": float("-inf"), "backend": None}
+# local copy of WORKSHEETS read at start, so a session does not
+# wait for the database, see load_snapshot(); empty to turn off
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", "snapshot.bin")
+# worksheets kept in the snapshot, staff is left out as it holds
+# passwords and logins are checked against fresh data
+SNAPSHOT_WORKSHEETS = ("customers", "bookings")
+# append-only worksheets: when cache expires, only rows added after
+# the cached ones are fetched, see _sync(); empty to turn off.
+# Worksheets changed through an existing event log are synced so
+# too, others have cells edited in place, see _append_only()
+INCREMENTAL = ("events", )
+# seconds after which an incrementally synced worksheet is fully
+# fetched again, to pick up cells edited by others
+FULL_SYNC_EVERY = float(os.environ.get("FULL_SYNC_EVERY", "600"))
+# held while fetching, so concurrent reads wait for one request
+LOCK = threading.RLock()
+# columns which identify a row of a worksheet
+KEY_COLUMNS = {"bookings": ("NAME", "DATE")}
+# worksheets changed through an event log {worksheet: log}, rows
+# of a worksheet without a log worksheet are changed in place
+EVENT_LOGS = {"bookings": "events"}
+# {log: boolean} if the log worksheet exists, see _has_log()
+LOGS = {}
+# events not written back to the worksheet yet which start
+# a compaction, see compact()
+COMPACT_AFTER = int(os.environ.get("COMPACT_AFTER", "200"))
+# cell updates waiting to be written, see batch()
+PENDING = []
+# "results" is the list yielded by the outermost batch(),
+# "timer" writes pending updates after BATCH_WAIT
+BATCH = {"depth": 0, "results": None, "timer": None}
+# held while pending updates are written, so they are
+# written in the order they were made
+FLUSHING = threading.Lock()
+# pending updates are written when there are this many
+# or the oldest one waits this many seconds
+BATCH_SIZE = 50
+BATCH_WAIT = 5
+# {worksheet: {"columns": header, "positions": {name: col number},
+#              "types": {name: expected type}}}, see schema()
+SCHEMAS = {}
+# expected types of columns, other columns hold text
+COLUMN_TYPES = {"customers": {"NUM OF BOOKINGS": int, "CANCELLED": int},
+                "bookings": {"PEOPLE": int}}
 
 
-def get_worksheet(worksheet):
+@lru_cache(maxsize=None)
+def get_credentials():
+    """
+    Reads service account credentials once per process.
+    Returns scoped credentials.
+    """
+    creds = Credentials.from_service_account_file(CREDS_FILE)
+    return creds.with_scopes(SCOPE)
+
+
+def open_sheet():
+    """
+    Authorises a gspread client and opens the spreadsheet.
+    Called by the backend on the first request.
+    """
+    credentials = get_credentials()
+    client = gspread.Client(credentials,
+                            connection.shared_session(credentials))
+    return client.open(SHEET_NAME)
+
+
+SHEET = GspreadBackend(open_sheet)
+BACKEND = SqliteBackend(SQLITE_FILE) if SQLITE_FILE else SHEET
+
+
+def request_stats():
+    """
+    Returns counters of database requests: calls, throttled
+    (waited for quota), retried and failed, and counters
+    of the connection pools.
+    """
+    return {**throttle.counters(), **connection.pool_stats()}
+
+
+def use_backend(backend):
+    """
+    Replaces the storage backend used by all functions of
+    this module, e.g. with MemoryBackend for tests or working
+    offline. Returns the previous backend.
+    """
+    global BACKEND  # pylint: disable=global-statement
+    previous = BACKEND
+    BACKEND = backend
+    invalidate()
+    return previous
+
+
+def connect_in_background():
+    """
+    Starts connecting to the database and loading all worksheets
+    without waiting for it, e.g. while the user is typing their
+    name. Data saved by an earlier session is usable at once,
+    writes left in its journal are replayed. Returns the thread.
+    """
+    load_snapshot()
+    if journal.has_pending():
+        replay_in_background()
+
+    def preload():
+        try:
+            with LOCK:
+                if (isinstance(BACKEND, SqliteBackend)
+                        and mirror.is_empty(BACKEND, WORKSHEETS)):
+                    # the first start with SQLite copies the sheet
+                    mirror.mirror(SHEET, BACKEND, WORKSHEETS)
+                stale = [worksheet for worksheet in WORKSHEETS
+                         if not _unchanged(worksheet)]
+                if stale:
+                    load_all(stale)
+                for log in EVENT_LOGS.values():
+                    _has_log(log)
+            save_snapshot()
+            mirror_in_background()
+        except CONNECT_ERRORS:
+            # the first foreground request connects again
+            # and reports the error to the user
+            pass
+        replica.start(refresh_replica)
+    thread = threading.Thread(target=preload, daemon=True)
+    thread.start()
+    return thread
+
+
+def mirror_in_background():
+    """
+    Starts copying data to the Google sheet in the background
+    if data is kept in SQLite. Returns the thread or None.
+    """
+    if not isinstance(BACKEND, SqliteBackend):
+        return None
+    return mirror.start(mirror_to_sheet)
+
+
+def mirror_to_sheet():
+    """
+    Writes events logged in the database back to their worksheets,
+    so the copy gets every change, and copies WORKSHEETS to
+    the Google sheet. Returns the number of written cells and
+    appended rows as a tuple. Called by the mirror thread.
+    """
+    for worksheet in EVENT_LOGS:
+        write_back(worksheet)
+    return mirror.mirror(BACKEND, SHEET, WORKSHEETS)
+
+
+def refresh_replica():
     """
-    Fetches staff data from Google Spreadsheet. Returns
-    a list of dictionaries.
+    Fetches WORKSHEETS which have changed since they were cached,
+    in one request, and puts them into cache. Rows are not
+    replaced if they were changed here while fetching, or if local
+    changes wait to be written. Returns the list of replaced
+    worksheets. Called by the replica thread.
     """
+    with LOCK:
+        if (PENDING or BATCH["depth"] > 0 or FLUSHING.locked() or
+                journal.has_pending()):
+            return []
+        logs = tuple(log for log in EVENT_LOGS.values() if log in CACHE)
+        stale = [worksheet for worksheet in WORKSHEETS + logs
+                 if not _unchanged(worksheet)]
+        current = revision()
+        writes = LOCAL["writes"]
+    if not stale:
+        return []
+    # fetched without the lock, so foreground reads do not wait
+    data = BACKEND.batch_get_values(stale)
+    with LOCK:
+        if (LOCAL["writes"] != writes or PENDING or BATCH["depth"] > 0 or
+                FLUSHING.locked()):
+            return []  # the next refresh fetches again
+        for (worksheet, values) in data.items():
+            _store(worksheet, values, current)
+    return stale
+
+
+def stale_note(worksheet):
+    """
+    Returns a note(str) on how old the shown rows of a worksheet
+    are, or an empty string if the replica thread does not run.
+    """
+    entry = CACHE.get(worksheet)
+    if not replica.is_running() or entry is None:
+        return ""
+    age = max(time.monotonic() - entry["time"], 0)
+    if age == float("inf"):
+        return "\t(data is being refreshed)"
+    age = f"{age:.0f} s" if age < 120 else f"{age / 60:.0f} min"
+    if replica.STATE["error"]:
+        return f"\t(offline, data from {age} ago)"
+    return f"\t(data from {age} ago)"
+
+
+def load_all(worksheets=WORKSHEETS):
+    """
+    Fetches several worksheets in one request and puts them
+    into cache. Returns a dictionary {worksheet: list of rows}.
+    """
+    with LOCK:
+        current = revision()
+        data = BACKEND.batch_get_values(list(worksheets))
+        for (worksheet, values) in data.items():
+            _store(worksheet, values, current)
+    return data
+
+
+def revision():
+    """
+    Returns the revision of the spreadsheet(str), which changes
+    with every edit, or None if it is not known. The answer
+    of the backend is reused for REVISION_EVERY seconds.
+    Other modules can key their own caches on it.
+    """
+    with LOCK:
+        if (REVISION["backend"] is not BACKEND
+                or time.monotonic() - REVISION["time"] >= REVISION_EVERY):
+            try:
+                current = BACKEND.revision()
+            except CONNECT_ERRORS:
+                return None
+            REVISION.update(value=current, time=time.monotonic(),
+                            backend=BACKEND)
+        return REVISION["value"]
+
+
+def _unchanged(worksheet):
+    """
+    Checks if the spreadsheet is still at the revision cached
+    rows of a worksheet were fetched at. If so, cached rows
+    of all worksheets fetched at it are renewed without
+    fetching them. Returns boolean.
+    """
+    entry = CACHE.get(worksheet)
+    if entry is None or entry.get("revision") is None:
+        return False
+    current = revision()
+    if current is None or current != entry["revision"]:
+        return False
+    now = time.monotonic()
+    for other in CACHE.values():
+        if other.get("revision") == current:
+            other.update(time=now, loaded=now)
+    return True
+
+
+def load_snapshot():
+    """
+    Puts worksheets saved by an earlier session into cache,
+    where they are replaced by fresh data when it is fetched.
+    Returns the revision of the snapshot or None if there is
+    no snapshot.
+    """
+    if not SNAPSHOT_FILE or CACHE_TTL <= 0:
+        return None
+    loaded = snapshot.load(SNAPSHOT_FILE, SNAPSHOT_WORKSHEETS)
+    if loaded is None:
+        return None
+    (stamp, data) = loaded
+    with LOCK:
+        for (worksheet, values) in data.items():
+            if worksheet not in CACHE and values:
+                _store(worksheet, values, stamp or None)
+                # cells may have been edited since, fetch fully
+                CACHE[worksheet]["loaded"] = float("-inf")
+    return stamp
+
+
+def save_snapshot():
+    """
+    Writes cached SNAPSHOT_WORKSHEETS to the snapshot file for
+    the next session, stamped with the revision of the spreadsheet
+    they were fetched at, if all have the same one. Returns boolean.
+    """
+    if not SNAPSHOT_FILE:
+        return False
+    with LOCK:
+        entries = [CACHE[worksheet] for worksheet in SNAPSHOT_WORKSHEETS
+                   if worksheet in CACHE]
+        data = {worksheet: [list(row) for row in CACHE[worksheet]["values"]]
+                for worksheet in SNAPSHOT_WORKSHEETS if worksheet in CACHE}
+    if not data:
+        return False
+    stamps = {entry.get("revision") for entry in entries}
+    stamp = stamps.pop() if len(stamps) == 1 else None
     try:
-        data = SHEET.worksheet(worksheet).get_values()
-        if data is None:
-            raise ValueError
+        snapshot.save(SNAPSHOT_FILE, data, revision=stamp or "")
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def invalidate(worksheet=None):
+    """
+    Drops cached data of a worksheet, or of all worksheets
+    if none is given, so the next read fetches it again.
+    """
+    if worksheet is None:
+        CACHE.clear()
+        SCHEMAS.clear()
+        LOGS.clear()
+        REVISION.update(value=None, time=float("-inf"), backend=None)
+    else:
+        CACHE.pop(worksheet, None)
+
+
+def cached(worksheet):
+    """
+    Returns cached rows of a worksheet or None if there are
+    none or they are older than CACHE_TTL. Inside batch()
+    cached rows do not expire, they hold queued updates. While
+    the replica thread runs, cached rows do not expire either,
+    it keeps them fresh, see stale_note().
+    """
+    entry = CACHE.get(worksheet)
+    if entry is None:
+        return None
+    if replica.is_running():
+        return entry["values"]
+    if BATCH["depth"] == 0 and time.monotonic() - entry["time"] >= CACHE_TTL:
+        return None
+    return entry["values"]
+
+
+def _store(worksheet, values, current=None):
+    """
+    Puts fetched rows of a worksheet into cache. Takes in
+    the revision of the spreadsheet taken before fetching.
+    """
+    if values:
+        _set_schema(worksheet, values[0])
+    if CACHE_TTL > 0 or BATCH["depth"] > 0:
+        now = time.monotonic()
+        CACHE[worksheet] = {"time": now, "loaded": now, "values": values,
+                            "revision": current, "stamp": next(STAMPS)}
+
+
+def _trim(row):
+    """
+    Returns a row(list) without empty cells at the end.
+    """
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _append_only(worksheet):
+    """
+    Checks if rows are only appended to a worksheet, so syncing
+    new rows misses no change: it is in INCREMENTAL or changed
+    through its event log, which is known to exist. Cells written
+    back by compaction are fetched after the compacted event is
+    synced. Returns boolean.
+    """
+    if worksheet in INCREMENTAL:
+        return True
+    log = EVENT_LOGS.get(worksheet)
+    return log is not None and LOGS.get(log) is True
+
+
+def _sync(worksheet):
+    """
+    Fetches only rows added to a worksheet after the cached
+    ones, including rows appended by others. Returns updated
+    rows or None if the worksheet needs to be fetched fully:
+    it is not append-only or the header or the last cached
+    row has changed, e.g. rows were deleted.
+    """
+    entry = CACHE.get(worksheet)
+    if (entry is None or not _append_only(worksheet) or
+            time.monotonic() - entry["loaded"] >= FULL_SYNC_EVERY):
+        return None
+    values = entry["values"]
+    current = revision()
+    # the last known row is fetched again to check nothing moved
+    (header, tail) = BACKEND.get_tail(worksheet, len(values))
+    if (_trim(header) != _trim(values[0]) or not tail or
+            _trim(tail[0]) != _trim(values[-1])):
+        return None
+    entry["time"] = time.monotonic()
+    entry["revision"] = current
+    _append_cached(worksheet, tail[1:])
+    if any(row[1:2] == [events.COMPACTED] for row in tail[1:]):
+        # others wrote events back to cells, which are not synced
+        for (name, log) in EVENT_LOGS.items():
+            if log == worksheet and name in CACHE:
+                CACHE[name].update(time=float("-inf"), loaded=float("-inf"),
+                                   revision=None)
+    log = EVENT_LOGS.get(worksheet)
+    if tail[1:] and log in CACHE:
+        # rows are appended by a compaction, its event follows them
+        CACHE[log].update(time=float("-inf"), revision=None)
+    return values
+
+
+def _read(worksheet):
+    """
+    Returns rows of a worksheet from cache or fetches them.
+    The returned list is shared with the cache. A miss on one
+    of WORKSHEETS fetches all not yet loaded ones in one request,
+    expired append-only worksheets are synced incrementally.
+    Expired rows are used again if the spreadsheet has not been
+    changed since they were fetched, see revision(). Cached rows
+    are returned even if expired while the journal has local
+    changes or the database is not available.
+    """
+    data = cached(worksheet)
+    if data is not None:
+        return data
+    with LOCK:
+        data = cached(worksheet)
+        if data is not None:
+            return data
+        entry = CACHE.get(worksheet)
+        if entry is not None and journal.has_pending():
+            # local changes are not in the database yet
+            return entry["values"]
+        if _unchanged(worksheet):
+            return entry["values"]
+        try:
+            return _fetch(worksheet)
+        except DB_ERRORS:
+            if entry is None:
+                raise
+            # the database is not available, old data will do
+            return entry["values"]
+
+
+def _fetch(worksheet):
+    """
+    Fetches rows of a worksheet: syncs it incrementally,
+    or fetches it along with other WORKSHEETS not loaded yet,
+    or fetches it alone.
+    """
+    data = _sync(worksheet)
+    if data is not None:
         return data
-    except (gspread.exceptions.GSpreadException, gspread.exceptions.APIError,
-            gspread.exceptions.WorksheetNotFound, ValueError, TypeError):
+    if worksheet not in CACHE and worksheet in WORKSHEETS:
+        try:
+            return load_all([name for name in WORKSHEETS
+                             if name not in CACHE])[worksheet]
+        except DB_ERRORS:
+            pass  # e.g. another worksheet is missing
+    current = revision()
+    data = BACKEND.get_values(worksheet)
+    if data is None:
+        raise ValueError
+    _store(worksheet, data, current)
+    return data
+
+
+def _patch_cells(worksheet, cells):
+    """
+    Applies written cells((row, col, value) tuples)
+    to the cached copy of a worksheet.
+    """
+    with LOCK:
+        LOCAL["writes"] += 1
+        entry = CACHE.get(worksheet)
+        if entry is None:
+            return
+        entry["stamp"] = next(STAMPS)
+        values = entry["values"]
+        for (row, col, value) in cells:
+            if row > len(values):
+                invalidate(worksheet)
+                return
+            line = values[row - 1]
+            line.extend([""] * (col - len(line)))
+            line[col - 1] = str(value)
+
+
+def _append_cached(worksheet, rows, first=None):
+    """
+    Adds appended rows(list of lists) to the cached copy
+    of a worksheet and to its row locator. Takes in the number
+    of the first appended row if known: if others have appended
+    rows meanwhile, the cache is marked as expired instead, so
+    the next read fetches all new rows.
+    """
+    with LOCK:
+        LOCAL["writes"] += 1
+        entry = CACHE.get(worksheet)
+        if entry is None:
+            return
+        entry["stamp"] = next(STAMPS)
+        values = entry["values"]
+        if first is not None and first != len(values) + 1:
+            entry.update(time=float("-inf"), revision=None)
+            return
+        width = len(values[0]) if values else 0
+        for row in rows:
+            values.append([str(value) for value in row])
+            # rows read from the sheet may lack empty cells at the end
+            values[-1].extend([""] * (width - len(values[-1])))
+            if "index" in entry:
+                new = dict(zip(values[0], values[-1]))
+                entry["index"]["rows"][row_key(worksheet, new)] = len(values)
+
+
+def build_index(worksheet, values):
+    """
+    Maps header names to column numbers and key values
+    (see KEY_COLUMNS) to row numbers. Takes in rows of
+    a worksheet. If a key repeats, the last row wins.
+    """
+    header = values[0] if values else []
+    columns = {name: num for (num, name) in enumerate(header, start=1)}
+    keys = [columns.get(name, 0) - 1
+            for name in key_columns(worksheet)]
+    rows = {}
+    for (num, row) in enumerate(values[1:], start=2):
+        rows[tuple(row[col] if 0 <= col < len(row) else ""
+                   for col in keys)] = num
+    return {"columns": columns, "rows": rows}
+
+
+def key_columns(worksheet):
+    """
+    Returns names of columns which identify a row of a worksheet.
+    """
+    return KEY_COLUMNS.get(worksheet, ("NAME",))
+
+
+def row_key(worksheet, obj):
+    """
+    Returns values of key columns of an object(dict) as a tuple.
+    """
+    return tuple(obj.get(name, "")
+                 for name in key_columns(worksheet))
+
+
+def _index(worksheet, refresh=False):
+    """
+    Returns the row locator of a worksheet, builds it
+    from cached rows if needed.
+    """
+    if refresh:
+        invalidate(worksheet)
+    values = _read(worksheet)
+    entry = CACHE.get(worksheet)
+    if entry is None:
+        return build_index(worksheet, values)
+    if "index" not in entry:
+        entry["index"] = build_index(worksheet, values)
+    return entry["index"]
+
+
+def locate(worksheet, obj, attr):
+    """
+    Finds a cell to update without searching the spreadsheet.
+    Takes in an object(dict) and a column name. Returns
+    a (row, col) tuple, raises CellNotFound if there is no
+    such object or column.
+    """
+    key = row_key(worksheet, obj)
+    index = _index(worksheet)
+    if key not in index["rows"]:
+        # the row may have been added by someone else
+        index = _index(worksheet, refresh=True)
+    if key not in index["rows"] or attr not in index["columns"]:
+        raise gspread.exceptions.CellNotFound(f"{key} {attr}")
+    return (index["rows"][key], index["columns"][attr])
+
+
+def _reindex(worksheet, row, attr, value):
+    """
+    Keeps the row locator correct after a key column of
+    a row has been changed.
+    """
+    index = CACHE.get(worksheet, {}).get("index")
+    if index is None:
+        return
+    names = key_columns(worksheet)
+    if attr not in names:
+        return
+    values = CACHE[worksheet]["values"]
+    obj = dict(zip(values[0], values[row - 1]))
+    old_key = row_key(worksheet, obj)
+    obj[attr] = value
+    if index["rows"].get(old_key) == row:
+        del index["rows"][old_key]
+    index["rows"][row_key(worksheet, obj)] = row
+
+
+def _set_schema(worksheet, header):
+    """
+    Registers column names of a worksheet, taken from
+    its first row(list).
+    """
+    types = COLUMN_TYPES.get(worksheet, {})
+    SCHEMAS[worksheet] = {
+        "columns": tuple(header),
+        "positions": {name: num for (num, name)
+                      in enumerate(header, start=1)},
+        "types": {name: types.get(name, str) for name in header}}
+
+
+def schema(worksheet):
+    """
+    Returns columns of a worksheet(dict): "columns" - names in
+    order, "positions" - column number of every name, "types" -
+    expected type of every column. Only the first row is fetched,
+    once, unless the worksheet has been fetched already.
+    """
+    with LOCK:
+        if worksheet not in SCHEMAS:
+            values = cached(worksheet)
+            if values is None:
+                values = BACKEND.get_range(worksheet, 1, 1)
+            _set_schema(worksheet, values[0] if values else [])
+        return SCHEMAS[worksheet]
+
+
+def new_row(worksheet, values):
+    """
+    Takes in values of a new row(dict of column names and
+    values). Returns the row(list) in the order of columns,
+    missing columns are empty. Raises KeyError for a column
+    the worksheet does not have and ValueError for a value
+    which is not of the expected type.
+    """
+    columns = schema(worksheet)
+    for (name, value) in values.items():
+        expected = columns["types"][name]
+        if value != "" and not isinstance(value, expected):
+            expected(value)  # raises ValueError if not convertible
+    return [values.get(name, "") for name in columns["columns"]]
+
+
+def as_dict(worksheet, row):
+    """
+    Takes in a row(list) of a worksheet. Returns
+    a dictionary of column names and values.
+    """
+    return dict(zip(schema(worksheet)["columns"], row))
+
+
+def worksheet_info(worksheet):
+    """
+    Returns metadata of a worksheet(dict): id, title, rows,
+    cols and header(list of column names).
+    """
+    info = dict(BACKEND.metadata(worksheet))
+    info["header"] = list(schema(worksheet)["columns"])
+    return info
+
+
+def get_worksheet(worksheet):
+    """
+    Fetches data of a worksheet from the database or
+    the cache. Returns a list of lists.
+    """
+    try:
+        return [list(row) for row in _read(worksheet)]
+    except DB_ERRORS + (ValueError, TypeError):
         print("\nSorry, something went wrong accessing database.")
         user_input = input("press 1 - Try again\npress x - Exit\n")
         if user_input == "1":
             print("Trying...")
-            get_worksheet(worksheet)
+            return get_worksheet(worksheet)
         if user_input == "x":
             sys.exit()
 
 
+def read_with_revision(worksheet):
+    """
+    Returns rows of a worksheet(list of lists) and the revision
+    of the spreadsheet(str) they were fetched at, or None if it is
+    not known, as a tuple. Raises DB_ERRORS.
+    """
+    with LOCK:
+        values = [list(row) for row in _read(worksheet)]
+        entry = CACHE.get(worksheet)
+        return (values, entry.get("revision") if entry else None)
+
+
 def update_worksheet(data, worksheet):
     """
     Writes data passed as an argument to a worksheet
-    passed as an argument.
+    passed as an argument. If the database is not available,
+    data is saved to the journal and written later.
+    """
+    append_data([data], worksheet)
+
+
+def append_data(rows, worksheet):
+    """
+    Writes rows(list of lists) to a worksheet in one request.
+    If the database is not available, they are saved to the
+    journal and written later.
     """
+    operation = {"op": "append", "worksheet": worksheet, "rows": rows}
+    if journal.has_pending():
+        # earlier writes are waiting, this one has to follow them
+        _append_cached(worksheet, rows)
+        _save_offline([operation])
+        return
     try:
-        SHEET.worksheet(worksheet).append_row(data)
-    except (gspread.exceptions.GSpreadException, gspread.exceptions.APIError,
-            gspread.exceptions.WorksheetNotFound):
-        print("\nDatabase is not available, I couldn't save your data")
-        user_input = input("press 1 - Try again\n"
-                           "press x - Continue without saving\n")
-        if user_input == "1":
-            print("Trying...")
-            update_worksheet(data, worksheet)
-        if user_input == "x":
-            print("Your data was not saved.")
+        first = BACKEND.append_rows(worksheet, rows)
+        _append_cached(worksheet, rows, first)
+    except DB_ERRORS:
+        print("\nDatabase is not available.")
+        _append_cached(worksheet, rows)
+        _save_offline([operation])
     else:
         print("\n\t\tSaved successfully!")
 
 
-def get_data(worksheet):
+def get_columns(worksheet, columns):
     """
-    Creates a list of dictionaries from data.
+    Returns values of columns(list of column names) of every row,
+    the header first, as a list of lists. Cached rows are used
+    if there are any, otherwise only these columns are fetched.
     """
-    response = get_worksheet(worksheet)
-    keys = response[0]
-    data = []
-    for item in response[1:]:
-        data.append(dict(zip(keys, item)))
-    return data
+    cols = [schema(worksheet)["positions"][name] for name in columns]
+    values = cached(worksheet)
+    entry = CACHE.get(worksheet)
+    if values is None and entry is not None and (
+            journal.has_pending() or _unchanged(worksheet)):
+        # local changes are not saved yet or nothing has changed
+        values = entry["values"]
+    if values is None:
+        try:
+            return BACKEND.get_columns(worksheet, cols)
+        except DB_ERRORS:
+            values = _read(worksheet)
+    return [[row[col - 1] if col <= len(row) else "" for col in cols]
+            for row in values]
+
+
+def get_data(worksheet, query=None, since=None):
+    """
+    Creates a list of records from data. Records are
+    read and changed like dictionaries (see records module).
+    Takes in optional query(dict of column names and values)
+    and since(date): only rows with these values and a DATE
+    not before since are returned. A backend with select(),
+    i.e. SQLite, answers this with indexes. Events logged for
+    the worksheet are applied to its rows, see log_event().
+    """
+    tail = _event_tail(worksheet)
+    select = getattr(BACKEND, "select", None)
+    values = None
+    if ((query or since) and select is not None and not PENDING
+            and not journal.has_pending()):
+        try:
+            values = _select(worksheet, query, since, tail)
+        except DB_ERRORS:
+            pass  # read cached data below
+    if values is None:
+        values = get_worksheet(worksheet)
+    records = to_records(events.fold(values, tail))
+    if query:
+        records = [record for record in records
+                   if all(record.get(name) == value
+                          for (name, value) in query.items())]
+    if since:
+        day = since.strftime("%Y%m%d")
+        records = [record for record in records
+                   if _sortable(record.get("DATE", "")) >= day]
+    return records
+
+
+def _select(worksheet, query, since, tail):
+    """
+    Reads rows with query values and a DATE not before since
+    with select() of the backend, and rows which logged events
+    (tail) may change to match, so events can be applied to them.
+    Returns rows(list of lists), the header first.
+    """
+    values = BACKEND.select(worksheet, query, since)
+    filtered = set(query or {}) | ({"DATE"} if since else set())
+    header = values[0]
+
+    def key(row):
+        found = dict(zip(header, row))
+        return tuple(found.get(name, "") for name in events.KEY)
+
+    keys = {key(row) for row in values[1:]}
+    for event in tail:
+        if (event[1] == events.CREATED or tuple(event[2:4]) in keys or
+                not filtered & set(events.changes_of(event))):
+            continue
+        keys.add(tuple(event[2:4]))
+        values += BACKEND.select(worksheet,
+                                 dict(zip(events.KEY, event[2:4])))[1:]
+    return values
+
+
+def changes_since(worksheet, mark):
+    """
+    Tells other modules what has changed in rows of a worksheet
+    returned by get_data() since mark, so they can update data
+    derived from them instead of building it again. Rows are read
+    like get_data() does. Takes in a mark returned by an earlier
+    call or None. Returns a tuple: events logged since mark(list,
+    see events module) or None if rows may have changed otherwise,
+    and a new mark, None if it is not known.
+    """
+    names = [worksheet]
+    log = EVENT_LOGS.get(worksheet)
+    if log is not None and _has_log(log):
+        names.insert(0, log)  # syncing the log may expire the worksheet
+    try:
+        for name in names:
+            _read(name)
+    except DB_ERRORS + (ValueError, ):
+        return (None, None)
+    entries = [CACHE.get(name) for name in names]
+    if any(entry is None or entry.get("stamp") is None
+           for entry in entries):
+        return (None, None)  # caching is off
+    stamp = entries[-1]["stamp"]
+    # the log is append-only while its cached list is kept
+    logged = entries[0]["values"] if len(entries) > 1 else []
+    new = (stamp, logged, len(logged))
+    if mark is None or mark[0] != stamp or mark[1] is not logged:
+        return (None, new)
+    return ([event for event in logged[mark[2]:]
+             if len(event) > 1 and event[1] != events.COMPACTED], new)
+
+
+def _has_log(log):
+    """
+    Checks if the event log worksheet exists, once. Returns
+    boolean, False while the database is not available.
+    """
+    if log not in LOGS:
+        try:
+            _read(log)
+        except gspread.exceptions.WorksheetNotFound:
+            LOGS[log] = False
+        except DB_ERRORS:
+            return False
+        else:
+            LOGS[log] = True
+    return LOGS[log]
+
+
+def _event_tail(worksheet):
+    """
+    Returns events logged for a worksheet which are not written
+    back to it yet(list of rows), empty if it has no log.
+    """
+    log = EVENT_LOGS.get(worksheet)
+    if log is None or not _has_log(log):
+        return []
+    try:
+        return events.tail(_read(log))[1]
+    except DB_ERRORS:
+        # the log is not available, rows are shown as last written
+        return []
+
+
+def log_event(worksheet, kind, row, changes=None):
+    """
+    Records a change of a row(dict) as an event appended to the
+    event log of the worksheet, no row has to be found. Takes in
+    a kind of event(see events module) and changes(dict of column
+    names and values), none for a created row. Changes the row
+    like update_data. Without a log, the row is written in place.
+    Returns the row.
+    """
+    return log_events(worksheet, kind, [row], changes)[0]
+
+
+def log_events(worksheet, kind, rows, changes=None):
+    """
+    Records the same change of several rows(list of dicts) like
+    log_event(), all events are appended in one request. Without
+    a log, created rows are appended in one request and changed
+    cells are written in one request. Returns the rows.
+    """
+    log = EVENT_LOGS.get(worksheet)
+    if log is None or not _has_log(log):
+        if changes is None:
+            append_data([new_row(worksheet, row) for row in rows], worksheet)
+            return rows
+        with batch():
+            for row in rows:
+                for (attr, value) in changes.items():
+                    update_data(worksheet, row, attr, value)
+        return rows
+    if changes is None:
+        for row in rows:
+            new_row(worksheet, row)  # raises ValueError for invalid values
+    append_data([events.new_event(kind, row, changes or dict(row))
+                 for row in rows], log)
+    for row in rows:
+        row.update(changes or {})
+    if len(_event_tail(worksheet)) >= COMPACT_AFTER:
+        compact(worksheet)
+    return rows
+
+
+def compact(worksheet):
+    """
+    Writes rows of a worksheet with logged events applied back
+    to it: changed cells in one request, created rows in another.
+    Then appends a "compacted" event, so only later events are
+    applied when reading. Returns the number of written events
+    or None if the database is not available or another terminal
+    has appended rows meanwhile, e.g. it is compacting too.
+    Created rows written back before the "compacted" event is
+    read are not applied again, see events.fold().
+    """
+    log = EVENT_LOGS[worksheet]
+    if journal.has_pending():
+        return None
+    with LOCK:
+        try:
+            data = BACKEND.batch_get_values([worksheet, log])
+            (_, tail) = events.tail(data[log])
+            if not tail:
+                return 0
+            before = data[worksheet]
+            (cells, rows) = mirror.diff(
+                before, events.fold([list(row) for row in before], tail))
+            if len(BACKEND.get_tail(worksheet, len(before))[1]) != 1:
+                return None  # rows were appended meanwhile
+            if cells:
+                BACKEND.batch_update({worksheet: cells})
+            if rows:
+                BACKEND.append_rows(worksheet, rows)
+            BACKEND.append_rows(log, [events.marker(len(data[log]))])
+        except DB_ERRORS:
+            return None
+        finally:
+            for name in (worksheet, log):
+                if name in CACHE:
+                    CACHE[name].update(time=float("-inf"), revision=None)
+    return len(tail)
+
+
+def write_back(worksheet):
+    """
+    Compacts the event log of a worksheet if it has one, so its
+    rows are current as stored, e.g. to read them page by page.
+    Returns boolean, False if logged events may be left.
+    """
+    log = EVENT_LOGS.get(worksheet)
+    if log is None or not _has_log(log):
+        return True
+    return compact(worksheet) is not None
+
+
+def _sortable(day):
+    """
+    Takes in a date(str) in dd-mm-yyyy format. Returns it
+    as yyyymmdd, which compares in date order.
+    """
+    return day[6:10] + day[3:5] + day[0:2]
 
 
 def update_data(worksheet, obj, attr, value):
     """
     Updates values of given objects on given worksheet.
     Takes three arguments: (object to update, attribute to update,
-    new value).
+    new value). Inside batch() the update is queued and
+    written later together with others. If the database is
+    not available, the update is saved to the journal.
     """
+    operation = {"op": "update", "worksheet": worksheet,
+                 "key": dict(zip(key_columns(worksheet),
+                                 row_key(worksheet, obj))),
+                 "attr": attr, "value": value}
+    try:
+        (row, col) = locate(worksheet, obj, attr)
+    except gspread.exceptions.CellNotFound:
+        print(f"\nSorry, {worksheet}({attr}) of {obj.get('NAME')} "
+              "was not found in the database.")
+        return None
+    except DB_ERRORS:
+        (row, col) = (None, None)
+    else:
+        _reindex(worksheet, row, attr, value)
+        _patch_cells(worksheet, [(row, col, value)])
+    obj[attr] = value
+    if BATCH["depth"] > 0:
+        _enqueue(dict(operation, cell=(row, col), saved=None))
+        return obj
+    if row is None or journal.has_pending():
+        _save_offline([operation])
+        return obj
     try:
-        row = SHEET.worksheet(worksheet).find(obj["NAME"]).row
-        col = SHEET.worksheet(worksheet).find(attr).col
-        if worksheet == "bookings":
-            cell_list = SHEET.worksheet(worksheet).findall(obj["NAME"])
-            # find a row
-            rows = [cell.row for cell in cell_list]
-            for r in rows:
-                if obj["DATE"] in SHEET.worksheet(worksheet).row_values(r):
-                    row = r
-        SHEET.worksheet(worksheet).update_cell(row, col, ("'"+value))
+        BACKEND.update_cells(worksheet, [(row, col, value)])
+    except DB_ERRORS:
+        print("\nDatabase is not available.")
+        _save_offline([operation])
+    else:
         print(f"\t\t{worksheet.capitalize()}({attr}) info was "
               "successfully updated!")
-        obj[attr] = value
-        return obj
-    except (gspread.exceptions.GSpreadException, gspread.exceptions.APIError,
-            gspread.exceptions.WorksheetNotFound):
-        print("\nDatabase is not available, I couldn't save your data")
-        user_input = input("press 1 - Try again\n"
-                           "press x - Continue without saving\n")
-        if user_input == "1":
-            print("Trying...")
-            update_data(worksheet, obj, attr, value)
-        if user_input == "x":
-            print("Your data was not saved.")
+    return obj
+
+
+def _save_offline(operations):
+    """
+    Records write operations(list of dictionaries) in the
+    journal and starts replaying it in the background.
+    """
+    for operation in operations:
+        journal.record(operation)
+    replay_in_background()
+    print("\t\tSaved locally, it will be written to "
+          "the database automatically.")
+
+
+def replay_journal():
+    """
+    Writes journaled operations to the database in order.
+    Updates find their rows by key columns in freshly fetched
+    data. Appended rows which are there already, written by
+    a replay cut short before it was marked done, are skipped.
+    Requests are made without holding LOCK, so reads and writes
+    of the menus go on meanwhile. Returns the number of written
+    operations or None if the database is still not available.
+    """
+    indexes = {}
+    written = {}
+
+    def apply(operation):
+        worksheet = operation["worksheet"]
+        if worksheet not in indexes:
+            values = BACKEND.get_values(worksheet)
+            indexes[worksheet] = build_index(worksheet, values)
+            written[worksheet] = {tuple(_trim(row)) for row in values}
+        index = indexes[worksheet]
+        if operation["op"] == "append":
+            rows = [row for row in operation["rows"] if tuple(
+                _trim(map(str, row))) not in written[worksheet]]
+            if not rows:
+                return True
+            first = BACKEND.append_rows(worksheet, rows)
+            for (num, row) in enumerate(rows, start=first):
+                new = dict(zip(index["columns"], map(str, row)))
+                index["rows"][row_key(worksheet, new)] = num
+                written[worksheet].add(tuple(_trim(map(str, row))))
+            return True
+        key = row_key(worksheet, operation["key"])
+        row = index["rows"].get(key)
+        col = index["columns"].get(operation["attr"])
+        if row is None or col is None:
+            return False  # the row does not exist any more
+        BACKEND.update_cells(worksheet, [(row, col, operation["value"])])
+        if operation["attr"] in operation["key"]:
+            new = dict(operation["key"])
+            new[operation["attr"]] = operation["value"]
+            del index["rows"][key]
+            index["rows"][row_key(worksheet, new)] = row
+        return True
+
+    try:
+        count = journal.replay(apply)
+    except DB_ERRORS as error:
+        journal.STATE["error"] = str(error)
+        return None
+    finally:
+        with LOCK:
+            for worksheet in indexes:
+                # written rows may be placed after rows of others
+                if worksheet in CACHE:
+                    CACHE[worksheet].update(time=float("-inf"),
+                                            revision=None)
+    journal.STATE["error"] = None
+    return count
+
+
+def replay_in_background():
+    """
+    Starts a thread replaying the journal until it is empty.
+    """
+    return journal.start(replay_journal)
+
+
+@contextmanager
+def batch():
+    """
+    Collects cell updates made by update_data inside a with
+    block and writes them in one request when the block ends,
+    or earlier when there are BATCH_SIZE of them or the first
+    one waits for BATCH_WAIT seconds. Yields a list which
+    receives an update(dict) with "saved" True or False for
+    every written cell.
+    """
+    with LOCK:
+        BATCH["depth"] += 1
+        if BATCH["depth"] == 1:
+            BATCH["results"] = []
+        results = BATCH["results"]
+    try:
+        yield results
+    finally:
+        with LOCK:
+            BATCH["depth"] -= 1
+            last = BATCH["depth"] == 0
+        if last:
+            _flush_early()
+            with LOCK:
+                BATCH["results"] = None
+            if CACHE_TTL <= 0:
+                invalidate()
+
+
+def _enqueue(update):
+    """
+    Queues an update, writes the queue if it is too long
+    and starts a timer writing it after BATCH_WAIT.
+    """
+    with LOCK:
+        PENDING.append(update)
+        full = len(PENDING) >= BATCH_SIZE
+        if not full and BATCH["timer"] is None:
+            BATCH["timer"] = threading.Timer(BATCH_WAIT, _flush_early)
+            BATCH["timer"].daemon = True
+            BATCH["timer"].start()
+    if full:
+        _flush_early()
+
+
+def _flush_early():
+    """
+    Writes pending updates and adds them to the list
+    yielded by batch().
+    """
+    updates = flush()
+    with LOCK:
+        if BATCH["results"] is not None:
+            BATCH["results"].extend(updates)
+
+
+def flush():
+    """
+    Writes all pending cell updates in one request.
+    Returns a list of updates(dict) with "saved" set to
+    True, or False if they were saved to the journal.
+    """
+    with FLUSHING:
+        with LOCK:
+            updates = PENDING[:]
+            del PENDING[:]
+            if BATCH["timer"] is not None:
+                BATCH["timer"].cancel()
+                BATCH["timer"] = None
+        return _write_updates(updates)
+
+
+def _write_updates(updates):
+    """
+    Writes cell updates(list of dictionaries) in one request
+    or saves them to the journal. Returns the updates.
+    """
+    if not updates:
+        return updates
+    cells = {}
+    for update in updates:
+        cells.setdefault(update["worksheet"], []).append(
+            update["cell"] + (update["value"], ))
+    saved = False
+    if not journal.has_pending() and all(
+            update["cell"][0] is not None for update in updates):
+        try:
+            BACKEND.batch_update(cells)
+            saved = True
+        except DB_ERRORS:
+            print("\nDatabase is not available.")
+    if not saved:
+        _save_offline([{name: update[name] for name in
+                        ("op", "worksheet", "key", "attr", "value")}
+                       for update in updates])
+    for update in updates:
+        update["saved"] = saved
+        if saved:
+            print(f"\t\t{update['worksheet'].capitalize()}"
+                  f"({update['attr']}) info was successfully updated!")
+    return updates
@@ -2,14 +2,12 @@
 Includes staff specific functions.
 """
 import getpass
-from booking_sys.spreadsheet import update_worksheet, get_data, update_data
+from booking_sys.spreadsheet import (update_worksheet, get_data, update_data,
+                                     new_row, as_dict, stale_note)
 from booking_sys.customer import new_phone, search
 from booking_sys.decorators import pretty_print, loop_menu_qx
 
 
-KEYS = get_data("staff")[0]
-
-
 def create_staff(data):
     """
     Creates a new member of staff. Takes in current staff data.
@@ -26,9 +24,10 @@ def create_staff(data):
     contact = new_phone()
     if contact in ["x", "q"]:
         return None
-    user = [user_name, password, contact]
+    user = new_row("staff", {"NAME": user_name, "PASSWORD": password,
+                             "CONTACT": contact})
     update_worksheet(user, "staff")
-    return dict(zip(KEYS, user))
+    return as_dict("staff", user)
 
 
 def get_name(data):
@@ -116,6 +115,9 @@ def print_staff_info(user_input, staff):
     Prints a name and a contact number of a member of staff.
     Takes in user_input(str) and staff data(list of dictionaries).
     """
+    note = stale_note("staff")
+    if note:
+        print(note)
     if user_input == "all":
         for item in staff:
             print(f"\t{item['NAME']} : {item['CONTACT']}")
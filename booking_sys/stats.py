@@ -2,72 +2,113 @@
 Functions related to statistical report.
 """
 import csv
-from datetime import date, datetime
+import json
+import os
+from datetime import date
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-from booking_sys.spreadsheet import get_worksheet, SCOPED_CRED
+import requests
+from google.auth.exceptions import GoogleAuthError
+from booking_sys.spreadsheet import (get_worksheet, get_credentials, revision,
+                                     read_with_revision, DB_ERRORS)
+from booking_sys.connection import shared_session
+from booking_sys import validation as valid
+
+
+UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files"
+BOUNDARY = "booking_sys_upload"
+# {report file: revision of the spreadsheet it was made from}
+REPORTS = {}
 
 
 def upload(my_file, folder):
     """
-    Uploads file to Goggle Drive.
+    Uploads file to Goggle Drive in one multipart request,
+    over the HTTP session shared with the spreadsheet.
+    Returns id of the uploaded file or None.
     """
+    file_metadata = {'name': str(date.today())+'_stats.pdf',
+                     'parents': [folder]}
+    with open(my_file, "rb") as file:
+        content = file.read()
+    body = (f"--{BOUNDARY}\r\n"
+            "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+            f"{json.dumps(file_metadata)}\r\n"
+            f"--{BOUNDARY}\r\n"
+            "Content-Type: application/pdf\r\n\r\n").encode("utf-8")
+    body += content + f"\r\n--{BOUNDARY}--".encode("utf-8")
     try:
-        # Authenticate and construct service.
-        service = build('drive', 'v3', credentials=SCOPED_CRED)
-
-        file_metadata = {'name': str(date.today())+'_stats.pdf',
-                         'parents': [folder]}
-        media = MediaFileUpload(my_file, mimetype='application/pdf')
-        # pylint: disable=maybe-no-member
-        file = service.files().create(body=file_metadata,
-                                      media_body=media,
-                                      fields='id').execute()
-    except HttpError as error:
+        response = shared_session(get_credentials()).post(
+            UPLOAD_URL, params={"uploadType": "multipart", "fields": "id"},
+            data=body, headers={"Content-Type":
+                                f"multipart/related; boundary={BOUNDARY}"})
+        response.raise_for_status()
+    except (requests.exceptions.RequestException, GoogleAuthError) as error:
         print(F'An error occurred: {error}')
-        file = None
-    return file.get('id')
+        return None
+    return response.json().get('id')
 
 
 def calculate_age(birthdate):
     """
     Calculates age based on birthdate.
     """
-    try:
-        bddate = datetime.strptime(birthdate, "%d-%m-%Y").date()
-        today = date.today()
-        if bddate > today:
-            return "This date is from the future. Can't calculate age."
-        age = (today.year - bddate.year -
-               ((today.month, today.day) < (bddate.month, bddate.day)))
-        return str(age)
-    except TypeError:
+    if not isinstance(birthdate, str):
         return "Argument should be str"
-    except ValueError:
+    # parsed once per distinct date, see validation.day_number
+    day = valid.day_number(birthdate)
+    if day is None:
         return "Make sure you use dd-mm-yyyy format"
+    bddate = date.fromordinal(day)
+    today = date.today()
+    if bddate > today:
+        return "This date is from the future. Can't calculate age."
+    age = (today.year - bddate.year -
+           ((today.month, today.day) < (bddate.month, bddate.day)))
+    return str(age)
+
+
+def is_current(report):
+    """
+    Checks if a report file exists and was made from the current
+    revision of the spreadsheet. Returns boolean.
+    """
+    current = revision()
+    return (current is not None and REPORTS.get(report) == current
+            and os.path.exists(report))
 
 
 def data_for_stats():
     """
-    Prepares data for stats and writes it to csv
+    Prepares data for stats and writes it to csv, unless
+    the data has not changed since the last time.
     """
-    data = get_worksheet("customers")
+    if is_current("stats.csv"):
+        return
+    try:
+        # the revision the rows were fetched at, they may be cached
+        (data, current) = read_with_revision("customers")
+    except DB_ERRORS:
+        (data, current) = (get_worksheet("customers"), None)
     for item in data[1:]:
         item[3] = calculate_age(item[3])
     with open("stats.csv", "w", encoding='utf-8', newline="") as file:
         file.truncate()
         writer = csv.writer(file)
         writer.writerows(data)
+    REPORTS["stats.csv"] = current
 
 
 def customers_stats():
     """
-    Writes customers stats in pdf file.
+    Writes customers stats in pdf file and uploads it, unless
+    the data has not changed since the last report.
     """
+    if is_current("stats.pdf"):
+        return
+    # the revision stats.csv was made from
+    current = REPORTS.get("stats.csv")
     dataframe = pd.read_csv('stats.csv')
 
     # histogram with age
@@ -114,4 +155,5 @@ def customers_stats():
     for fig in figs:
         fig.savefig(pdf_pgs, format='pdf')
     pdf_pgs.close()
-    upload("stats.pdf", '1RMQBmiL3ATEkIAtPFmQypM5rcYfzXsD-')
+    if upload("stats.pdf", '1RMQBmiL3ATEkIAtPFmQypM5rcYfzXsD-') is not None:
+        REPORTS["stats.pdf"] = current
@@ -0,0 +1,74 @@
+"""
+Tests for agenda module.
+"""
+from datetime import date
+from booking_sys.agenda import Agenda, day_number
+
+
+BOOKINGS = [{'DATE': '12-10-2022', 'TIME': '20:00', 'NAME': 'Bob'},
+            {'DATE': '10-10-2022', 'TIME': '19:30', 'NAME': 'Ann'},
+            {'DATE': '12-10-2022', 'TIME': '09:00', 'NAME': 'Sue'},
+            {'DATE': '20-10-2022', 'TIME': '18:00', 'NAME': 'Tom'},
+            {'DATE': '31-02-2022', 'TIME': '18:00', 'NAME': 'Kim'}]
+
+
+def names(bookings):
+    """
+    Returns names of bookings(list).
+    """
+    return [booking['NAME'] for booking in bookings]
+
+
+def test_day_number():
+    """
+    Tests day_number() on strings, dates and invalid values.
+    """
+    assert day_number('10-10-2022') == date(2022, 10, 10).toordinal()
+    assert day_number(date(2022, 10, 10)) == day_number('10-10-2022')
+    assert day_number('31-02-2022') is None
+    assert day_number(None) is None
+
+
+def test_agenda():
+    """
+    Tests an agenda returns days and ranges sorted by date and time
+    and leaves out invalid dates.
+    """
+    agenda = Agenda(BOOKINGS)
+    assert len(agenda) == 4
+    assert names(agenda.on('12-10-2022')) == ['Sue', 'Bob']
+    assert agenda.on(date(2022, 10, 11)) == []
+    assert names(agenda.between('11-10-2022', '20-10-2022')) == [
+        'Sue', 'Bob', 'Tom']
+    assert names(agenda.select(('10-10-2022', '19-10-2022'))) == [
+        'Ann', 'Sue', 'Bob']
+    assert names(agenda.select(['20-10-2022', '10-10-2022'])) == [
+        'Ann', 'Tom']
+    assert names(agenda.select(None)) == ['Ann', 'Sue', 'Bob', 'Tom']
+    assert names(agenda) == ['Ann', 'Sue', 'Bob', 'Tom']
+
+
+def test_customer_index():
+    """
+    Tests bookings of a customer and duplicate checks, also after
+    bookings are added and removed one by one.
+    """
+    agenda = Agenda(BOOKINGS)
+    assert names(agenda.of('Bob')) == ['Bob']
+    assert agenda.has('Bob', '12-10-2022')
+    assert not agenda.has('Bob', '10-10-2022')
+    assert not agenda.has('Kim', '31-02-2022')
+    assert agenda.of('Nobody') == []
+    booking = {'DATE': '11-10-2022', 'TIME': '12:00', 'NAME': 'Bob'}
+    assert agenda.add(booking)
+    assert not agenda.add({'DATE': '', 'TIME': '', 'NAME': 'Bob'})
+    assert [item['DATE'] for item in agenda.of('Bob')] == [
+        '11-10-2022', '12-10-2022']
+    assert agenda.find('Bob', date(2022, 10, 11)) is booking
+    assert names(agenda) == ['Ann', 'Bob', 'Sue', 'Bob', 'Tom']
+    assert agenda.remove('Bob', '11-10-2022') is booking
+    assert agenda.remove('Bob', '11-10-2022') is None
+    assert agenda.on('11-10-2022') == []
+    assert agenda.remove('Sue', '12-10-2022')['TIME'] == '09:00'
+    assert names(agenda.on('12-10-2022')) == ['Bob']
+    assert len(agenda) == 3
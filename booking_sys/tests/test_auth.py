@@ -70,3 +70,21 @@ def test_staff_login_for_existing(*args):
     mock_input.assert_called()
     mock_auth.assert_called()
     assert result == data[0]
+
+
+@patch("booking_sys.auth.authorise")
+@patch("booking_sys.auth.get_data")
+@patch('builtins.input')
+def test_staff_login_fetches_data(*args):
+    """
+    Tests staff_login() fetches staff data after the name is entered.
+    """
+    (mock_input, mock_get_data, mock_auth) = args
+    mock_input.return_value = 'Bob'
+    mock_auth.return_value = True
+    mock_get_data.return_value = [{'NAME': 'Bob', 'PASSWORD': '123',
+                                   'CONTACT': ''}]
+    result = staff_login()
+
+    mock_get_data.assert_called_once_with("staff")
+    assert result == mock_get_data.return_value[0]
@@ -0,0 +1,356 @@
+"""
+Tests for backends module.
+"""
+from datetime import date
+from unittest.mock import MagicMock, patch
+import pytest
+from gspread import exceptions, Cell
+from booking_sys.backends import GspreadBackend, MemoryBackend, SqliteBackend
+from booking_sys.throttle import TokenBucket
+
+
+HEADER = ['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC']
+# no waiting for quota in tests
+BUCKET_PATCH = patch("booking_sys.throttle.BUCKET", TokenBucket(1000, 1000))
+BOOKINGS = [HEADER,
+            ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', ''],
+            ['11-10-2022', '19:00', 'Ann', '3', 'Kelly', '', ''],
+            ['12-10-2022', '19:00', 'Bob', '4', 'Kelly', '', '']]
+
+
+def test_memory_get_values():
+    """
+    Tests get_values() returns copies of all rows.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    values = backend.get_values("bookings")
+    assert values == BOOKINGS
+    values[1][0] = "changed"
+    assert backend.get_values("bookings") == BOOKINGS
+
+
+def test_memory_get_range():
+    """
+    Tests get_range() with and without the last row.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    assert backend.get_range("bookings", 1, 1) == [HEADER]
+    assert backend.get_range("bookings", 3) == BOOKINGS[2:]
+    assert backend.get_range("bookings", 2, 3) == BOOKINGS[1:3]
+
+
+def test_memory_append_rows():
+    """
+    Tests append_rows() stores values as text.
+    """
+    backend = MemoryBackend({"customers": [["NAME", "NUM OF BOOKINGS"]]})
+    assert backend.append_rows("customers", [["Bob", 1], ["Ann", 0]]) == 2
+    assert backend.get_values("customers") == [["NAME", "NUM OF BOOKINGS"],
+                                               ["Bob", "1"], ["Ann", "0"]]
+
+
+def test_memory_get_tail():
+    """
+    Tests get_tail() returns the header and the last rows.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    assert backend.get_tail("bookings", 3) == (HEADER, BOOKINGS[2:])
+    assert backend.get_tail("bookings", 5) == (HEADER, [])
+
+
+def test_memory_update_cells():
+    """
+    Tests update_cells() changes only requested cells.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    backend.update_cells("bookings", [(2, 6, "yes"), (4, 7, "yes")])
+    values = backend.get_values("bookings")
+    assert values[1][5] == "yes"
+    assert values[3][6] == "yes"
+    assert values[2] == BOOKINGS[2]
+
+
+def test_memory_find_rows():
+    """
+    Tests find_rows() with one and several columns.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    assert backend.find_rows("bookings", {"NAME": "Bob"}) == [2, 4]
+    assert backend.find_rows("bookings", {"NAME": "Bob",
+                                          "DATE": "12-10-2022"}) == [4]
+    assert backend.find_rows("bookings", {"NAME": "Nobody"}) == []
+
+
+def test_memory_batch_get_values():
+    """
+    Tests batch_get_values() returns every requested worksheet.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS, "staff": [["NAME"]]})
+    assert backend.batch_get_values(["staff", "bookings"]) == {
+        "staff": [["NAME"]], "bookings": BOOKINGS}
+
+
+def test_memory_get_columns():
+    """
+    Tests get_columns() returns only requested columns.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    assert backend.get_columns("bookings", [3, 1]) == [
+        [row[2], row[0]] for row in BOOKINGS]
+    assert sqlite_backend().get_columns("bookings", [3, 1]) == [
+        [row[2], row[0]] for row in BOOKINGS]
+
+
+@BUCKET_PATCH
+def test_gspread_get_columns():
+    """
+    Tests get_columns() downloads only requested columns
+    in one request.
+    """
+    sheet = MagicMock()
+    sheet.values_batch_get.return_value = {"valueRanges": [
+        {"values": [["NAME", "Bob", "Ann", "Bob"]]},
+        {"values": [["CONF", "", "yes"]]}]}
+    backend = GspreadBackend(lambda: sheet)
+    assert backend.get_columns("bookings", [3, 6]) == [
+        ["NAME", "CONF"], ["Bob", ""], ["Ann", "yes"], ["Bob", ""]]
+    sheet.values_batch_get.assert_called_once_with(
+        ["'bookings'!C:C", "'bookings'!F:F"],
+        params={"majorDimension": "COLUMNS"})
+
+
+def test_memory_worksheet_not_found():
+    """
+    Tests a missing worksheet raises the same exception as gspread.
+    """
+    backend = MemoryBackend()
+    with pytest.raises(exceptions.WorksheetNotFound):
+        backend.get_values("bookings")
+
+
+@BUCKET_PATCH
+def test_gspread_connects_lazily():
+    """
+    Tests the spreadsheet is opened on the first request only, once.
+    """
+    connect = MagicMock()
+    connect.return_value.worksheets.return_value = [
+        MagicMock(title="bookings"), MagicMock(title="customers")]
+    backend = GspreadBackend(connect)
+    connect.assert_not_called()
+    backend.get_values("bookings")
+    backend.get_values("customers")
+    connect.assert_called_once()
+
+
+@BUCKET_PATCH
+def test_gspread_batch_get_values():
+    """
+    Tests batch_get_values() reads all worksheets in one request.
+    """
+    sheet = MagicMock()
+    sheet.values_batch_get.return_value = {"valueRanges": [
+        {"range": "'staff'!A1:C2", "values": [["NAME", "PASSWORD"],
+                                              ["Bob"]]},
+        {"range": "'bookings'!A1:Z1000"}]}
+    backend = GspreadBackend(lambda: sheet)
+    assert backend.batch_get_values(["staff", "bookings"]) == {
+        "staff": [["NAME", "PASSWORD"], ["Bob", ""]], "bookings": []}
+    sheet.values_batch_get.assert_called_once_with(["'staff'", "'bookings'"])
+    sheet.worksheets.assert_not_called()
+
+
+@BUCKET_PATCH
+def test_gspread_get_tail():
+    """
+    Tests get_tail() reads the header and the tail in one request.
+    """
+    sheet = MagicMock()
+    sheet.values_batch_get.return_value = {"valueRanges": [
+        {"values": [HEADER]}, {"values": [BOOKINGS[3]]}]}
+    backend = GspreadBackend(lambda: sheet)
+    assert backend.get_tail("bookings", 4) == (HEADER, [BOOKINGS[3]])
+    sheet.values_batch_get.assert_called_once_with(
+        ["'bookings'!A1:ZZ1", "'bookings'!A4:ZZ"])
+
+
+@BUCKET_PATCH
+def test_gspread_worksheet_handles():
+    """
+    Tests worksheet handles are fetched once and fetched
+    again only for a missing title.
+    """
+    sheet = MagicMock()
+    bookings = MagicMock(title="bookings")
+    customers = MagicMock(title="customers", id=7, row_count=1000,
+                          col_count=6)
+    bookings.append_rows.return_value = {
+        "updates": {"updatedRange": "'bookings'!A5:A5"}}
+    sheet.worksheets.return_value = [bookings, customers]
+    backend = GspreadBackend(lambda: sheet)
+
+    backend.get_values("bookings")
+    backend.get_values("customers")
+    assert backend.append_rows("bookings", [["10-10-2022"]]) == 5
+    sheet.worksheets.assert_called_once()
+    bookings.get_values.assert_called_once()
+    assert backend.metadata("customers") == {"id": 7, "title": "customers",
+                                             "rows": 1000, "cols": 6}
+
+    with pytest.raises(exceptions.WorksheetNotFound):
+        backend.get_values("staff")
+    assert sheet.worksheets.call_count == 2
+    sheet.worksheet.assert_not_called()
+
+
+def test_memory_revision():
+    """
+    Tests revision() changes with every write.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    first = backend.revision()
+    assert backend.revision() == first
+    backend.append_rows("bookings", [BOOKINGS[1]])
+    second = backend.revision()
+    backend.update_cells("bookings", [(2, 6, "yes")])
+    assert len({first, second, backend.revision()}) == 3
+
+
+@BUCKET_PATCH
+def test_gspread_revision():
+    """
+    Tests revision() asks Drive for file metadata only.
+    """
+    sheet = MagicMock(id="abc")
+    sheet.client.request.return_value.json.return_value = {
+        "version": "42", "modifiedTime": "2022-10-10T10:00:00.000Z"}
+    backend = GspreadBackend(lambda: sheet)
+    assert backend.revision() == "42"
+    sheet.client.request.assert_called_once_with(
+        "get", "https://www.googleapis.com/drive/v3/files/abc",
+        params={"fields": "version,modifiedTime",
+                "supportsAllDrives": True})
+    sheet.worksheets.assert_not_called()
+
+
+def test_memory_metadata():
+    """
+    Tests metadata() describes worksheet size.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS})
+    assert backend.metadata("bookings") == {"id": 0, "title": "bookings",
+                                            "rows": 4, "cols": 7}
+
+
+@BUCKET_PATCH
+def test_gspread_update_cells():
+    """
+    Tests update_cells() sends all cells in one request.
+    """
+    sheet = MagicMock()
+    backend = GspreadBackend(lambda: sheet)
+    backend.update_cells("bookings", [(2, 6, "yes"), (4, 1, "13-10-2022")])
+    sheet.values_batch_update.assert_called_once_with(
+        body={"valueInputOption": "USER_ENTERED",
+              "data": [{"range": "'bookings'!F2", "values": [["'yes"]]},
+                       {"range": "'bookings'!A4",
+                        "values": [["'13-10-2022"]]}]})
+    sheet.worksheet.assert_not_called()
+
+
+def test_memory_batch_update():
+    """
+    Tests batch_update() writes to several worksheets and
+    writes nothing if one of them does not exist.
+    """
+    backend = MemoryBackend({"bookings": BOOKINGS,
+                             "customers": [["NAME", "CANCELLED"],
+                                           ["Bob", "0"]]})
+    backend.batch_update({"bookings": [(2, 7, "yes")],
+                          "customers": [(2, 2, "1")]})
+    assert backend.get_values("bookings")[1][6] == "yes"
+    assert backend.get_values("customers")[1] == ["Bob", "1"]
+    with pytest.raises(exceptions.WorksheetNotFound):
+        backend.batch_update({"customers": [(2, 2, "2")], "staff": []})
+    assert backend.get_values("customers")[1] == ["Bob", "1"]
+
+
+@BUCKET_PATCH
+def test_gspread_find_rows():
+    """
+    Tests find_rows() searches one column and checks candidates
+    in one batch_get request.
+    """
+    sheet = MagicMock()
+    worksheet = MagicMock(title="bookings")
+    sheet.worksheets.return_value = [worksheet]
+    worksheet.row_values.return_value = HEADER
+    worksheet.findall.return_value = [Cell(2, 3, "Bob"), Cell(4, 3, "Bob")]
+    worksheet.batch_get.return_value = [[BOOKINGS[1]], [BOOKINGS[3]]]
+
+    backend = GspreadBackend(lambda: sheet)
+    rows = backend.find_rows("bookings", {"NAME": "Bob",
+                                          "DATE": "12-10-2022"})
+    assert rows == [4]
+    worksheet.findall.assert_called_once_with("Bob", in_column=3)
+    worksheet.batch_get.assert_called_once_with(["A2:ZZ2", "A4:ZZ4"])
+
+
+def sqlite_backend():
+    """
+    Creates an in-memory SQLite backend with test bookings.
+    """
+    backend = SqliteBackend(":memory:")
+    backend.append_rows("bookings", BOOKINGS[1:])
+    return backend
+
+
+def test_sqlite_get_values():
+    """
+    Tests SQLite backend returns the same rows as it was given.
+    """
+    backend = sqlite_backend()
+    assert backend.get_values("bookings") == BOOKINGS
+    assert backend.get_range("bookings", 1, 2) == BOOKINGS[:2]
+    assert backend.get_tail("bookings", 4) == (HEADER, BOOKINGS[3:])
+    assert backend.metadata("bookings") == {"id": 2, "title": "bookings",
+                                            "rows": 4, "cols": 7}
+    with pytest.raises(exceptions.WorksheetNotFound):
+        backend.get_values("tables")
+
+
+def test_sqlite_append_and_update():
+    """
+    Tests SQLite backend numbers appended rows like the sheet
+    and writes nothing if one of the cells does not exist.
+    """
+    backend = sqlite_backend()
+    assert backend.append_rows("bookings", [["13-10-2022", "18:00", "Kim",
+                                             2]]) == 5
+    assert backend.get_values("bookings")[4] == ["13-10-2022", "18:00",
+                                                 "Kim", "2", "", "", ""]
+    backend.batch_update({"bookings": [(2, 6, "yes"), (5, 7, "yes")]})
+    assert backend.get_values("bookings")[1][5] == "yes"
+    assert backend.get_values("bookings")[4][6] == "yes"
+    with pytest.raises(exceptions.GSpreadException):
+        backend.batch_update({"bookings": [(3, 6, "yes"), (3, 8, "x")]})
+    assert backend.get_values("bookings")[2] == BOOKINGS[2]
+
+
+def test_sqlite_queries():
+    """
+    Tests find_rows() and select() use indexes.
+    """
+    backend = sqlite_backend()
+    assert backend.find_rows("bookings", {"NAME": "Bob"}) == [2, 4]
+    assert backend.select("bookings", {"NAME": "Bob"},
+                          since=date(2022, 10, 11)) == [HEADER, BOOKINGS[3]]
+    assert backend.select("bookings", since=date(2022, 10, 11)) == [
+        HEADER] + BOOKINGS[2:]
+    revision = backend.revision()
+    backend.update_cells("bookings", [(2, 6, "yes")])
+    assert backend.revision() != revision
+    plan = backend.conn.execute(
+        'EXPLAIN QUERY PLAN SELECT "row" FROM "bookings" '
+        'WHERE "NAME" = ? AND "DATE" = ?', ("Bob", "10-10-2022")).fetchall()
+    assert "bookings_name_date" in plan[0][-1]
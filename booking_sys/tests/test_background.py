@@ -0,0 +1,64 @@
+"""
+Tests for background module.
+"""
+import threading
+from unittest.mock import patch
+from gspread import exceptions
+from booking_sys import background
+from run import cleanup
+
+
+def test_needed():
+    """
+    Tests the thread waits before the first call and ends
+    when the task is not needed any more.
+    """
+    state = background.new_state()
+    calls = []
+    thread = background.start(state, lambda: calls.append(1), 0.01,
+                              needed=lambda: len(calls) < 2)
+    thread.join(1)
+    assert not thread.is_alive()
+    assert calls == [1, 1]
+    assert not background.is_running(state)
+
+
+def test_errors():
+    """
+    Tests errors of the task are stored and cleared by
+    the next call without an error.
+    """
+    state = background.new_state(done=None)
+    called = threading.Event()
+    calls = []
+
+    def task():
+        calls.append(1)
+        if len(calls) == 1:
+            raise exceptions.GSpreadException("quota")
+        assert state["error"] == "quota"
+        called.set()
+
+    background.start(state, task, 0.01, errors=background.DB_ERRORS,
+                     done="done")
+    try:
+        assert called.wait(1)
+    finally:
+        background.stop(state)
+    assert state["error"] is None
+    assert state["done"] is not None
+
+
+@patch("booking_sys.mirror.STATE", new_callable=background.new_state)
+@patch("booking_sys.replica.STATE", new_callable=background.new_state)
+@patch("run.save_snapshot")
+def test_cleanup_stops_threads(*args):
+    """
+    Tests cleanup() stops the replica and mirror threads.
+    """
+    (_, replica_state, mirror_state) = args
+    for state in (replica_state, mirror_state):
+        background.start(state, lambda: None, 60)
+    cleanup()
+    assert not replica_state["thread"].is_alive()
+    assert not mirror_state["thread"].is_alive()
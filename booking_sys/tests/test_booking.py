@@ -4,16 +4,28 @@ Tests for booking module.
 from unittest.mock import patch, call
 from datetime import date, timedelta
 import re
+import pytest
 from booking_sys.booking import (dd_mm_yyyy, active, confirmed, cust_bookings,
                                  bookings_menu, view_bookings_menu,
                                  print_bookings, new_date, new_time,
                                  num_of_people, new_booking, to_confirm,
                                  edit_bookings, confirm, update_date,
                                  reschedule, find_bookings, has_duplicates,
-                                 pick_booking, cancel, increment_bookings)
+                                 pick_booking, cancel, increment_bookings,
+                                 calendar, repeat, repeat_dates, date_list,
+                                 recurring_dates, check_dates,
+                                 recurring_booking, availability)
+from booking_sys.backends import MemoryBackend
+from booking_sys.capacity import Availability
+from booking_sys.agenda import Agenda
+from booking_sys.spreadsheet import get_data, log_event, BATCH
+from booking_sys import events
 
 
 # test data
+# worksheet with the header only, read by new_booking()
+HEADERS = MemoryBackend({"bookings": [["DATE", "TIME", "NAME", "PEOPLE",
+                                       "CREATED", "CONF", "CANC"]]})
 config = {"side_effect": (lambda x: re.sub(r'(\d{4})-(\d{1,2})-(\d{1,2})',
           '\\3-\\2-\\1', x))}
 today = re.sub(r'(\d{4})-(\d{1,2})-(\d{1,2})',
@@ -37,6 +49,8 @@ customers = [{'NAME': 'Name1', 'PHONE': '00 11111111111',
              {'NAME': 'Name2', 'PHONE': '00 2222222222',
               'EMAIL': 'test@ma.il', 'BD': '24-06-2000',
               'NUM OF BOOKINGS': '1', 'CANCELLED': '0'}]
+# NAME column of customers as returned by get_columns()
+names = [['NAME']] + [[customer['NAME']] for customer in customers]
 customer_bookings = [{'DATE': tomorrow, 'TIME': '20:00',
                       'NAME': 'Name10', 'PEOPLE': '1', 'CREATED': "Bob",
                       'CONF': 'yes', 'CANC': ''},
@@ -79,6 +93,20 @@ def test_active():
     assert active(True) is None
 
 
+@patch("builtins.print")
+def test_active_invalid_date(mock_print):
+    """
+    Tests active() reports and leaves out bookings with
+    an invalid date.
+    """
+    test = [{'DATE': '31-02-2099', 'TIME': '20:00', 'NAME': 'Name',
+             'PEOPLE': '1', 'CREATED': "Bob", 'CONF': '', 'CANC': ''},
+            customer_bookings[0]]
+    assert active(test) == [customer_bookings[0]]
+    mock_print.assert_called_once_with(
+        "Booking of Name has an invalid date: '31-02-2099'.")
+
+
 def test_confirmed():
     """
     Tests confirmed() with different formats and types of data.
@@ -98,28 +126,44 @@ def test_confirmed():
     assert active(True) is None
 
 
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.AVAILABILITY", new_callable=lambda: {
+    "mark": None, "agenda": None, "days": {}})
+@patch("booking_sys.booking.CALENDAR", new_callable=lambda: {
+    "mark": None, "day": None, "agenda": None})
+@patch("booking_sys.booking.Availability", wraps=Availability)
+@patch("booking_sys.booking.calendar")
+def test_availability_cached(*args):
+    """
+    Tests seats taken on a day are counted again only
+    when bookings have changed.
+    """
+    (mock_calendar, mock_availability, state, _) = args
+    mock_calendar.return_value = Agenda(customer_bookings)
+    logged = []
+    state["mark"] = (1, logged, 0)
+    assert availability(today) is availability(today)
+    availability(today, "Name10")
+    assert mock_availability.call_count == 2
+    state["mark"] = (2, logged, 0)
+    availability(today)
+    assert mock_availability.call_count == 3
+    state["mark"] = None
+    availability(today)
+    availability(today)
+    assert mock_availability.call_count == 5
+
+
+@patch("booking_sys.booking.calendar")
 def test_cust_bookings(*args):
     """
     Tests cust_bookings() with different formats and types of data.
     """
-    (mock_data, mock_active) = args
-    data = [{'DATE': '10-10-2022', 'TIME': '20:00',
-             'NAME': 'Name1', 'PEOPLE': '1', 'CREATED': "Bob",
-             'CONF': '', 'CANC': ''},
-            {'DATE': '10-05-2022', 'TIME': '20:00',
-             'NAME': 'Name2', 'PEOPLE': '2', 'CREATED': "Bob",
-             'CONF': '', 'CANC': ''},
-            {'DATE': '12-09-2022', 'TIME': '20:00',
-             'NAME': 'Name1', 'PEOPLE': '2', 'CREATED': "Bob",
-             'CONF': '', 'CANC': 'yes'}]
-    mock_active.return_value = data
-    name = "Name1"
+    (mock_calendar, ) = args
+    mock_calendar.return_value = Agenda(customer_bookings)
 
-    assert cust_bookings(name) == [data[0], data[2]]
-    mock_active.assert_called()
-    mock_data.assert_called()
+    assert cust_bookings("Name10") == [customer_bookings[1],
+                                       customer_bookings[0]]
+    mock_calendar.assert_called()
     assert cust_bookings({"a": 1}) == []
     assert cust_bookings(42) == []
     assert cust_bookings("string") == []
@@ -193,107 +237,116 @@ def test_bookings_menu_input_3(*args):
     assert bookings_menu.__wrapped__(user_input, user) == result
 
 
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.dd_mm_yyyy")
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.recurring_booking")
+@patch("booking_sys.booking.find_customer")
 @patch("builtins.input")
-def test_view_bookings_menu_invalid_input(*args):
+def test_bookings_menu_input_4(*args):
     """
-    Tests view_bookings_menu() if user input is invalid.
+    Tests bookings_menu() if user input is "4".
     """
-    (mock_input, mock_get_data, mock_dd_mm_yyyy, mock_active) = args
-    user_input = mock_input.return_value = "0"
-    mock_active.return_value = []
-    mock_dd_mm_yyyy.return_value = ""
-
-    assert view_bookings_menu.__wrapped__(user_input) is False
-    mock_get_data.assert_called()
-    mock_active.assert_called()
-    mock_dd_mm_yyyy.assert_called()
-
+    (mock_input, mock_find, mock_recurring) = args
+    user = {'NAME': 'Name1', 'PASSWORD': '111', 'CONTACT': ''}
+    user_input = mock_input.return_value = "4"
 
-@patch("booking_sys.booking.print_bookings")
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.dd_mm_yyyy", **config)
-@patch("booking_sys.booking.get_data")
-@patch("builtins.input")
-def test_view_bookings_menu_input_1(*args):
-    """
-    Tests view_bookings_menu() if user input is "1".
-    """
-    (mock_input, mock_get_data, mock_ddmmyyyy, mock_active, mock_print) = args
-    mock_active.return_value = test_data
+    result = mock_find.return_value = "x"
+    assert bookings_menu.__wrapped__(user_input, user) == result
+    mock_recurring.assert_not_called()
 
-    user_input = mock_input.return_value = "1"
-    assert view_bookings_menu.__wrapped__(user_input) is True
-    mock_get_data.assert_called()
-    mock_active.assert_called()
-    mock_ddmmyyyy.assert_called()
-    mock_print.assert_called_with(test_data, today, "today")
+    mock_find.return_value = customers[0]
+    result = mock_recurring.return_value = None
+    assert bookings_menu.__wrapped__(user_input, user) == result
+    mock_recurring.assert_called_with(user, customers[0])
 
 
-@patch("booking_sys.booking.print_bookings")
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.dd_mm_yyyy", **config)
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.calendar")
 @patch("builtins.input")
-def test_view_bookings_menu_input_2(*args):
+def test_view_bookings_menu_invalid_input(*args):
     """
-    Tests view_bookings_menu() if user input is "2".
+    Tests view_bookings_menu() if user input is invalid.
     """
-    (mock_input, mock_get_data, mock_ddmmyyyy, mock_active, mock_print) = args
-    mock_active.return_value = test_data
+    (mock_input, mock_calendar) = args
+    user_input = mock_input.return_value = "0"
 
-    user_input = mock_input.return_value = "2"
-    assert view_bookings_menu.__wrapped__(user_input) is True
-    mock_get_data.assert_called()
-    mock_active.assert_called()
-    mock_ddmmyyyy.assert_called()
-    mock_print.assert_called_with(test_data, tomorrow, "tomorrow")
+    assert view_bookings_menu.__wrapped__(user_input) is False
+    mock_calendar.assert_called()
 
 
+@pytest.mark.parametrize("user_input, period, string",
+                         [("1", date.today(), "today"),
+                          ("2", date.today() + timedelta(days=1),
+                           "tomorrow"),
+                          ("3", (date.today(),
+                                 date.today() + timedelta(days=6)),
+                           "the upcoming week"),
+                          ("4", None, "all time")])
 @patch("booking_sys.booking.print_bookings")
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.dd_mm_yyyy", **config)
-@patch("booking_sys.booking.get_data")
-@patch("builtins.input")
-def test_view_bookings_menu_input_3(*args):
+@patch("booking_sys.booking.calendar")
+def test_view_bookings_menu_input(mock_calendar, mock_print,
+                                  user_input, period, string):
     """
-    Tests view_bookings_menu() if user input is "3".
+    Tests view_bookings_menu() prints the period chosen by
+    user input from the calendar.
     """
-    (mock_input, mock_get_data, mock_ddmmyyyy, mock_active, mock_print) = args
-    mock_active.return_value = test_data
-
-    user_input = mock_input.return_value = "3"
-    week = [today]
-    for i in range(1, 7):
-        week.append(dd_mm_yyyy(str(date.today() + timedelta(days=i))))
     assert view_bookings_menu.__wrapped__(user_input) is True
-    mock_get_data.assert_called()
-    mock_active.assert_called()
-    mock_ddmmyyyy.assert_called()
-    mock_print.assert_called_with(test_data, week, 'the upcoming week')
+    mock_print.assert_called_with(mock_calendar.return_value, period, string)
 
 
-@patch("booking_sys.booking.print_bookings")
-@patch("booking_sys.booking.active")
-@patch("booking_sys.booking.dd_mm_yyyy", **config)
-@patch("booking_sys.booking.get_data")
-@patch("builtins.input")
-def test_view_bookings_menu_input_4(*args):
+def events_backend():
     """
-    Tests view_bookings_menu() if user input is "4".
+    Creates an in-memory backend with bookings and their event log.
     """
-    (mock_input, mock_get_data, mock_ddmmyyyy, mock_active, mock_print) = args
-    mock_active.return_value = test_data
+    return MemoryBackend({
+        "bookings": [["DATE", "TIME", "NAME", "PEOPLE", "CREATED", "CONF",
+                      "CANC"],
+                     [tomorrow, "20:00", "Name1", "2", "Bob", "", ""],
+                     [today, "19:00", "Name2", "4", "Bob", "", ""],
+                     ["10-10-2022", "19:00", "Name2", "4", "Bob", "", ""]],
+        "events": [list(events.COLUMNS)]})
 
-    user_input = mock_input.return_value = "4"
-    assert view_bookings_menu.__wrapped__(user_input) is True
-    mock_get_data.assert_called()
-    mock_active.assert_called()
-    mock_ddmmyyyy.assert_called()
-    mock_print.assert_called_with(test_data, [tomorrow, today, future],
-                                  "all time")
+
+@patch("booking_sys.booking.CALENDAR",
+       {"mark": None, "day": None, "agenda": None})
+@patch("booking_sys.spreadsheet.SCHEMAS", new_callable=dict)
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch("booking_sys.spreadsheet.CACHE", new_callable=dict)
+@patch("booking_sys.spreadsheet.BACKEND", new_callable=events_backend)
+@patch("builtins.print")
+def test_calendar(*args):
+    """
+    Tests calendar() applies logged events to the agenda instead of
+    building it again, until bookings change otherwise.
+    """
+    (_, backend, cache, *_) = args
+    with patch("booking_sys.booking.get_data", wraps=get_data) as mock_data:
+        agenda = calendar()
+        assert calendar() is agenda
+        mock_data.assert_called_once()
+        assert [item["NAME"] for item in agenda] == ["Name2", "Name1"]
+
+        log_event("bookings", events.CREATED,
+                  {"DATE": future, "TIME": "12:00", "NAME": "Name1",
+                   "PEOPLE": "3", "CREATED": "Bob", "CONF": "-"})
+        booking = calendar().find("Name1", tomorrow)
+        log_event("bookings", events.RESCHEDULED, booking,
+                  {"DATE": today, "TIME": "18:00"})
+        log_event("bookings", events.CANCELLED,
+                  calendar().find("Name2", today), {"CANC": "yes"})
+        assert calendar() is agenda
+        mock_data.assert_called_once()
+        assert [(item["NAME"], item["DATE"], item["TIME"])
+                for item in agenda] == [("Name1", today, "18:00"),
+                                        ("Name1", future, "12:00")]
+        assert agenda.has("Name1", future)
+        assert not agenda.has("Name1", tomorrow)
+
+        # a booking from the past becomes active
+        backend.append_rows("events", [events.new_event(
+            events.RESCHEDULED, {"NAME": "Name2", "DATE": "10-10-2022"},
+            {"DATE": tomorrow})])
+        cache["events"].update(time=float("-inf"), revision=None)
+        assert calendar() is not agenda
+        assert calendar().has("Name2", tomorrow)
+        assert mock_data.call_count == 2
 
 
 @patch("booking_sys.booking.get_customer")
@@ -430,6 +483,34 @@ def test_num_of_people_valid_input():
         assert num_of_people.__wrapped__(user_input) == user_input
 
 
+@patch("booking_sys.capacity.SEATS", 6)
+@patch("booking_sys.booking.calendar")
+@patch("builtins.print")
+def test_new_time_capacity(*args):
+    """
+    Tests new_time() and num_of_people() ask again if the party
+    can't be seated, leaving out the customer's own booking.
+    """
+    (mock_print, mock_calendar) = args
+    mock_calendar.return_value = Agenda(customer_bookings + test_data)
+    # Name1 and Name10 take 1 seat tomorrow at 20:00
+    assert new_time.__wrapped__("20:00", tomorrow, "Name1") == "20:00"
+    assert num_of_people.__wrapped__("5", tomorrow, "20:00",
+                                     "Name1") == "5"
+    assert num_of_people.__wrapped__("5", tomorrow, "19:00", "Name3") is None
+    assert mock_print.call_args[0][0].startswith(
+        "\t\tNo free tables for 5 at 19:00. Free times: 12:00")
+    with patch("booking_sys.capacity.SEATS", 2):
+        assert new_time.__wrapped__("20:00", tomorrow, "Name3") is None
+        mock_print.assert_called_with(
+            "\t\tNo free tables at 20:00. Free times: 12:00, 12:15, "
+            "12:30, 12:45, 13:00, 13:15, 13:30, 13:45, 14:00, 14:15, "
+            "14:30, 14:45, 15:00, 15:15, 15:30, 15:45, 16:00, 16:15, "
+            "16:30, 16:45, 17:00, 17:15, 17:30, 17:45, 18:00, 18:15, "
+            "18:30, 21:30")
+        assert new_time.__wrapped__("20:00") == "20:00"
+
+
 def test_new_booking_date_returns_qx():
     """
     Tests new_booking() if new_date returns "x" or "q".
@@ -489,9 +570,11 @@ def test_new_booking_num_of_people_returns_qx(*args):
     assert new_booking(user, customer) == ppl
 
 
+@patch("booking_sys.spreadsheet.SCHEMAS", {})
+@patch("booking_sys.spreadsheet.BACKEND", HEADERS)
 @patch("booking_sys.booking.print_bookings")
 @patch("booking_sys.booking.increment_bookings")
-@patch("booking_sys.booking.update_worksheet")
+@patch("booking_sys.booking.log_event")
 @patch("booking_sys.booking.num_of_people", return_value="2")
 @patch("booking_sys.booking.new_time", return_value="20:00")
 @patch("booking_sys.booking.new_date", return_value="12-12-2022")
@@ -513,7 +596,7 @@ def test_new_booking_completed(*args):
     mock_date.assert_called()
     mock_time.assert_called()
     mock_ppl.assert_called()
-    mock_upd.assert_called()
+    mock_upd.assert_called_once_with("bookings", "created", expected_call[0])
     mock_increment.assert_called_with(customer)
     mock_print.assert_called_with(expected_call, '12-12-2022', '12-12-2022')
 
@@ -636,7 +719,27 @@ def test_confirm():
     assert confirm(None) is None
 
 
-@patch("booking_sys.booking.update_data")
+@patch("booking_sys.booking.log_event")
+@patch("builtins.input")
+@patch("booking_sys.booking.print_bookings")
+def test_confirm_saved_at_once(*args):
+    """
+    Tests confirm() saves an answer before asking about
+    the next booking.
+    """
+    (_, mock_input, mock_upd) = args
+    test_data_to_conf = [{'DATE': today, 'TIME': '20:00', 'NAME': name,
+                          'PEOPLE': '1', 'CREATED': "Bob", 'CONF': '',
+                          'CANC': ''} for name in ("Name1", "Name2")]
+    mock_input.side_effect = lambda _: (
+        "1" if BATCH["depth"] == 0 and
+        mock_upd.call_count == mock_input.call_count - 1 else "x")
+
+    assert confirm(test_data_to_conf) is None
+    assert mock_upd.call_count == 2
+
+
+@patch("booking_sys.booking.log_event")
 @patch("builtins.input")
 @patch("booking_sys.booking.print_bookings")
 def test_confirm_input_1(*args):
@@ -652,10 +755,8 @@ def test_confirm_input_1(*args):
 
     assert confirm(test_data_to_conf) is None
     mock_print.assert_has_calls([call([test_data_to_conf[0]], today, 'today')])
-    assert test_data_to_conf[0]["CONF"] == "yes"
-    mock_upd.assert_has_calls([call('bookings',
-                               test_data_to_conf[0],
-                               'CONF', 'yes')])
+    mock_upd.assert_has_calls([call('bookings', 'confirmed',
+                               test_data_to_conf[0], {'CONF': 'yes'})])
 
 
 @patch("builtins.input")
@@ -824,7 +925,7 @@ def test_reschedule_time_qx(*args):
     mock_time.assert_called()
 
 
-@patch("booking_sys.booking.update_data")
+@patch("booking_sys.booking.log_event")
 @patch("booking_sys.booking.num_of_people")
 @patch("booking_sys.booking.new_time")
 @patch("booking_sys.booking.print_bookings")
@@ -848,19 +949,19 @@ def test_reschedule_completed(*args):
     mock_active.assert_called()
     mock_print.assert_called_with(bookings, user_date, user_date)
     mock_time.assert_called()
-    mock_upd.assert_has_calls([call("bookings", test_data[0],
-                                    "DATE", user_date),
-                               call("bookings", test_data[0], "TIME", time)])
+    mock_upd.assert_called_once_with(
+        "bookings", "rescheduled", test_data[0],
+        {"DATE": user_date, "TIME": time, "PEOPLE": "22"})
 
 
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.get_columns")
 @patch("builtins.input")
 def test_find_bookings_invalid_name(*args):
     """
     Tests find_bookings() if entered name is not in customers data.
     """
     (mock_input, mock_data) = args
-    mock_data.return_value = customers
+    mock_data.return_value = names
     user_input = mock_input.return_value = "Name3"
 
     assert find_bookings.__wrapped__(user_input) is False
@@ -869,14 +970,14 @@ def test_find_bookings_invalid_name(*args):
 @patch("builtins.print")
 @patch("booking_sys.booking.print_bookings")
 @patch("booking_sys.booking.cust_bookings")
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.get_columns")
 @patch("builtins.input")
 def test_find_bookings_no_bookings(*args):
     """
     Tests find_bookings() if there are no bookings for a valid name.
     """
     (mock_input, mock_data, mock_bookings, mock_print_b, mock_print) = args
-    mock_data.return_value = customers
+    mock_data.return_value = names
     user_input = mock_input.return_value = "Name2"
     bookings = mock_bookings.return_value = []
 
@@ -891,14 +992,14 @@ def test_find_bookings_no_bookings(*args):
 @patch("booking_sys.booking.pick_booking")
 @patch("booking_sys.booking.print_bookings")
 @patch("booking_sys.booking.cust_bookings")
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.get_columns")
 @patch("builtins.input")
 def test_find_bookings_pick_returns_x(*args):
     """
     Tests find_bookings() if pick_booking returns "x".
     """
     (mock_input, mock_data, mock_bookings, mock_print_b, mock_pick) = args
-    mock_data.return_value = customers
+    mock_data.return_value = names
     user_input = mock_input.return_value = "Name2"
     bookings = mock_bookings.return_value = customer_bookings
     mock_pick.return_value = "x"
@@ -914,14 +1015,14 @@ def test_find_bookings_pick_returns_x(*args):
 @patch("booking_sys.booking.pick_booking")
 @patch("booking_sys.booking.print_bookings")
 @patch("booking_sys.booking.cust_bookings")
-@patch("booking_sys.booking.get_data")
+@patch("booking_sys.booking.get_columns")
 @patch("builtins.input")
 def test_find_bookings_completed(*args):
     """
     Tests find_bookings() if completed.
     """
     (mock_input, mock_data, mock_bookings, mock_print_b, mock_pick) = args
-    mock_data.return_value = customers
+    mock_data.return_value = names
     user_input = mock_input.return_value = "Name2"
     bookings = mock_bookings.return_value = customer_bookings
     result = mock_pick.return_value = test_data[1]
@@ -986,37 +1087,150 @@ def test_pick_bookings(*args):
 
 
 @patch("booking_sys.booking.get_customer")
+@patch("booking_sys.booking.log_event")
 @patch("booking_sys.booking.update_data")
 def test_cancel(*args):
     """
     Tests cancel().
     """
-    (mock_upd, mock_get_customer) = args
+    (mock_upd, mock_log, mock_get_customer) = args
     mock_get_customer.return_value = customers[0]
-    exp_calls = [call('bookings', test_data[0], 'CANC', 'yes'),
-                 call('customers', customers[0], 'CANCELLED', '9')]
 
     assert cancel(test_data[0]) is None
-    mock_upd.assert_has_calls(exp_calls)
+    mock_log.assert_called_once_with('bookings', 'cancelled', test_data[0],
+                                     {'CANC': 'yes'})
+    mock_upd.assert_called_once_with('customers', customers[0],
+                                     'CANCELLED', '9')
 
 
 @patch("booking_sys.booking.print_bookings")
 @patch("builtins.print")
-@patch("booking_sys.booking.cust_bookings")
+@patch("booking_sys.booking.calendar")
 def test_has_duplicates(*args):
     """
     Tests has_duplicates().
     """
-    (mock_cust_bookings, mock_print, mock_print_bookings) = args
-    mock_cust_bookings.return_value = customer_bookings
+    (mock_calendar, mock_print, mock_print_bookings) = args
+    mock_calendar.return_value = Agenda(customer_bookings)
     msg = f"\n\t\t!!!Booking for {tomorrow} already exists!!!"
 
-    assert has_duplicates(tomorrow, "Name1") is True
+    assert has_duplicates(tomorrow, "Name10") is True
     mock_print.assert_called_with(msg)
-    mock_print_bookings.assert_called_with(customer_bookings,
-                                           tomorrow, tomorrow)
+    mock_print_bookings.assert_called_with(
+        [customer_bookings[1], customer_bookings[0]], tomorrow, tomorrow)
 
-    assert has_duplicates("12-12-2023", "Name1") is False
+    assert has_duplicates("12-12-2023", "Name10") is False
+    assert has_duplicates(False, "Name10") is False
+
+
+def test_repeat():
+    """
+    Tests repeat() across the end of a month and a year.
+    """
+    assert repeat("24-12-2030", 7, 3) == ["24-12-2030", "31-12-2030",
+                                          "07-01-2031"]
+    assert repeat("24-12-2030", 14, 1) == ["24-12-2030"]
+
+
+@pytest.mark.parametrize("user_input, expected", [
+    (f"{tomorrow} 2", [tomorrow, dd_mm_yyyy(str(date.today() +
+                                               timedelta(days=15)))]),
+    (f"{tomorrow} 0", False),
+    (f"{tomorrow} 53", False),
+    (f"{tomorrow} two", False),
+    (tomorrow, False),
+    ("01-01-2000 2", False),
+])
+def test_repeat_dates(user_input, expected):
+    """
+    Tests repeat_dates() with valid and invalid input.
+    """
+    assert repeat_dates.__wrapped__(user_input, 14) == expected
+
+
+def test_date_list():
+    """
+    Tests date_list() sorts dates and leaves out repeated ones.
+    """
+    assert date_list.__wrapped__(f"{future} {tomorrow}  {future}") == [
+        tomorrow, future]
+    assert date_list.__wrapped__(f"{tomorrow} 01-01-2000") is False
+    assert date_list.__wrapped__("") is False
+
+
+@patch("booking_sys.booking.date_list")
+@patch("booking_sys.booking.repeat_dates")
+@patch("builtins.input")
+def test_recurring_dates(*args):
+    """
+    Tests recurring_dates() passes days between bookings.
+    """
+    (_, mock_repeat, mock_list) = args
+    assert recurring_dates.__wrapped__("1") == mock_repeat.return_value
+    mock_repeat.assert_called_with(7)
+    assert recurring_dates.__wrapped__("2") == mock_repeat.return_value
+    mock_repeat.assert_called_with(14)
+    assert recurring_dates.__wrapped__("3") == mock_list.return_value
+    assert recurring_dates.__wrapped__("4") is False
+
+
+@patch("booking_sys.capacity.SEATS", 4)
+@patch("booking_sys.booking.calendar")
+def test_check_dates(*args):
+    """
+    Tests check_dates() refuses dates of existing bookings
+    and dates without free tables.
+    """
+    (mock_calendar, ) = args
+    # active bookings only
+    mock_calendar.return_value = Agenda(customer_bookings + test_data[:2])
+    assert check_dates([today, tomorrow, future], "Name10", "20:00",
+                       2) == ([future], {today: "already booked",
+                                         tomorrow: "already booked"})
+    mock_calendar.assert_called_once()
+    assert check_dates([today, tomorrow, future], "Name3", "20:00",
+                       2) == ([tomorrow, future], {today: "no free tables"})
+
+
+@patch("booking_sys.spreadsheet.SCHEMAS", {})
+@patch("booking_sys.spreadsheet.BACKEND", HEADERS)
+@patch("builtins.print")
+@patch("booking_sys.booking.print_bookings")
+@patch("booking_sys.booking.increment_bookings")
+@patch("booking_sys.booking.log_events")
+@patch("booking_sys.booking.check_dates")
+@patch("booking_sys.booking.num_of_people", return_value="2")
+@patch("booking_sys.booking.new_time", return_value="20:00")
+@patch("booking_sys.booking.recurring_dates")
+def test_recurring_booking(*args):
+    """
+    Tests recurring_booking() writes bookings of all free dates
+    at once and updates the customer's number of bookings once.
+    """
+    (mock_dates, _, _, mock_check, mock_log, mock_increment,
+     mock_print_b, mock_print) = args
+    user = {'NAME': 'Staff', 'PASSWORD': '111', 'CONTACT': ''}
+    mock_dates.return_value = "q"
+    assert recurring_booking(user, customers[0]) == "q"
+
+    mock_dates.return_value = [tomorrow, future]
+    mock_check.return_value = ([], {tomorrow: "already booked",
+                                    future: "already booked"})
+    assert recurring_booking(user, customers[0]) is None
+    mock_print.assert_called_with("\t\tThere are no dates to book.")
+    mock_log.assert_not_called()
+
+    mock_check.return_value = ([future], {tomorrow: "already booked"})
+    assert recurring_booking(user, customers[0]) is None
+    mock_check.assert_called_with([tomorrow, future], customers[0]["NAME"],
+                                  "20:00", 2)
+    mock_print.assert_any_call(f"\t\t{tomorrow} is skipped: "
+                               "already booked.")
+    new = [{'DATE': future, 'TIME': '20:00', 'NAME': customers[0]["NAME"],
+            'PEOPLE': '2', 'CREATED': 'Staff', 'CONF': '-', 'CANC': ''}]
+    mock_log.assert_called_once_with("bookings", "created", new)
+    mock_increment.assert_called_once_with(customers[0], 1)
+    mock_print_b.assert_called_with(new, [future], "the new dates")
 
 
 @patch("booking_sys.booking.update_data")
@@ -1030,3 +1244,6 @@ def test_increment_bookings(*args):
     increment_bookings(customers[0])
     mock_upd.assert_called_with("customers", customers[0],
                                 "NUM OF BOOKINGS", new_number)
+    increment_bookings(customers[0], 3)
+    mock_upd.assert_called_with("customers", customers[0],
+                                "NUM OF BOOKINGS", str(int(new_number) + 2))
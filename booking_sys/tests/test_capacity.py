@@ -0,0 +1,80 @@
+"""
+Tests for capacity module.
+"""
+from unittest.mock import patch
+import pytest
+from booking_sys.capacity import (Availability, is_limited, tables_for,
+                                  setting_minute)
+
+
+BOOKINGS = [{'TIME': '19:00', 'PEOPLE': '4'},
+            {'TIME': '19:40', 'PEOPLE': '2'},
+            {'TIME': '12:00', 'PEOPLE': 'two'},
+            {'TIME': '25:00', 'PEOPLE': '2'},
+            {'TIME': '10:00', 'PEOPLE': '2'}]
+
+
+@patch("booking_sys.capacity.SEATS", 0)
+@patch("booking_sys.capacity.TABLES", 0)
+def test_no_limits():
+    """
+    Tests any party can be seated during opening hours
+    if seats are not limited.
+    """
+    assert not is_limited()
+    availability = Availability(BOOKINGS)
+    assert availability.can_seat('19:00', 100)
+    assert not availability.can_seat('11:45')
+    assert not availability.can_seat('21:45')
+    assert not availability.can_seat('')
+    assert len(availability.free_times()) == 39
+
+
+@pytest.mark.parametrize("time, people, expected", [
+    ('17:30', 4, True),  # over before 19:00
+    ('17:45', 5, False),
+    ('18:00', 4, True),
+    ('18:00', 5, False),
+    ('20:30', 6, True),  # the 19:00 booking is over
+    ('21:15', 8, True),
+    ('21:10', 8, False),  # the 19:40 booking takes the 21:00 slot
+])
+@patch("booking_sys.capacity.SEATS", 8)
+@patch("booking_sys.capacity.TABLES", 0)
+def test_can_seat(time, people, expected):
+    """
+    Tests covers taken by overlapping bookings are counted until
+    the end of the last slot a booking takes.
+    """
+    assert Availability(BOOKINGS).can_seat(time, people) is expected
+
+
+@patch("booking_sys.capacity.SEATS", 0)
+@patch("booking_sys.capacity.TABLES", 3)
+@patch("booking_sys.capacity.TABLE_SEATS", 4)
+def test_tables():
+    """
+    Tests a big party takes more tables and free times
+    are the slots with enough free tables.
+    """
+    assert is_limited()
+    assert tables_for(1) == 1
+    assert tables_for(9) == 3
+    availability = Availability(BOOKINGS)
+    assert availability.can_seat('19:00', 4)
+    assert not availability.can_seat('19:00', 5)
+    # the 12:00 booking takes a table until 13:30
+    assert availability.free_times(9)[:2] == ['13:30', '13:45']
+    assert availability.free_times(9)[-4:] == [
+        '17:15', '17:30', '21:15', '21:30']
+    assert '19:45' not in availability.free_times(5)
+
+
+def test_setting_minute():
+    """
+    Tests time settings are read once and invalid ones are
+    reported by name.
+    """
+    assert setting_minute("OPENS", "12:30") == 750
+    with pytest.raises(ValueError, match="OPENS must be a time"):
+        setting_minute("OPENS", "25:00")
@@ -0,0 +1,109 @@
+"""
+Tests for connection module.
+"""
+import os
+import stat
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from booking_sys import connection
+
+
+TOKEN_FILE = os.path.join(tempfile.gettempdir(), "test_token.json")
+TOKEN_PATCH = patch("booking_sys.connection.TOKEN_FILE", TOKEN_FILE)
+
+
+def credentials(token=None, expires_in=timedelta(hours=1)):
+    """
+    Creates credentials of a test account.
+    """
+    return SimpleNamespace(service_account_email="bot@test",
+                           scopes=["sheets"], token=token,
+                           expiry=connection._utcnow() + expires_in)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """
+    Removes the token file and the session left by a test.
+    """
+    yield
+    connection.STATE.update(session=None, saved=None)
+    if os.path.exists(TOKEN_FILE):
+        os.remove(TOKEN_FILE)
+
+
+@TOKEN_PATCH
+def test_token_cache():
+    """
+    Tests a stored token is given to new credentials of the same
+    account and is readable only by the owner of the file.
+    """
+    assert not connection.load_token(credentials())
+    connection.save_token(credentials("abc"))
+    assert stat.S_IMODE(os.stat(TOKEN_FILE).st_mode) == 0o600
+    new = credentials()
+    assert connection.load_token(new)
+    assert new.token == "abc"
+    other = credentials()
+    other.service_account_email = "other@test"
+    assert not connection.load_token(other)
+
+
+@TOKEN_PATCH
+def test_token_left_temp():
+    """
+    Tests a token is not written to a readable temporary
+    file left by an earlier session.
+    """
+    with open(f"{TOKEN_FILE}.tmp", "w", encoding="utf-8"):
+        pass
+    os.chmod(f"{TOKEN_FILE}.tmp", 0o644)
+    connection.save_token(credentials("abc"))
+    assert stat.S_IMODE(os.stat(TOKEN_FILE).st_mode) == 0o600
+    assert not os.path.exists(f"{TOKEN_FILE}.tmp")
+
+
+@TOKEN_PATCH
+def test_expired_token():
+    """
+    Tests a token about to expire is not used.
+    """
+    connection.save_token(credentials("abc", timedelta(minutes=1)))
+    new = credentials()
+    assert not connection.load_token(new)
+    assert new.token is None
+
+
+@TOKEN_PATCH
+def test_shared_session():
+    """
+    Tests one session is made for credentials, with one pool
+    for API and token requests, and it stores new tokens.
+    """
+    creds = credentials("abc")
+    session = connection.shared_session(creds)
+    assert connection.shared_session(creds) is session
+    adapter = session.get_adapter("https://sheets.googleapis.com")
+    assert session._auth_request.session.get_adapter(
+        "https://oauth2.googleapis.com") is adapter
+    for hook in session.hooks["response"]:
+        hook("response")
+    assert connection.load_token(credentials())
+
+
+def test_pool_stats():
+    """
+    Tests requests over open connections are counted as hits.
+    """
+    assert connection.pool_stats() == {"requests sent": 0, "pool hits": 0,
+                                       "pool misses": 0}
+    session = connection.shared_session(credentials("abc"))
+    pool = session.get_adapter("https://x").poolmanager.connection_from_url(
+        "https://sheets.googleapis.com")
+    pool.num_requests = 5
+    pool.num_connections = 2
+    assert connection.pool_stats() == {"requests sent": 5, "pool hits": 3,
+                                       "pool misses": 2}
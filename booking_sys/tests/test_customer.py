@@ -4,7 +4,14 @@ Tests for customer module.
 from unittest.mock import patch, call
 from booking_sys.customer import (search, customers_menu, view_customer,
                                   print_customer, find_customer, new_phone,
-                                  new_email, new_birthdate, create_customer)
+                                  new_email, new_birthdate, create_customer,
+                                  get_customer)
+from booking_sys.backends import MemoryBackend
+
+
+# worksheet with the header only, read by create_customer()
+HEADERS = MemoryBackend({"customers": [["NAME", "PHONE", "EMAIL", "BD",
+                                        "NUM OF BOOKINGS", "CANCELLED"]]})
 
 
 def test_search():
@@ -21,6 +28,28 @@ def test_search():
     assert search("Test", "NAME", test_data) is None
 
 
+@patch("booking_sys.spreadsheet.SCHEMAS", {})
+@patch("booking_sys.spreadsheet.LOGS", {})
+@patch("booking_sys.spreadsheet.CACHE", {})
+@patch("booking_sys.spreadsheet.BACKEND", new_callable=lambda: MemoryBackend(
+    {"staff": [["NAME"]], "bookings": [["DATE"]],
+     "customers": [["NAME", "PHONE"], ["Bob", "001"], ["Ann", "002"]]}))
+def test_get_customer(*args):
+    """
+    Tests get_customer() reads customers in one request
+    and finds the next one in the cache.
+    """
+    (backend, ) = args
+    with patch.object(backend, "batch_get_values",
+                      wraps=backend.batch_get_values) as mock_batch, \
+            patch.object(backend, "get_columns") as mock_columns:
+        assert get_customer("Ann") == {"NAME": "Ann", "PHONE": "002"}
+        assert get_customer("Bob") == {"NAME": "Bob", "PHONE": "001"}
+        assert get_customer("Kim") is None
+        mock_batch.assert_called_once()
+        mock_columns.assert_not_called()
+
+
 def test_customers_menu_invalid_input():
     """
     Tests customers_menu() if input is invalid.
@@ -288,6 +317,8 @@ def test_create_customer_birthdate_returns_xq(*args):
     assert create_customer(name) == birthdate
 
 
+@patch("booking_sys.spreadsheet.SCHEMAS", {})
+@patch("booking_sys.spreadsheet.BACKEND", HEADERS)
 @patch("booking_sys.customer.update_worksheet")
 @patch("booking_sys.customer.new_birthdate")
 @patch("booking_sys.customer.new_email")
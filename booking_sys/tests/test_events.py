@@ -0,0 +1,77 @@
+"""
+Tests for events module.
+"""
+import json
+from booking_sys import events
+
+
+HEADER = ['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC']
+BOOKINGS = [HEADER,
+            ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', ''],
+            ['11-10-2022', '19:00', 'Ann', '3', 'Kelly', '', '']]
+
+
+def event(kind, name, day, changes):
+    """
+    Creates an event row with a fixed time.
+    """
+    return ["01-10-2022 10:00:00", kind, name, day, json.dumps(changes)]
+
+
+def test_fold():
+    """
+    Tests fold() creates and changes rows in order and follows
+    a row to its new date.
+    """
+    log = [event("created", "Sue", "12-10-2022",
+                 {"DATE": "12-10-2022", "TIME": "18:00", "NAME": "Sue",
+                  "PEOPLE": 2}),
+           event("rescheduled", "Bob", "10-10-2022",
+                 {"DATE": "13-10-2022", "TIME": "21:00"}),
+           event("confirmed", "Bob", "13-10-2022", {"CONF": "yes"}),
+           event("cancelled", "Tom", "10-10-2022", {"CANC": "yes"}),
+           event("cancelled", "Sue", "12-10-2022", {"CANC": "yes"})]
+    values = events.fold([list(row) for row in BOOKINGS], log)
+    assert values[1] == ['13-10-2022', '21:00', 'Bob', '2', 'Kelly',
+                         'yes', '']
+    assert values[2] == BOOKINGS[2]
+    assert values[3] == ['12-10-2022', '18:00', 'Sue', '2', '', '', 'yes']
+    assert len(values) == 4
+
+
+def test_fold_written_back():
+    """
+    Tests created rows which are in the worksheet already, also
+    with later changes, are not added again, but a booking made
+    again after a cancelled one is.
+    """
+    values = [HEADER,
+              ['13-10-2022', '21:00', 'Sue', '2', 'Kelly', 'yes', ''],
+              ['14-10-2022', '18:00', 'Tom', '2', 'Kelly', '', 'yes']]
+    log = [event("created", "Sue", "12-10-2022",
+                 {"DATE": "12-10-2022", "TIME": "18:00", "NAME": "Sue",
+                  "PEOPLE": 2, "CREATED": "Kelly"}),
+           event("rescheduled", "Sue", "12-10-2022",
+                 {"DATE": "13-10-2022", "TIME": "21:00"}),
+           event("confirmed", "Sue", "13-10-2022", {"CONF": "yes"}),
+           event("created", "Tom", "14-10-2022",
+                 {"DATE": "14-10-2022", "TIME": "18:00", "NAME": "Tom",
+                  "PEOPLE": 2, "CREATED": "Kelly"})]
+    folded = events.fold([list(row) for row in values], log)
+    assert folded == values + [
+        ['14-10-2022', '18:00', 'Tom', '2', 'Kelly', '', '']]
+
+
+def test_tail():
+    """
+    Tests tail() returns only events after the last compaction.
+    """
+    first = events.new_event("confirmed", {"NAME": "Bob",
+                                           "DATE": "10-10-2022"},
+                             {"CONF": "yes"})
+    later = event("cancelled", "Ann", "11-10-2022", {"CANC": "yes"})
+    log = [list(events.COLUMNS), first]
+    assert events.tail(log) == (1, [first])
+    log += [later, events.marker(2)]
+    assert events.tail(log) == (2, [later])
+    assert events.changes_of(["", "", "", "", "{broken"]) == {}
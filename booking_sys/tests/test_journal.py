@@ -0,0 +1,117 @@
+"""
+Tests for journal module.
+"""
+import os
+import tempfile
+from unittest.mock import patch
+import pytest
+from gspread import exceptions
+from booking_sys import journal
+
+
+JOURNAL_FILE = os.path.join(tempfile.gettempdir(), "test_journal.jsonl")
+JOURNAL_PATCH = patch("booking_sys.journal.JOURNAL_FILE", JOURNAL_FILE)
+
+
+@pytest.fixture(autouse=True)
+def remove_journal():
+    """
+    Removes the journal file left by a test.
+    """
+    yield
+    if os.path.exists(JOURNAL_FILE):
+        os.remove(JOURNAL_FILE)
+
+
+@JOURNAL_PATCH
+def test_record():
+    """
+    Tests record() keeps the order and stores every id once.
+    """
+    assert not journal.has_pending()
+    first = journal.record({"op": "append", "rows": [["Bob"]]})
+    journal.record({"op": "append", "rows": [["Ann"]]})
+    journal.record({"id": first, "op": "append", "rows": [["Bob"]]})
+    assert journal.has_pending()
+    assert [operation["rows"] for operation in journal.pending()] == [
+        [["Bob"]], [["Ann"]]]
+
+
+@JOURNAL_PATCH
+def test_pending_skips_cut_lines():
+    """
+    Tests a line cut short by a crash is ignored.
+    """
+    journal.record({"op": "append", "rows": [["Bob"]]})
+    with open(JOURNAL_FILE, "a", encoding="utf-8") as file:
+        file.write('{"op": "app')
+    assert len(journal.pending()) == 1
+
+
+@JOURNAL_PATCH
+def test_replay():
+    """
+    Tests replay() applies operations in order and removes
+    the journal when everything is done.
+    """
+    journal.record({"op": "append", "rows": [["Bob"]]})
+    journal.record({"op": "append", "rows": [["Ann"]]})
+    applied = []
+    assert journal.replay(lambda op: applied.append(op["rows"])) == 2
+    assert applied == [[["Bob"]], [["Ann"]]]
+    assert not journal.has_pending()
+
+
+@JOURNAL_PATCH
+def test_replay_records_meanwhile():
+    """
+    Tests operations recorded while replaying, which is done
+    without holding the lock, are replayed too.
+    """
+    journal.record({"op": "append", "rows": [["Bob"]]})
+    applied = []
+
+    def apply(operation):
+        applied.append(operation["rows"])
+        if operation["rows"] == [["Bob"]]:
+            journal.record({"op": "append", "rows": [["Ann"]]})
+
+    assert journal.replay(apply) == 2
+    assert applied == [[["Bob"]], [["Ann"]]]
+    assert not journal.has_pending()
+
+
+@JOURNAL_PATCH
+def test_replay_error():
+    """
+    Tests replay() stops at an error and keeps the rest
+    of the operations for the next attempt.
+    """
+    journal.record({"op": "append", "rows": [["Bob"]]})
+    journal.record({"op": "append", "rows": [["Ann"]]})
+
+    def apply(operation):
+        if operation["rows"] == [["Ann"]]:
+            raise exceptions.GSpreadException
+
+    with pytest.raises(exceptions.GSpreadException):
+        journal.replay(apply)
+    assert [operation["rows"] for operation in journal.pending()] == [
+        [["Ann"]]]
+    skipped = journal.STATE["skipped"]
+    assert journal.replay(lambda op: False) == 1
+    assert journal.STATE["skipped"] == skipped + 1
+    assert not journal.has_pending()
+
+
+@JOURNAL_PATCH
+@patch("booking_sys.journal.time.time", return_value=1000)
+def test_status(_):
+    """
+    Tests status() reports pending operations.
+    """
+    journal.record({"op": "append", "rows": [["Bob"]]})
+    status = journal.status()
+    assert status["file"] == JOURNAL_FILE
+    assert status["pending"] == 1
+    assert status["oldest"] == 1000
@@ -0,0 +1,37 @@
+"""
+Tests for mirror module.
+"""
+from booking_sys.backends import MemoryBackend, SqliteBackend
+from booking_sys.mirror import mirror, is_empty
+
+
+HEADER = ['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC']
+BOOKINGS = [HEADER,
+            ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', ''],
+            ['11-10-2022', '19:00', 'Ann', '3', 'Kelly', '', '']]
+
+
+def test_mirror():
+    """
+    Tests mirror() writes changed cells and appends new rows.
+    """
+    source = SqliteBackend(":memory:", {"bookings": HEADER})
+    assert is_empty(source, ["bookings"])
+    target = MemoryBackend({"bookings": BOOKINGS[:2]})
+    source.append_rows("bookings", BOOKINGS[1:])
+    source.update_cells("bookings", [(2, 6, "yes")])
+
+    assert mirror(source, target, ["bookings"]) == (1, 1)
+    assert target.get_values("bookings") == source.get_values("bookings")
+    assert mirror(source, target, ["bookings"]) == (0, 0)
+
+
+def test_mirror_fills_empty():
+    """
+    Tests mirror() fills an empty database from the sheet.
+    """
+    sheet = MemoryBackend({"bookings": BOOKINGS})
+    database = SqliteBackend(":memory:", {"bookings": HEADER})
+    mirror(sheet, database, ["bookings"])
+    assert database.get_values("bookings") == BOOKINGS
+    assert not is_empty(database, ["bookings"])
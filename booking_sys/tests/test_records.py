@@ -0,0 +1,52 @@
+"""
+Tests for records module.
+"""
+import pytest
+from booking_sys.records import Record, columns_of, to_records
+
+
+VALUES = [['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC'],
+          ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', ''],
+          ['11-10-2022', '19:00', 'Ann', '3', 'Kelly', 'yes', '']]
+
+
+def test_to_records():
+    """
+    Tests records equal dictionaries made of the same rows
+    and share one mapping of columns.
+    """
+    records = to_records(VALUES)
+    assert records == [dict(zip(VALUES[0], row)) for row in VALUES[1:]]
+    assert records[0]._columns is records[1]._columns
+    assert list(records[1]) == VALUES[0]
+    assert records[1]["CONF"] == "yes"
+    assert records[0].get("MISSING") is None
+    assert to_records([]) == []
+
+
+def test_record_update():
+    """
+    Tests a record is changed like a dictionary and
+    the source row stays unchanged.
+    """
+    row = list(VALUES[1])
+    record = Record(columns_of(tuple(VALUES[0])), row)
+    record.update({"CONF": "yes"})
+    record["PEOPLE"] = "4"
+    assert record["CONF"] == "yes"
+    assert record["PEOPLE"] == "4"
+    assert row == VALUES[1]
+    with pytest.raises(KeyError):
+        record["MISSING"] = "1"
+
+
+def test_short_row():
+    """
+    Tests a row shorter than the header has only its own
+    columns, like dict(zip(header, row)).
+    """
+    record = Record(columns_of(("NAME", "CONTACT")), ["Bob"])
+    assert record == {"NAME": "Bob"}
+    assert len(record) == 1
+    record["CONTACT"] = "123"
+    assert record == {"NAME": "Bob", "CONTACT": "123"}
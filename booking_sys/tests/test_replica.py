@@ -0,0 +1,37 @@
+"""
+Tests for replica module.
+"""
+import threading
+from gspread import exceptions
+from booking_sys import replica
+
+
+def test_start_stop():
+    """
+    Tests the thread refreshes at once, keeps running after
+    an error and stops when asked.
+    """
+    calls = []
+    refreshed = threading.Event()
+
+    def refresh():
+        calls.append(1)
+        refreshed.set()
+        if len(calls) == 1:
+            raise exceptions.GSpreadException("quota")
+
+    assert replica.start(refresh, interval=0) is None
+    thread = replica.start(refresh, interval=0.01)
+    try:
+        assert refreshed.wait(1)
+        assert replica.start(refresh, interval=0.01) is thread
+        assert replica.is_running()
+        while len(calls) < 2:
+            refreshed.clear()
+            refreshed.wait(1)
+    finally:
+        replica.stop()
+    assert not thread.is_alive()
+    assert not replica.is_running()
+    assert replica.status()["error"] is None
+    assert replica.status()["refreshed"] is not None
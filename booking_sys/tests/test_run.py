@@ -100,10 +100,12 @@ def test_start_menu_input_x(*args):
     mock_exit.assert_called()
 
 
-def test_cleanup():
+@patch("run.save_snapshot")
+def test_cleanup(mock_save):
     """
     Tests cleanup().
     """
     cleanup()
+    mock_save.assert_called()
     assert os.path.exists("stats.csv") is False
     assert os.path.exists("stats.pdf") is False
@@ -0,0 +1,75 @@
+"""
+Tests for snapshot module.
+"""
+import os
+import tempfile
+import pytest
+from booking_sys.snapshot import save, load, encode, decode
+
+
+SNAPSHOT_FILE = os.path.join(tempfile.gettempdir(), "test_snapshot.bin")
+STAFF = [['NAME', 'PASSWORD', 'CONTACT'],
+         ['Bob', '123', '003543243422'],
+         ['Kelly', '456', '']]
+BOOKINGS = [['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC'],
+            ['10-10-2022', '20:00', 'Zoë', '2', 'Kelly', '', '']]
+
+
+@pytest.fixture(autouse=True)
+def remove_snapshot():
+    """
+    Removes the snapshot file left by a test.
+    """
+    yield
+    if os.path.exists(SNAPSHOT_FILE):
+        os.remove(SNAPSHOT_FILE)
+
+
+def test_save_and_load():
+    """
+    Tests worksheets and the revision are read back unchanged,
+    all of them or only requested ones.
+    """
+    save(SNAPSHOT_FILE, {"staff": STAFF, "bookings": BOOKINGS,
+                         "customers": []}, revision="42")
+    assert load(SNAPSHOT_FILE) == ("42", {"staff": STAFF,
+                                          "bookings": BOOKINGS,
+                                          "customers": []})
+    assert load(SNAPSHOT_FILE, ["bookings"]) == ("42",
+                                                 {"bookings": BOOKINGS})
+
+
+def test_save_private():
+    """
+    Tests only the owner can read the snapshot, also when
+    a readable temporary file was left behind.
+    """
+    with open(f"{SNAPSHOT_FILE}.tmp", "wb"):
+        pass
+    os.chmod(f"{SNAPSHOT_FILE}.tmp", 0o644)
+    save(SNAPSHOT_FILE, {"bookings": BOOKINGS})
+    assert os.stat(SNAPSHOT_FILE).st_mode & 0o777 == 0o600
+    assert load(SNAPSHOT_FILE) == ("", {"bookings": BOOKINGS})
+
+
+def test_load_invalid():
+    """
+    Tests a missing, empty or damaged file is not loaded.
+    """
+    assert load(SNAPSHOT_FILE) is None
+    with open(SNAPSHOT_FILE, "wb"):
+        pass
+    assert load(SNAPSHOT_FILE) is None
+    save(SNAPSHOT_FILE, {"staff": STAFF})
+    with open(SNAPSHOT_FILE, "r+b") as file:
+        file.truncate(os.path.getsize(SNAPSHOT_FILE) - 5)
+    assert load(SNAPSHOT_FILE) is None
+
+
+def test_encode():
+    """
+    Tests encode() refuses cells with separators.
+    """
+    assert decode(encode(STAFF)) == STAFF
+    with pytest.raises(ValueError):
+        encode([["a\x1eb"]])
@@ -1,49 +1,77 @@
 """
 Tests for spreadsheet module.
 """
+import os
+import tempfile
+from datetime import date
 from unittest.mock import patch, call
-from gspread import Worksheet, exceptions, Cell
-from booking_sys.spreadsheet import (SHEET, get_worksheet, get_data,
-                                     update_worksheet, update_data)
-
-
-GET_VALUES_PATH = ('booking_sys.spreadsheet.gspread'
-                   '.worksheet.Worksheet.get_values')
-APPEND_ROW_PATH = ('booking_sys.spreadsheet.gspread'
-                   '.worksheet.Worksheet.append_row')
-WORKSHEET_PATH = 'booking_sys.spreadsheet.SHEET.worksheet'
-FIND_PATH = 'booking_sys.spreadsheet.gspread.worksheet.Worksheet.find'
-UPD_CELL_PATH = ('booking_sys.spreadsheet.gspread'
-                 '.worksheet.Worksheet.update_cell')
-get_values_config = {"return_value": [[]]}
+import pytest
+from gspread import exceptions
+from booking_sys.backends import MemoryBackend, SqliteBackend
+from booking_sys.records import to_records
+from booking_sys import journal
+from booking_sys import events
+from booking_sys import spreadsheet
+from booking_sys.spreadsheet import (get_worksheet, get_data, use_backend,
+                                     update_worksheet, update_data,
+                                     invalidate, cached, locate, batch,
+                                     flush, worksheet_info, load_all,
+                                     connect_in_background, replay_journal,
+                                     schema, new_row, load_snapshot,
+                                     revision, get_columns, refresh_replica,
+                                     stale_note, log_event, compact,
+                                     changes_since, log_events,
+                                     mirror_to_sheet, read_with_revision)
+
+
+BACKEND_PATH = 'booking_sys.spreadsheet.BACKEND'
+CACHE_PATH = 'booking_sys.spreadsheet.CACHE'
+GET_VALUES_PATH = 'booking_sys.backends.MemoryBackend.get_values'
+APPEND_ROWS_PATH = 'booking_sys.backends.MemoryBackend.append_rows'
+FIND_ROWS_PATH = 'booking_sys.backends.MemoryBackend.find_rows'
+UPDATE_CELLS_PATH = 'booking_sys.backends.MemoryBackend.update_cells'
+BATCH_UPDATE_PATH = 'booking_sys.backends.MemoryBackend.batch_update'
+GET_RANGE_PATH = 'booking_sys.backends.MemoryBackend.get_range'
+SCHEMAS_PATH = 'booking_sys.spreadsheet.SCHEMAS'
+SNAPSHOT_PATH = 'booking_sys.spreadsheet.SNAPSHOT_FILE'
+SNAPSHOT_FILE = os.path.join(tempfile.gettempdir(), "test_snapshot.bin")
+JOURNAL_PATH = 'booking_sys.journal.JOURNAL_FILE'
+JOURNAL_FILE = os.path.join(tempfile.gettempdir(), "test_journal.jsonl")
+SAVED_LOCALLY = ("\t\tSaved locally, it will be written to "
+                 "the database automatically.")
+STAFF = [['NAME', 'PASSWORD', 'CONTACT'],
+         ['Bob', '123', '003543243422'],
+         ['Kelly', '456', '+44 6734657788']]
+BOOKINGS = [['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC'],
+            ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', ''],
+            ['12-10-2022', '19:00', 'Bob', '4', 'Kelly', '', '']]
 config_exception = {"side_effect": [exceptions.GSpreadException,
                                     exceptions.GSpreadException,
                                     [[]]]}
-worksheet_config = {"return_value": Worksheet(SHEET,
-                    properties={"sheetId": "12345", "title": "name"})}
 
 
-@patch(GET_VALUES_PATH, **get_values_config)
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+def memory_backend():
+    """
+    Creates a fresh in-memory backend with test data.
+    """
+    return MemoryBackend({"name": STAFF, "bookings": BOOKINGS})
+
+
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
 def test_get_worksheet(*args):
     """
     Test get_worksheet: if it returns correct data.
     """
-    (*_, mock_worksheet, mock_values) = args
-    assert get_worksheet("name") == [[]]
-    mock_worksheet.assert_called()
-    mock_values.assert_called()
+    assert get_worksheet("name") == STAFF
 
 
 @patch("builtins.print")
 @patch('booking_sys.spreadsheet.sys.exit')
 @patch("builtins.input")
 @patch(GET_VALUES_PATH, **config_exception)
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
 def test_get_worksheet_exception(*args):
     """
     Test get_worksheet handling exceptions.
@@ -57,81 +85,197 @@ def test_get_worksheet_exception(*args):
     exit_mock.assert_called()
 
     mock_input.return_value = "1"
-    get_worksheet("name")
+    assert get_worksheet("name") == [[]]
     mock_input.assert_called_with(exc_msg)
     mock_print.assert_has_calls([call('Trying...')], any_order=False)
 
 
 @patch('builtins.print')
-@patch(APPEND_ROW_PATH)
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
 def test_update_worksheet(*args):
     """
     Test update_worksheet successful scenario.
     """
-    (*_, mock_worksheet, mock_append, print_mock) = args
+    (_, backend, print_mock) = args
 
-    update_worksheet([[]], "name")
-    mock_worksheet.assert_called()
-    mock_append.assert_called()
+    update_worksheet(["Ann", "789", "+351 912345678"], "name")
+    assert backend.get_values("name")[-1] == ["Ann", "789", "+351 912345678"]
     print_mock.assert_called_with("\n\t\tSaved successfully!")
 
 
+@patch("booking_sys.spreadsheet.replay_in_background")
 @patch("builtins.print")
-@patch("builtins.input")
-@patch(APPEND_ROW_PATH, **config_exception)
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(APPEND_ROWS_PATH, side_effect=exceptions.GSpreadException)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(JOURNAL_PATH, JOURNAL_FILE)
 def test_update_worksheet_exception(*args):
     """
-    Test update_worksheet handling exceptions.
+    Test update_worksheet saves data to the journal
+    if the database is not available.
     """
-    (*_, mock_input, mock_print) = args
-    exc_msg = "press 1 - Try again\npress x - Continue without saving\n"
+    (*_, mock_append, mock_print, mock_replay) = args
+    try:
+        update_worksheet(["Ann", "789", ""], "name")
+        mock_print.assert_called_with(SAVED_LOCALLY)
+        mock_replay.assert_called()
+        assert [(operation["op"], operation["rows"])
+                for operation in journal.pending()] == [
+                    ("append", [["Ann", "789", ""]])]
 
-    mock_input.return_value = "x"
-    update_worksheet([[]], "name")
-    mock_input.assert_called_with(exc_msg)
-    mock_print.assert_called_with("Your data was not saved.")
-
-    mock_input.return_value = "1"
-    update_worksheet([[]], "name")
-    mock_input.assert_called_with(exc_msg)
-    mock_print.assert_has_calls([call('Trying...')], any_order=False)
+        # the next write waits for the journal
+        update_worksheet(["Kim", "000", ""], "name")
+        mock_append.assert_called_once()
+        assert len(journal.pending()) == 2
+    finally:
+        os.remove(JOURNAL_FILE)
 
 
-@patch("booking_sys.spreadsheet.get_worksheet")
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
 def test_get_data(*args):
     """
     Tests if spreadsheet response is converted to dictionary.
     """
-    (*_, mock_get_ws) = args
-    mock_get_ws.return_value = [['NAME', 'PASSWORD', 'CONTACT'],
-                                ['Bob', '123', '003543243422'],
-                                ['Kelly', '456', '+44 6734657788']]
+    assert get_data("name") == [{'CONTACT': '003543243422',
+                                 'NAME': 'Bob', 'PASSWORD': '123'},
+                                {'CONTACT': '+44 6734657788',
+                                 'NAME': 'Kelly', 'PASSWORD': '456'}]
+
+
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_read_with_revision(*args):
+    """
+    Tests rows are returned with the revision they were fetched at.
+    """
+    (cache, backend) = args
+    assert read_with_revision("bookings") == (BOOKINGS, backend.revision())
+    cache["bookings"]["revision"] = "old"
+    assert read_with_revision("bookings") == (BOOKINGS, "old")
+
 
-    assert get_data("sheet") == [{'CONTACT': '003543243422',
-                                  'NAME': 'Bob', 'PASSWORD': '123'},
-                                 {'CONTACT': '+44 6734657788',
-                                  'NAME': 'Kelly', 'PASSWORD': '456'}]
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_get_columns(*args):
+    """
+    Tests get_columns() fetches only requested columns
+    unless the worksheet is cached.
+    """
+    (cache, backend) = args
+    with patch.object(backend, "get_columns",
+                      wraps=backend.get_columns) as mock_columns:
+        assert get_columns("bookings", ["NAME", "DATE"]) == [
+            [row[2], row[0]] for row in BOOKINGS]
+        mock_columns.assert_called_once_with("bookings", [3, 1])
+        assert "bookings" not in cache
+        get_worksheet("bookings")
+        assert get_columns("bookings", ["NAME"]) == [
+            [row[2]] for row in BOOKINGS]
+        mock_columns.assert_called_once()
+
+
+def sqlite_backend():
+    """
+    Creates an in-memory SQLite backend with test bookings.
+    """
+    backend = SqliteBackend(":memory:", {"bookings": BOOKINGS[0]})
+    backend.append_rows("bookings", BOOKINGS[1:])
+    return backend
+
+
+@pytest.mark.parametrize("backend", [memory_backend, sqlite_backend])
+def test_get_data_query(backend):
+    """
+    Tests get_data() filters by values and date with every
+    backend, SQLite answers without reading the worksheet.
+    """
+    backend = backend()
+    with patch(BACKEND_PATH, backend), patch(CACHE_PATH, {}):
+        with patch.object(backend, "get_values",
+                          wraps=backend.get_values) as mock_values:
+            assert get_data("bookings", {"NAME": "Bob"},
+                            since=date(2022, 10, 11)) == to_records(
+                                [BOOKINGS[0], BOOKINGS[2]])
+            assert get_data("bookings", since=date(2022, 10, 13)) == []
+        assert mock_values.called != isinstance(backend, SqliteBackend)
+
+
+def sqlite_events_backend():
+    """
+    Creates an in-memory SQLite backend with test data, bookings
+    changed through their event log.
+    """
+    backend = SqliteBackend(":memory:", {
+        "staff": STAFF[0], "customers": ["NAME"], "bookings": BOOKINGS[0],
+        "events": events.COLUMNS})
+    backend.append_rows("staff", STAFF[1:])
+    backend.append_rows("bookings", BOOKINGS[1:])
+    return backend
+
+
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=sqlite_events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_select_with_events(*args):
+    """
+    Tests SQLite answers queries with logged events applied, also
+    to rows which match only after them, without reading the
+    worksheet.
+    """
+    (_, _, backend, _) = args
+    (bob, later) = get_data("bookings", {"NAME": "Bob"})
+    log_event("bookings", events.RESCHEDULED, bob, {"DATE": "14-10-2022"})
+    log_event("bookings", events.CANCELLED, later, {"CANC": "yes"})
+    with patch.object(backend, "get_values") as mock_values:
+        assert [(row["DATE"], row["CANC"]) for row in get_data(
+            "bookings", since=date(2022, 10, 11))] == [
+                ("12-10-2022", "yes"), ("14-10-2022", "")]
+        assert get_data("bookings", {"DATE": "10-10-2022"}) == []
+        mock_values.assert_not_called()
+
+
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch("booking_sys.spreadsheet.SHEET", new_callable=lambda: MemoryBackend(
+    {"staff": [STAFF[0]], "customers": [["NAME"]], "bookings": BOOKINGS}))
+@patch(BACKEND_PATH, new_callable=sqlite_events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_mirror_to_sheet(*args):
+    """
+    Tests bookings logged as events in SQLite reach the sheet.
+    """
+    (_, _, _, sheet, _) = args
+    log_event("bookings", events.CREATED,
+              {"DATE": "14-10-2022", "NAME": "Ann", "PEOPLE": 2})
+    mirror_to_sheet()
+    assert sheet.get_values("bookings")[-1][:3] == [
+        "14-10-2022", "", "Ann"]
+    assert sheet.get_values("staff") == STAFF
+
+
+def test_use_backend():
+    """
+    Tests if use_backend replaces the backend and returns the old one.
+    """
+    backend = memory_backend()
+    previous = use_backend(backend)
+    try:
+        assert get_worksheet("name") == STAFF
+    finally:
+        assert use_backend(previous) is backend
 
 
 @patch('builtins.print')
-@patch(UPD_CELL_PATH)
-@patch(FIND_PATH, return_value=Cell(row=2, col=1, value="Bob"))
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
 def test_update_data(*args):
     """
     Test update_data successful scenario.
     """
-    (*_, mock_worksheet, mock_find, mock_upd, mock_print) = args
+    (_, backend, mock_print) = args
     worksheet = "name"
     test_obj = {'CONTACT': '003543243422', 'NAME': 'Bob', 'PASSWORD': '123'}
     attr = "PASSWORD"
@@ -142,44 +286,796 @@ def test_update_data(*args):
     update_data(worksheet, test_obj, attr, new_value)
     assert test_obj[attr] == new_value
     assert update_data("name", test_obj, attr, new_value) == test_obj
-    mock_find.assert_called()
-    mock_worksheet.assert_called()
+    assert backend.get_values("name")[1] == ['Bob', '321', '003543243422']
     mock_print.assert_called_with(msg)
-    mock_upd.assert_called()
 
 
-config_exception = {"side_effect": [exceptions.GSpreadException,
-                                    exceptions.GSpreadException,
-                                    Cell(2, 1, value="Bob"),
-                                    Cell(2, 1, value="Bob")]}
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_update_data_bookings(*args):
+    """
+    Test update_data picks a booking by name and date.
+    """
+    (_, backend, _) = args
+    booking = dict(zip(BOOKINGS[0], BOOKINGS[2]))
+
+    update_data("bookings", booking, "CONF", "yes")
+    assert backend.get_values("bookings")[1][5] == ""
+    assert backend.get_values("bookings")[2][5] == "yes"
+
 
+@patch(GET_VALUES_PATH, side_effect=lambda name: [row[:] for row in STAFF])
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_cache_hit(*args):
+    """
+    Tests repeated reads are served from cache and
+    invalidate() makes the next read fetch again.
+    """
+    (*_, mock_values) = args
+    get_data("name")
+    get_worksheet("name")
+    mock_values.assert_called_once()
+    invalidate("name")
+    get_data("name")
+    assert mock_values.call_count == 2
 
+
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_cache_ttl(*args):
+    """
+    Tests cached data expires after CACHE_TTL seconds.
+    """
+    (_, _, mock_time) = args
+    mock_time.return_value = 100
+    get_worksheet("name")
+    assert cached("name") == STAFF
+    with patch("booking_sys.spreadsheet.CACHE_TTL", 60):
+        mock_time.return_value = 159
+        assert cached("name") == STAFF
+        mock_time.return_value = 160
+        assert cached("name") is None
+
+
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_cache_patched_on_write(*args):
+    """
+    Tests writes update cached data instead of dropping it.
+    """
+    (_, backend, _) = args
+    get_worksheet("name")
+    update_worksheet(["Ann", "789", 1], "name")
+    update_data("name", {"NAME": "Bob"}, "CONTACT", "+351 912345678")
+    assert cached("name") == backend.get_values("name")
+    assert cached("name")[-1] == ["Ann", "789", "1"]
+
+
+@patch(FIND_ROWS_PATH)
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_update_data_index(*args):
+    """
+    Tests update_data finds rows with the index, keeps it correct
+    after appends and key changes and does not search the sheet.
+    """
+    (_, backend, _, mock_find) = args
+    booking = dict(zip(BOOKINGS[0], BOOKINGS[2]))
+    update_data("bookings", booking, "DATE", "13-10-2022")
+    update_data("bookings", booking, "TIME", "21:00")
+    assert backend.get_values("bookings")[2][:2] == ["13-10-2022", "21:00"]
+
+    update_worksheet(["14-10-2022", "18:00", "Ann", "2", "Bob", "", ""],
+                     "bookings")
+    update_data("bookings", {"NAME": "Ann", "DATE": "14-10-2022"},
+                "CONF", "yes")
+    assert backend.get_values("bookings")[3][5] == "yes"
+    assert locate("bookings", {"NAME": "Bob", "DATE": "10-10-2022"},
+                  "CANC") == (2, 7)
+    mock_find.assert_not_called()
+
+
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_locate_refreshes(*args):
+    """
+    Tests locate() refetches once for unknown rows and raises
+    CellNotFound for rows and columns which do not exist.
+    """
+    (_, backend) = args
+    get_worksheet("bookings")
+    backend.append_rows("bookings", [["15-10-2022", "18:00", "Kim", "2",
+                                      "Bob", "", ""]])
+    assert locate("bookings", {"NAME": "Kim", "DATE": "15-10-2022"},
+                  "CONF") == (4, 6)
+    with pytest.raises(exceptions.CellNotFound):
+        locate("bookings", {"NAME": "Kim", "DATE": "16-10-2022"}, "CONF")
+    with pytest.raises(exceptions.CellNotFound):
+        locate("bookings", {"NAME": "Kim", "DATE": "15-10-2022"}, "AGE")
+
+
+@patch("booking_sys.spreadsheet.replay_in_background")
 @patch("builtins.print")
-@patch("builtins.input")
-@patch(FIND_PATH, **config_exception)
-@patch(UPD_CELL_PATH)
-@patch(WORKSHEET_PATH, **worksheet_config)
-@patch("gspread.client", autospec=True)
-@patch("gspread.authorize", autospec=True)
+@patch(UPDATE_CELLS_PATH, side_effect=exceptions.GSpreadException)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(JOURNAL_PATH, JOURNAL_FILE)
 def test_update_data_exception(*args):
     """
-    Test update_data handling exceptions.
+    Test update_data saves the update to the journal
+    if the database is not available.
     """
-    (*_, mock_input, mock_print) = args
-    worksheet = "name"
+    (*_, mock_print, _) = args
     test_obj = {'CONTACT': '003543243422', 'NAME': 'Bob', 'PASSWORD': '123'}
-    attr = "PASSWORD"
-    new_value = "321"
-    exc_print = "\nDatabase is not available, I couldn't save your data"
-    exc_msg = "press 1 - Try again\npress x - Continue without saving\n"
+    try:
+        assert update_data("name", test_obj, "PASSWORD", "321") == test_obj
+        mock_print.assert_called_with(SAVED_LOCALLY)
+        assert test_obj["PASSWORD"] == "321"
+        assert get_worksheet("name")[1][1] == "321"
+        (operation, ) = journal.pending()
+        assert operation["key"] == {"NAME": "Bob"}
+        assert operation["value"] == "321"
+    finally:
+        os.remove(JOURNAL_FILE)
 
-    mock_input.return_value = "x"
-    update_data(worksheet, test_obj, attr, new_value)
-    mock_input.assert_called_with(exc_msg)
-    mock_print.assert_called_with("Your data was not saved.")
 
-    mock_input.return_value = "1"
-    update_data(worksheet, test_obj, attr, new_value)
-    mock_input.assert_called_with(exc_msg)
-    mock_print.assert_has_calls([call(exc_print), call('Trying...')],
-                                any_order=False)
+@patch("builtins.print")
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_update_data_not_found(*args):
+    """
+    Test update_data reports a missing row and writes nothing.
+    """
+    (_, backend, mock_print) = args
+    assert update_data("name", {"NAME": "Nobody"}, "PASSWORD", "1") is None
+    mock_print.assert_called_with("\nSorry, name(PASSWORD) of Nobody "
+                                  "was not found in the database.")
+    assert backend.get_values("name") == STAFF
+
+
+@patch("builtins.print")
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+def test_replay_journal(*args):
+    """
+    Tests journaled writes are replayed in order, updates find
+    rows appended offline and by others, and the journal is
+    removed afterwards.
+    """
+    (_, backend, _) = args
+    booking = {"NAME": "Ann", "DATE": "13-10-2022"}
+    get_worksheet("bookings")
+    with patch(APPEND_ROWS_PATH, side_effect=exceptions.GSpreadException):
+        with patch("booking_sys.spreadsheet.replay_in_background"):
+            update_worksheet(["13-10-2022", "18:00", "Ann", "2", "Bob", "",
+                              ""], "bookings")
+            update_data("bookings", booking, "DATE", "14-10-2022")
+            update_data("bookings", booking, "CONF", "yes")
+    backend.append_rows("bookings", [["15-10-2022", "18:00", "Kim", "2",
+                                      "Bob", "", ""]])
+    assert replay_journal() == 3
+    assert not os.path.exists(JOURNAL_FILE)
+    assert backend.get_values("bookings")[-1] == ["14-10-2022", "18:00",
+                                                  "Ann", "2", "Bob", "yes",
+                                                  ""]
+    assert get_worksheet("bookings") == backend.get_values("bookings")
+
+
+@patch("builtins.print")
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+def test_replay_written_append(*args):
+    """
+    Tests a journaled append which was written before the replay
+    was cut short is not written again, and the cache lock is
+    not held while writing.
+    """
+    (_, backend, _) = args
+    row = ["13-10-2022", "18:00", "Ann", "2", "Bob", "", ""]
+    get_worksheet("bookings")
+    with patch(APPEND_ROWS_PATH, side_effect=exceptions.GSpreadException):
+        with patch("booking_sys.spreadsheet.replay_in_background"):
+            update_worksheet(row, "bookings")
+    backend.append_rows("bookings", [row])
+    size = len(backend.get_values("bookings"))
+    held = []
+
+    def get_values(worksheet):
+        held.append(spreadsheet.LOCK._is_owned())
+        return MemoryBackend.get_values(backend, worksheet)
+
+    with patch.object(backend, "get_values", side_effect=get_values):
+        assert replay_journal() == 1
+    assert held == [False]
+    assert len(backend.get_values("bookings")) == size
+    assert not os.path.exists(JOURNAL_FILE)
+
+
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_batch(*args):
+    """
+    Tests updates inside batch() are written in one request
+    when the block ends and reported back.
+    """
+    (_, backend, _) = args
+    booking = dict(zip(BOOKINGS[0], BOOKINGS[2]))
+    with patch(BATCH_UPDATE_PATH, wraps=backend.batch_update) as mock_batch:
+        with batch() as results:
+            update_data("bookings", booking, "DATE", "13-10-2022")
+            update_data("bookings", booking, "TIME", "21:00")
+            update_data("name", {"NAME": "Bob"}, "PASSWORD", "321")
+            mock_batch.assert_not_called()
+        mock_batch.assert_called_once_with(
+            {"bookings": [(3, 1, "13-10-2022"), (3, 2, "21:00")],
+             "name": [(2, 2, "321")]})
+    assert [update["saved"] for update in results] == [True, True, True]
+    assert backend.get_values("bookings")[2][:2] == ["13-10-2022", "21:00"]
+    assert flush() == []
+
+
+@patch("booking_sys.spreadsheet.replay_in_background")
+@patch('builtins.print')
+@patch(BATCH_UPDATE_PATH, side_effect=exceptions.GSpreadException)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+def test_batch_not_saved(*args):
+    """
+    Tests failed updates are reported and saved to the journal.
+    """
+    (*_, mock_print, _) = args
+    try:
+        with batch() as results:
+            update_data("name", {"NAME": "Bob"}, "PASSWORD", "321")
+        assert results[0]["saved"] is False
+        mock_print.assert_called_with(SAVED_LOCALLY)
+        assert journal.pending()[0]["key"] == {"NAME": "Bob"}
+        assert get_worksheet("name")[1][1] == "321"
+    finally:
+        os.remove(JOURNAL_FILE)
+
+
+@patch('booking_sys.spreadsheet.BATCH_SIZE', 2)
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_batch_size(*args):
+    """
+    Tests pending updates are written when there are BATCH_SIZE
+    of them and reported back when the block ends.
+    """
+    (_, backend, _) = args
+    with batch() as results:
+        update_data("name", {"NAME": "Bob"}, "PASSWORD", "1")
+        update_data("name", {"NAME": "Kelly"}, "PASSWORD", "2")
+        assert backend.get_values("name")[1][1] == "1"
+        assert backend.get_values("name")[2][1] == "2"
+        update_data("name", {"NAME": "Bob"}, "PASSWORD", "3")
+    assert [update["value"] for update in results] == ["1", "2", "3"]
+    assert all(update["saved"] for update in results)
+
+
+@patch('booking_sys.spreadsheet.BATCH_WAIT', 0.01)
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_batch_wait(*args):
+    """
+    Tests pending updates are written after BATCH_WAIT seconds
+    while the block has not ended yet.
+    """
+    (_, backend, _) = args
+    with batch() as results:
+        update_data("name", {"NAME": "Bob"}, "PASSWORD", "1")
+        spreadsheet.BATCH["timer"].join(1)
+        assert backend.get_values("name")[1][1] == "1"
+        assert results[0]["saved"] is True
+    assert len(results) == 1
+
+
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_worksheet_info(*args):
+    """
+    Tests worksheet_info() adds the header to backend metadata.
+    """
+    assert worksheet_info("name") == {"id": 0, "title": "name", "rows": 3,
+                                      "cols": 3, "header": STAFF[0]}
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_schema(*args):
+    """
+    Tests schema() fetches only the header, once, and
+    reuses the header of a fetched worksheet.
+    """
+    with patch(GET_RANGE_PATH, return_value=[BOOKINGS[0]]) as mock_range:
+        columns = schema("bookings")
+        assert schema("bookings") is columns
+        mock_range.assert_called_once_with("bookings", 1, 1)
+        get_worksheet("name")
+        assert schema("name")["columns"] == tuple(STAFF[0])
+        mock_range.assert_called_once()
+    assert columns["positions"]["NAME"] == 3
+    assert columns["types"]["PEOPLE"] is int
+    assert columns["types"]["DATE"] is str
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_new_row(*args):
+    """
+    Tests new_row() orders values by columns and checks them.
+    """
+    assert new_row("bookings", {"NAME": "Ann", "DATE": "13-10-2022",
+                                "PEOPLE": "2"}) == [
+                                    "13-10-2022", "", "Ann", "2", "", "",
+                                    ""]
+    with pytest.raises(KeyError):
+        new_row("bookings", {"EMAIL": "a@b.c"})
+    with pytest.raises(ValueError):
+        new_row("bookings", {"PEOPLE": "two"})
+
+
+@patch("booking_sys.spreadsheet.EVENT_LOGS", {})
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_load_all(*args):
+    """
+    Tests load_all() fetches worksheets in one request and seeds cache.
+    """
+    (cache, backend) = args
+    with patch.object(backend, "batch_get_values",
+                      wraps=backend.batch_get_values) as mock_batch:
+        assert load_all(["name", "bookings"]) == {"name": STAFF,
+                                                  "bookings": BOOKINGS}
+        mock_batch.assert_called_once_with(["name", "bookings"])
+    assert set(cache) == {"name", "bookings"}
+    with patch(GET_VALUES_PATH) as mock_values:
+        get_data("bookings")
+        mock_values.assert_not_called()
+
+
+@patch(SNAPSHOT_PATH, "")
+@patch(BACKEND_PATH, new_callable=lambda: MemoryBackend(
+    {"staff": STAFF, "customers": [["NAME"]], "bookings": BOOKINGS}))
+@patch(CACHE_PATH, new_callable=dict)
+def test_read_prefetches(*args):
+    """
+    Tests the first read of a known worksheet fetches all of them,
+    so a whole session starts with one request.
+    """
+    (cache, backend) = args
+    with patch.object(backend, "batch_get_values",
+                      wraps=backend.batch_get_values) as mock_batch:
+        connect_in_background().join()
+        get_data("staff")
+        get_data("customers")
+        get_data("bookings")
+        mock_batch.assert_called_once_with(["staff", "customers",
+                                            "bookings"])
+    assert set(cache) == {"staff", "customers", "bookings"}
+
+
+@patch(SNAPSHOT_PATH, SNAPSHOT_FILE)
+@patch(BACKEND_PATH, new_callable=lambda: MemoryBackend(
+    {"staff": STAFF, "customers": [["NAME"]], "bookings": BOOKINGS}))
+@patch(CACHE_PATH, new_callable=dict)
+def test_warm_start(*args):
+    """
+    Tests a session saves fetched data, but not staff passwords,
+    and the next one reads it without waiting for the database.
+    """
+    (cache, backend) = args
+    try:
+        connect_in_background().join()
+        assert os.stat(SNAPSHOT_FILE).st_mode & 0o777 == 0o600
+        cache.clear()
+        with patch.object(backend, "batch_get_values",
+                          wraps=backend.batch_get_values) as mock_batch:
+            assert load_snapshot() == backend.revision()
+            assert "staff" not in cache
+            assert get_worksheet("bookings") == BOOKINGS
+            # the spreadsheet has not changed since
+            connect_in_background().join()
+            mock_batch.assert_called_once_with(["staff"])
+            assert get_worksheet("staff") == STAFF
+    finally:
+        os.remove(SNAPSHOT_FILE)
+
+
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_unchanged_not_fetched(*args):
+    """
+    Tests expired rows are used again while the revision
+    of the spreadsheet stays the same.
+    """
+    (cache, backend, mock_time) = args
+    mock_time.return_value = 0
+    get_worksheet("name")
+    assert cache["name"]["revision"] == "0"
+    mock_time.return_value = 100
+    with patch(GET_VALUES_PATH) as mock_values:
+        assert get_worksheet("name") == STAFF
+        mock_values.assert_not_called()
+    assert cached("name") == STAFF
+
+    backend.update_cells("name", [(2, 2, "321")])
+    mock_time.return_value = 200
+    assert get_worksheet("name")[1][1] == "321"
+    assert cache["name"]["revision"] == "1"
+    assert revision() == "1"
+
+
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_read_without_prefetch(*args):
+    """
+    Tests a read falls back to one worksheet if others are missing.
+    """
+    (cache, _) = args
+    assert get_worksheet("bookings") == BOOKINGS
+    assert set(cache) == {"bookings"}
+
+
+@patch("booking_sys.spreadsheet.LOGS", {"events": True})
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_incremental_sync(*args):
+    """
+    Tests expired append-only worksheets fetch only new rows,
+    including rows appended by others, and rows written by
+    this process are not fetched again.
+    """
+    (cache, backend, _, mock_time) = args
+    mock_time.return_value = 0
+    get_worksheet("bookings")
+    update_worksheet(["13-10-2022", "18:00", "Ann", "2", "Bob", "", ""],
+                     "bookings")
+    backend.append_rows("bookings", [["14-10-2022", "18:00", "Kim", "2",
+                                      "Bob", "", ""]])
+    mock_time.return_value = 100
+    with patch.object(backend, "get_tail",
+                      wraps=backend.get_tail) as mock_tail:
+        expected = backend.get_values("bookings")
+        with patch(GET_VALUES_PATH) as mock_values:
+            assert get_worksheet("bookings") == expected
+            mock_values.assert_not_called()
+        mock_tail.assert_called_once_with("bookings", 4)
+    assert cache["bookings"]["loaded"] == 0
+
+
+class TrimmingBackend(MemoryBackend):
+    """
+    Leaves out empty cells at the end of rows read from the tail,
+    like the Sheets API does.
+    """
+    def get_tail(self, worksheet, first):
+        (header, tail) = super().get_tail(worksheet, first)
+        return (header, [row[:len([value for value in row if value])]
+                         for row in tail])
+
+
+@patch("booking_sys.spreadsheet.LOGS", {"events": True})
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch(BACKEND_PATH, new_callable=lambda: TrimmingBackend(
+    {"bookings": [list(row) for row in BOOKINGS]}))
+@patch(CACHE_PATH, new_callable=dict)
+def test_incremental_sync_ragged(*args):
+    """
+    Tests rows synced without empty cells at the end are read
+    with all columns.
+    """
+    (_, backend, mock_time) = args
+    mock_time.return_value = 0
+    get_worksheet("bookings")
+    backend.append_rows("bookings", [["14-10-2022", "18:00", "Kim", "2",
+                                      "Bob", "", ""]])
+    mock_time.return_value = 100
+    assert get_data("bookings")[-1]["CANC"] == ""
+    assert get_worksheet("bookings") == backend.get_values("bookings")
+
+
+@patch("booking_sys.spreadsheet.LOGS", {"events": True})
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_incremental_sync_fallback(*args):
+    """
+    Tests a full fetch when rows were deleted or the header changed
+    or FULL_SYNC_EVERY has passed.
+    """
+    (cache, backend, mock_time) = args
+    mock_time.return_value = 0
+    get_worksheet("bookings")
+    del backend.data["bookings"][-1]
+    backend.version += 1
+    mock_time.return_value = 100
+    assert get_worksheet("bookings") == BOOKINGS[:2]
+    assert cache["bookings"]["loaded"] == 100
+
+    backend.data["bookings"][0][0] = "DAY"
+    backend.version += 1
+    mock_time.return_value = 200
+    assert get_worksheet("bookings")[0][0] == "DAY"
+    assert cache["bookings"]["loaded"] == 200
+
+    mock_time.return_value = 900
+    with patch.object(backend, "get_tail") as mock_tail:
+        get_worksheet("bookings")
+        mock_tail.assert_not_called()
+    assert cache["bookings"]["loaded"] == 900
+
+
+@patch("booking_sys.spreadsheet.REVISION_EVERY", 0)
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch("booking_sys.spreadsheet.LOGS", {"events": False})
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_edited_in_place(*args):
+    """
+    Tests a worksheet edited in place is fetched fully, so cells
+    changed by others are read.
+    """
+    (_, backend, mock_time) = args
+    mock_time.return_value = 0
+    get_worksheet("bookings")
+    backend.update_cells("bookings", [(2, 7, "yes")])
+    mock_time.return_value = 100
+    with patch.object(backend, "get_tail") as mock_tail:
+        assert get_data("bookings")[0]["CANC"] == "yes"
+        mock_tail.assert_not_called()
+
+
+@patch('builtins.print')
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_append_after_others(*args):
+    """
+    Tests the cache is not patched with a row appended after
+    rows of others; the next read fetches all of them.
+    """
+    (_, backend, _) = args
+    get_worksheet("bookings")
+    backend.append_rows("bookings", [["14-10-2022", "18:00", "Kim", "2",
+                                      "Bob", "", ""]])
+    update_worksheet(["13-10-2022", "18:00", "Ann", "2", "Bob", "", ""],
+                     "bookings")
+    assert cached("bookings") is None
+    assert get_worksheet("bookings") == backend.get_values("bookings")
+
+
+@patch("booking_sys.spreadsheet.REVISION_EVERY", 0)
+@patch("booking_sys.spreadsheet.replica.is_running", return_value=True)
+@patch(BACKEND_PATH, new_callable=lambda: MemoryBackend(
+    {"staff": STAFF, "customers": [["NAME"]], "bookings": BOOKINGS}))
+@patch(CACHE_PATH, new_callable=dict)
+def test_refresh_replica(*args):
+    """
+    Tests the replica fetches only after a change, keeps
+    rows written here meanwhile and is read without expiring.
+    """
+    (cache, backend, _) = args
+    assert refresh_replica() == ["staff", "customers", "bookings"]
+    assert refresh_replica() == []
+    cache["staff"]["time"] = float("-inf")
+    assert cached("staff") == STAFF
+    assert stale_note("staff") == "\t(data is being refreshed)"
+
+    backend.update_cells("bookings", [(2, 6, "yes")])
+    fetch = backend.batch_get_values
+
+    def write_while_fetching(worksheets):
+        update_worksheet(['13-10-2022', '18:00', 'Ann', '2'], "bookings")
+        return fetch(worksheets)
+
+    with patch("builtins.print"), patch.object(
+            backend, "batch_get_values", side_effect=write_while_fetching):
+        assert refresh_replica() == []
+    assert cache["bookings"]["values"][-1][2] == "Ann"
+    # the revision is common to all worksheets
+    assert refresh_replica() == ["staff", "customers", "bookings"]
+    assert get_worksheet("bookings")[1][5] == "yes"
+    assert get_worksheet("bookings")[-1][2] == "Ann"
+    assert stale_note("bookings") == "\t(data from 0 s ago)"
+
+
+def events_backend():
+    """
+    Creates an in-memory backend with bookings and their event log.
+    """
+    return MemoryBackend({"bookings": BOOKINGS,
+                          "events": [list(events.COLUMNS)]})
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_log_event(*args):
+    """
+    Tests changes are appended as events, read as changed
+    rows and written back to the worksheet by compact().
+    """
+    (_, cache, backend, *_) = args
+    booking = get_data("bookings", {"NAME": "Bob", "DATE": "10-10-2022"})[0]
+    with patch(UPDATE_CELLS_PATH) as mock_cells:
+        log_event("bookings", events.RESCHEDULED, booking,
+                  {"DATE": "11-10-2022", "TIME": "21:00"})
+        log_event("bookings", events.CONFIRMED, booking, {"CONF": "yes"})
+        log_event("bookings", events.CREATED,
+                  {"DATE": "14-10-2022", "NAME": "Ann", "PEOPLE": 2})
+        mock_cells.assert_not_called()
+    assert booking["DATE"] == "11-10-2022"
+    assert backend.get_values("bookings") == BOOKINGS
+    changed = get_data("bookings", {"NAME": "Bob", "DATE": "11-10-2022"})
+    assert [(row["TIME"], row["CONF"]) for row in changed] == [
+        ("21:00", "yes")]
+    assert [row["NAME"] for row in get_data("bookings")] == [
+        "Bob", "Bob", "Ann"]
+
+    assert compact("bookings") == 3
+    assert backend.get_values("bookings")[1][:2] == ["11-10-2022", "21:00"]
+    assert backend.get_values("bookings")[3][2] == "Ann"
+    assert len(backend.get_values("events")) == 5
+    assert compact("bookings") == 0
+    assert [row["NAME"] for row in get_data("bookings")] == [
+        "Bob", "Bob", "Ann"]
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_log_events(*args):
+    """
+    Tests created rows are written in one request, as events
+    or without a log as rows.
+    """
+    rows = [{"DATE": day, "TIME": "18:00", "NAME": "Ann", "PEOPLE": "2"}
+            for day in ("14-10-2022", "21-10-2022")]
+    for (backend, worksheet) in ((events_backend(), "events"),
+                                 (memory_backend(), "bookings")):
+        with patch(BACKEND_PATH, backend), \
+                patch(APPEND_ROWS_PATH, wraps=backend.append_rows) as mock:
+            get_data("bookings")
+            log_events("bookings", events.CREATED, [dict(row)
+                                                    for row in rows])
+            mock.assert_called_once()
+            assert mock.call_args[0][0] == worksheet
+            assert [(row["NAME"], row["DATE"])
+                    for row in get_data("bookings")][-2:] == [
+                ("Ann", "14-10-2022"), ("Ann", "21-10-2022")]
+        invalidate()
+
+
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=memory_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_log_event_without_log(*args):
+    """
+    Tests rows are changed in place if there is no log worksheet.
+    """
+    (_, _, backend, _) = args
+    booking = get_data("bookings")[0]
+    log_event("bookings", events.CANCELLED, booking, {"CANC": "yes"})
+    assert backend.get_values("bookings")[1][6] == "yes"
+
+
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_changes_since(*args):
+    """
+    Tests events logged since a mark are returned, and None when
+    rows may have changed otherwise or caching is off.
+    """
+    (_, cache, *_) = args
+    (logged, mark) = changes_since("bookings", None)
+    assert logged is None
+    assert changes_since("bookings", mark)[0] == []
+    booking = get_data("bookings")[0]
+    log_event("bookings", events.CONFIRMED, booking, {"CONF": "yes"})
+    (logged, mark) = changes_since("bookings", mark)
+    assert [event[1:4] for event in logged] == [
+        ["confirmed", "Bob", "10-10-2022"]]
+    assert changes_since("bookings", mark)[0] == []
+    invalidate("bookings")
+    assert changes_since("bookings", mark)[0] is None
+    with patch(CACHE_PATH, {}), patch("booking_sys.spreadsheet.CACHE_TTL",
+                                      0):
+        assert changes_since("bookings", mark) == (None, None)
+
+
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_written_back_first(*args):
+    """
+    Tests rows written back by others are not created again when
+    the worksheet is synced before the "compacted" event, and the
+    log is then synced too.
+    """
+    (_, cache, backend, _) = args
+    ann = {"DATE": "14-10-2022", "TIME": "18:00", "NAME": "Ann",
+           "PEOPLE": "2", "CREATED": "Bob", "CONF": "", "CANC": ""}
+    log_event("bookings", events.CREATED, dict(ann))
+    assert [row["NAME"] for row in get_data("bookings")] == [
+        "Bob", "Bob", "Ann"]
+    # another terminal compacts, the marker is not appended yet
+    backend.append_rows("bookings", [list(ann.values())])
+    cache["bookings"].update(time=float("-inf"), revision=None)
+    assert [row["NAME"] for row in get_data("bookings")] == [
+        "Bob", "Bob", "Ann"]
+    assert cached("events") is None
+    backend.append_rows("events", [events.marker(2)])
+    assert [row["NAME"] for row in get_data("bookings")] == [
+        "Bob", "Bob", "Ann"]
+    assert compact("bookings") == 0
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+@patch("builtins.print")
+def test_compact_meanwhile(*args):
+    """
+    Tests compact() does not write rows if others have
+    appended rows meanwhile.
+    """
+    (_, _, backend, *_) = args
+    log_event("bookings", events.CREATED,
+              {"DATE": "14-10-2022", "NAME": "Ann", "PEOPLE": 2})
+    real = backend.get_tail
+    with patch.object(backend, "get_tail",
+                      side_effect=lambda *args: (real(*args)[0], [])):
+        assert compact("bookings") is None
+    assert len(backend.get_values("bookings")) == 3
+    assert compact("bookings") == 1
+    assert len(backend.get_values("bookings")) == 4
+
+
+@patch("booking_sys.spreadsheet.REVISION_EVERY", 0)
+@patch('booking_sys.spreadsheet.time.monotonic')
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(BACKEND_PATH, new_callable=events_backend)
+@patch(CACHE_PATH, new_callable=dict)
+def test_compacted_by_others(*args):
+    """
+    Tests a compaction seen in synced events makes the worksheet
+    fetched fully, with cells written back by others.
+    """
+    (cache, backend, _, mock_time) = args
+    mock_time.return_value = 0
+    assert get_data("bookings")[0]["CONF"] == ""
+    # another terminal confirms a booking and compacts
+    backend.update_cells("bookings", [(2, 6, "yes")])
+    backend.append_rows("events", [
+        events.new_event(events.CONFIRMED, {"NAME": "Bob",
+                                            "DATE": "10-10-2022"},
+                         {"CONF": "yes"}),
+        events.marker(2)])
+    mock_time.return_value = 100
+    assert get_data("bookings")[0]["CONF"] == "yes"
+    assert cache["bookings"]["loaded"] == 100
@@ -2,6 +2,11 @@ from unittest.mock import patch, call
 from booking_sys.staff import (create_staff, get_name, staff_menu,
                                staff_info_menu, edit_staff_menu,
                                print_staff_info)
+from booking_sys.backends import MemoryBackend
+
+
+# worksheet with the header only, read by create_staff()
+HEADERS = MemoryBackend({"staff": [["NAME", "PASSWORD", "CONTACT"]]})
 
 
 @patch("booking_sys.staff.get_name")
@@ -92,6 +97,8 @@ def test_create_staff_phone_returns_q(*args):
     mock_phone.assert_called()
 
 
+@patch("booking_sys.spreadsheet.SCHEMAS", {})
+@patch("booking_sys.spreadsheet.BACKEND", HEADERS)
 @patch("booking_sys.staff.update_worksheet", autospec=True)
 @patch("booking_sys.staff.new_phone")
 @patch("getpass.getpass")
@@ -2,9 +2,10 @@
 Tests for stats module.
 """
 import os
-from unittest.mock import patch
+from unittest.mock import patch, mock_open
 import pytest
-from booking_sys.stats import data_for_stats, calculate_age
+from booking_sys.stats import (data_for_stats, calculate_age, upload,
+                               customers_stats)
 from run import cleanup
 
 
@@ -29,7 +30,7 @@ def test_calculate_age(a, expected):
     assert calculate_age(a) == expected
 
 
-@patch("booking_sys.stats.get_worksheet")
+@patch("booking_sys.stats.read_with_revision")
 def test_data_for_stats(*args):
     """
     Tests if a file with required data is created.
@@ -38,7 +39,7 @@ def test_data_for_stats(*args):
     test_data = [['NAME', 'PHONE', 'EMAIL', 'BIRTHDATE'],
                  ['Bob', '003543243422', "q@w.er", "10-10-1976"],
                  ['Kelly', '+44 6734657788', "t@y.ui", "10-11-1987"]]
-    mock_worksheet.return_value = test_data
+    mock_worksheet.return_value = (test_data, None)
     data_for_stats()
     if os.path.exists("stats.csv"):
         with open("stats.csv", 'r') as file:
@@ -46,3 +47,72 @@ def test_data_for_stats(*args):
             assert 'NAME,PHONE,EMAIL,BIRTHDATE\n' in content
     assert os.path.exists("stats.csv") is True
     cleanup()
+
+
+@patch("booking_sys.stats.REPORTS", new_callable=dict)
+@patch("booking_sys.stats.revision", return_value="7")
+@patch("booking_sys.stats.read_with_revision")
+def test_data_for_stats_unchanged(*args):
+    """
+    Tests the file is not made again while the spreadsheet
+    has not changed, but is if it was made from older rows.
+    """
+    (mock_worksheet, mock_revision, _) = args
+    revisions = iter(["6", "7", "7"])
+    mock_worksheet.side_effect = lambda name: (
+        [['NAME', 'PHONE', 'EMAIL', 'BD'],
+         ['Bob', '0035', "q@w.er", "10-10-1976"]], next(revisions))
+    data_for_stats()
+    data_for_stats()
+    assert mock_worksheet.call_count == 2
+    data_for_stats()
+    assert mock_worksheet.call_count == 2
+    mock_revision.return_value = "8"
+    data_for_stats()
+    assert mock_worksheet.call_count == 3
+    cleanup()
+
+
+@patch("booking_sys.stats.REPORTS", new_callable=dict)
+@patch("booking_sys.stats.revision", return_value="7")
+@patch("booking_sys.stats.read_with_revision")
+@patch("booking_sys.stats.upload")
+def test_customers_stats_not_uploaded(*args):
+    """
+    Tests a report which was not uploaded is made again.
+    """
+    (mock_upload, mock_worksheet, _, reports) = args
+    mock_worksheet.return_value = ([['NAME', 'PHONE', 'EMAIL', 'BD',
+                                     'NUM OF BOOKINGS', 'CANCELLED'],
+                                    ['Bob', '0035', "q@w.er", "10-10-1976",
+                                     '3', '1']], "7")
+    mock_upload.return_value = None
+    data_for_stats()
+    customers_stats()
+    assert "stats.pdf" not in reports
+    mock_upload.return_value = "abc"
+    customers_stats()
+    assert reports["stats.pdf"] == "7"
+    customers_stats()
+    assert mock_upload.call_count == 2
+    cleanup()
+
+
+@patch("builtins.open", mock_open(read_data=b"%PDF"))
+@patch("booking_sys.stats.get_credentials")
+@patch("booking_sys.stats.shared_session")
+def test_upload(*args):
+    """
+    Tests upload() sends the file and its metadata in one
+    request over the shared session.
+    """
+    (mock_session, *_) = args
+    post = mock_session.return_value.post
+    post.return_value.json.return_value = {"id": "abc"}
+    assert upload("stats.pdf", "folder") == "abc"
+    post.assert_called_once()
+    (body, headers) = (post.call_args.kwargs["data"],
+                       post.call_args.kwargs["headers"])
+    assert b'"parents": ["folder"]' in body
+    assert b"%PDF" in body
+    assert headers["Content-Type"].startswith("multipart/related")
@@ -0,0 +1,142 @@
+"""
+Tests for throttle module.
+"""
+from unittest.mock import patch, MagicMock
+import pytest
+import requests
+import urllib3
+from gspread import exceptions
+from booking_sys.throttle import (TokenBucket, is_retryable, backoff,
+                                  throttled, counters, not_sent)
+
+
+def api_error(status):
+    """
+    Creates gspread APIError with a given HTTP status.
+    """
+    response = MagicMock(status_code=status)
+    response.json.return_value = {"error": {"code": status}}
+    return exceptions.APIError(response)
+
+
+@patch("booking_sys.throttle.time.sleep")
+@patch("booking_sys.throttle.time.monotonic", return_value=100)
+def test_token_bucket(*args):
+    """
+    Tests TokenBucket allows a burst and then waits for refill.
+    """
+    (mock_time, mock_sleep) = args
+    bucket = TokenBucket(rate=2, capacity=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0.5
+    mock_sleep.assert_called_once_with(0.5)
+    mock_time.return_value = 102
+    assert bucket.acquire() == 0
+
+
+def test_is_retryable():
+    """
+    Tests which errors are worth retrying.
+    """
+    assert is_retryable(api_error(429)) is True
+    assert is_retryable(api_error(503)) is True
+    assert is_retryable(api_error(400)) is False
+    assert is_retryable(requests.exceptions.ConnectionError()) is True
+    assert is_retryable(exceptions.WorksheetNotFound()) is False
+
+
+def test_is_retryable_not_idempotent():
+    """
+    Tests requests which are not idempotent are only retried
+    when they were surely not carried out.
+    """
+    reason = urllib3.exceptions.NewConnectionError(None, "refused")
+    refused = requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "/", reason))
+    assert is_retryable(api_error(429), idempotent=False) is True
+    assert is_retryable(api_error(503), idempotent=False) is False
+    assert is_retryable(requests.exceptions.ReadTimeout(),
+                        idempotent=False) is False
+    assert is_retryable(requests.exceptions.ConnectionError(),
+                        idempotent=False) is False
+    assert is_retryable(requests.exceptions.ConnectTimeout(),
+                        idempotent=False) is True
+    assert is_retryable(refused, idempotent=False) is True
+    assert not_sent(refused) is True
+
+
+@patch("booking_sys.throttle.random.uniform", side_effect=lambda a, b: b)
+def test_backoff(_):
+    """
+    Tests backoff grows exponentially up to MAX_BACKOFF.
+    """
+    assert [backoff(n) for n in range(7)] == [1, 2, 4, 8, 16, 32, 32]
+
+
+@patch("booking_sys.throttle.time.sleep")
+@patch("booking_sys.throttle.BUCKET", TokenBucket(rate=1000, capacity=1000))
+def test_throttled_retries(_):
+    """
+    Tests throttled retries quota errors and counts retries.
+    """
+    func = MagicMock(side_effect=[api_error(429), api_error(500), "data"])
+    before = counters()
+    assert throttled(func)("bookings") == "data"
+    assert func.call_count == 3
+    assert counters()["retried"] - before["retried"] == 2
+    assert counters()["calls"] - before["calls"] == 3
+
+
+@patch("booking_sys.throttle.time.sleep")
+@patch("booking_sys.throttle.RETRIES", 2)
+@patch("booking_sys.throttle.BUCKET", TokenBucket(rate=1000, capacity=1000))
+def test_throttled_gives_up(_):
+    """
+    Tests throttled raises at once for other errors and
+    after RETRIES for temporary ones.
+    """
+    func = MagicMock(side_effect=api_error(400))
+    with pytest.raises(exceptions.APIError):
+        throttled(func)()
+    func.assert_called_once()
+
+    before = counters()
+    func = MagicMock(side_effect=api_error(429))
+    with pytest.raises(exceptions.APIError):
+        throttled(func)()
+    assert func.call_count == 3
+    assert counters()["failed"] - before["failed"] == 1
+
+
+@patch("booking_sys.throttle.time.sleep")
+@patch("booking_sys.throttle.BUCKET", TokenBucket(rate=1000, capacity=1000))
+def test_throttled_not_idempotent(_):
+    """
+    Tests throttled(idempotent=False) retries quota errors and
+    raises server errors at once.
+    """
+    func = MagicMock(side_effect=[api_error(429), "data"])
+    assert throttled(idempotent=False)(func)() == "data"
+    func = MagicMock(side_effect=[api_error(500), "data"])
+    with pytest.raises(exceptions.APIError):
+        throttled(idempotent=False)(func)()
+    assert func.call_count == 1
+
+
+@patch("booking_sys.throttle.time.sleep")
+@patch("booking_sys.throttle.RETRIES", 2)
+@patch("booking_sys.throttle.BUCKET", TokenBucket(rate=1000, capacity=1000))
+def test_throttled_nested(_):
+    """
+    Tests a throttled call made by another one is retried
+    only by the outer call.
+    """
+    inner = MagicMock(side_effect=api_error(503))
+    outer = MagicMock(side_effect=lambda: throttled(inner)())
+    before = counters()
+    with pytest.raises(exceptions.APIError):
+        throttled(outer)()
+    assert inner.call_count == 3
+    assert counters()["calls"] - before["calls"] == 3
+    assert counters()["failed"] - before["failed"] == 1
@@ -0,0 +1,215 @@
+"""
+Tests for transfer module.
+"""
+import csv
+import os
+import tempfile
+from unittest.mock import patch
+import pytest
+from gspread import exceptions
+from booking_sys.backends import MemoryBackend
+from booking_sys.spreadsheet import get_data, log_event
+from booking_sys import events
+from booking_sys.transfer import import_csv, export_csv, check_row, command
+
+
+BACKEND_PATH = 'booking_sys.spreadsheet.BACKEND'
+CACHE_PATH = 'booking_sys.spreadsheet.CACHE'
+SCHEMAS_PATH = 'booking_sys.spreadsheet.SCHEMAS'
+JOURNAL_PATH = 'booking_sys.journal.JOURNAL_FILE'
+JOURNAL_FILE = os.path.join(tempfile.gettempdir(), "test_journal.jsonl")
+CSV_FILE = os.path.join(tempfile.gettempdir(), "test_transfer.csv")
+HEADER = ['DATE', 'TIME', 'NAME', 'PEOPLE', 'CREATED', 'CONF', 'CANC']
+LINES = [['NAME', 'DATE', 'TIME', 'PEOPLE'],
+         ['Bob', '10/10/2022', '20:00', '2'],
+         ['Ann', '31-02-2022', '19:00', '3'],
+         ['Tom', '11-10-2022', '19:00', 'two'],
+         ['Sue', '12.10.2022', '18:30', '4']]
+
+
+def backend():
+    """
+    Creates an in-memory backend with an empty bookings worksheet.
+    """
+    return MemoryBackend({"bookings": [HEADER]})
+
+
+def write_csv(lines):
+    """
+    Writes lines(list of lists) to the test CSV file.
+    """
+    with open(CSV_FILE, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerows(lines)
+
+
+@pytest.fixture(autouse=True)
+def remove_files():
+    """
+    Removes files left by a test.
+    """
+    yield
+    for path in (CSV_FILE, f"{CSV_FILE}.done", JOURNAL_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=backend)
+def test_check_row(*args):
+    """
+    Tests check_row() puts values in the order of columns,
+    normalizes dates and rejects invalid values.
+    """
+    header = LINES[0]
+    assert check_row("bookings", header, LINES[1]) == [
+        '10-10-2022', '20:00', 'Bob', '2', '', '', '']
+    assert check_row("bookings", header, LINES[2]) is None
+    assert check_row("bookings", header, LINES[3]) is None
+    assert check_row("bookings", header, ['', '', '', '']) is None
+    assert check_row("bookings", header, LINES[1] + ['extra']) is None
+
+
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+@patch("builtins.print")
+@patch(CACHE_PATH, new_callable=dict)
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=backend)
+def test_import_csv(*args):
+    """
+    Tests import_csv() appends valid rows in chunks and
+    reports numbers of invalid lines.
+    """
+    (mock_backend, *_) = args
+    write_csv(LINES)
+    with patch.object(mock_backend, "append_rows",
+                      wraps=mock_backend.append_rows) as mock_append:
+        result = import_csv("bookings", CSV_FILE, chunk=1)
+    assert result == {"imported": 2, "rejected": [3, 4], "error": None}
+    assert mock_append.call_count == 2
+    assert [row[2] for row in mock_backend.get_values("bookings")] == [
+        'NAME', 'Bob', 'Sue']
+    assert not os.path.exists(f"{CSV_FILE}.done")
+
+
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+@patch("builtins.print")
+@patch(CACHE_PATH, new_callable=dict)
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=backend)
+def test_import_csv_resume(*args):
+    """
+    Tests an import stopped by an error continues after
+    the last written chunk.
+    """
+    (mock_backend, *_) = args
+    write_csv(LINES[:2] + LINES[4:] + [['Kim', '13-10-2022', '18:00', '2']])
+    with patch.object(mock_backend, "append_rows",
+                      side_effect=[2, exceptions.GSpreadException("quota")]):
+        result = import_csv("bookings", CSV_FILE, chunk=2)
+    assert result["error"] == "quota"
+    with patch.object(mock_backend, "append_rows",
+                      wraps=mock_backend.append_rows) as mock_append:
+        result = import_csv("bookings", CSV_FILE, chunk=2)
+    mock_append.assert_called_once_with(
+        "bookings", [['13-10-2022', '18:00', 'Kim', '2', '', '', '']])
+    assert result == {"imported": 1, "rejected": [], "error": None}
+
+
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+@patch("builtins.print")
+@patch(CACHE_PATH, new_callable=dict)
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=backend)
+def test_import_csv_written_before_error(*args):
+    """
+    Tests rows appended by a request which then failed are
+    not appended again when the import continues.
+    """
+    (mock_backend, *_) = args
+    write_csv(LINES[:2] + LINES[4:] + [['Kim', '13-10-2022', '18:00', '2']])
+    append_rows = mock_backend.append_rows
+
+    def written_then_error(worksheet, rows):
+        append_rows(worksheet, rows)
+        raise exceptions.GSpreadException("timeout")
+
+    with patch.object(mock_backend, "append_rows",
+                      side_effect=written_then_error):
+        result = import_csv("bookings", CSV_FILE, chunk=2)
+    assert result["error"] == "timeout"
+    with patch.object(mock_backend, "append_rows",
+                      wraps=append_rows) as mock_append:
+        result = import_csv("bookings", CSV_FILE, chunk=2)
+    mock_append.assert_called_once_with(
+        "bookings", [['13-10-2022', '18:00', 'Kim', '2', '', '', '']])
+    assert result == {"imported": 3, "rejected": [], "error": None}
+    assert [row[2] for row in mock_backend.get_values("bookings")] == [
+        'NAME', 'Bob', 'Sue', 'Kim']
+
+
+@patch(JOURNAL_PATH, JOURNAL_FILE)
+@patch("builtins.print")
+@patch(CACHE_PATH, new_callable=dict)
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=backend)
+def test_import_unknown_column(*args):
+    """
+    Tests a header with an unknown column stops the import
+    before anything is written.
+    """
+    write_csv([['NAME', 'AGE'], ['Bob', '30']])
+    with pytest.raises(KeyError):
+        import_csv("bookings", CSV_FILE)
+    assert command(["import", "bookings", CSV_FILE]) == 1
+    assert args[0].get_values("bookings") == [HEADER]
+
+
+@patch(BACKEND_PATH, new_callable=backend)
+def test_export_csv(mock_backend):
+    """
+    Tests export_csv() writes all rows, fetched in pages.
+    """
+    rows = [[f'1{num}-10-2022', '20:00', f'Bob{num}', '2', 'Kelly', '', '']
+            for num in range(5)]
+    mock_backend.append_rows("bookings", rows)
+    with patch.object(mock_backend, "get_range",
+                      wraps=mock_backend.get_range) as mock_range:
+        assert export_csv("bookings", CSV_FILE, page=4) == 5
+    assert mock_range.call_count == 2
+    with open(CSV_FILE, newline="", encoding="utf-8") as file:
+        assert list(csv.reader(file)) == [HEADER] + rows
+
+
+@patch(SCHEMAS_PATH, new_callable=dict)
+@patch("booking_sys.spreadsheet.LOGS", new_callable=dict)
+@patch(CACHE_PATH, new_callable=dict)
+@patch(BACKEND_PATH, new_callable=lambda: MemoryBackend(
+    {"bookings": [HEADER, ['10-10-2022', '20:00', 'Bob', '2', 'Kelly',
+                           '', '']],
+     "events": [list(events.COLUMNS)]}))
+def test_export_csv_events(*args):
+    """
+    Tests export_csv() writes rows with logged events applied.
+    """
+    (mock_backend, *_) = args
+    (booking, ) = get_data("bookings")
+    log_event("bookings", events.CANCELLED, booking, {"CANC": "yes"})
+    log_event("bookings", events.CREATED,
+              {"DATE": "11-10-2022", "TIME": "19:00", "NAME": "Ann",
+               "PEOPLE": "3", "CREATED": "Kelly"})
+    assert export_csv("bookings", CSV_FILE, page=4) == 2
+    with open(CSV_FILE, newline="", encoding="utf-8") as file:
+        assert list(csv.reader(file)) == [
+            HEADER, ['10-10-2022', '20:00', 'Bob', '2', 'Kelly', '', 'yes'],
+            ['11-10-2022', '19:00', 'Ann', '3', 'Kelly', '', '']]
+    assert mock_backend.get_values("bookings")[1][6] == "yes"
+
+
+@patch("builtins.print")
+def test_command_usage(mock_print):
+    """
+    Tests command() prints usage for wrong arguments.
+    """
+    assert command(["import", "nothing", CSV_FILE]) == 2
+    assert command(["export"]) == 2
+    assert mock_print.call_count == 2
@@ -4,7 +4,8 @@ Tests for validation module.
 from datetime import date
 import pytest
 from booking_sys.validation import (to_date, convert_date, date_input,
-                                    birthdate, time_input, email, phone_num)
+                                    birthdate, time_input, email, phone_num,
+                                    day_number, minute_of_day)
 
 
 @pytest.mark.parametrize("a, expected",
@@ -39,6 +40,34 @@ def test_to_date_data_formats(a, expected):
     assert to_date(a) == expected
 
 
+@pytest.mark.parametrize("a, expected",
+                         [("10-10-2022", date(2022, 10, 10).toordinal()),
+                          ("1-10-2022", date(2022, 10, 1).toordinal()),
+                          ("30-02-2022", None),
+                          ("10/10/2022", None),
+                          (["10-10-2022"], None),
+                          (None, None)])
+def test_day_number(a, expected):
+    """
+    Tests day_number() on valid and invalid dates and data types.
+    """
+    assert day_number(a) == expected
+    assert day_number(a) == expected  # remembered
+
+
+@pytest.mark.parametrize("a, expected",
+                         [("00:00", 0),
+                          ("20:30", 1230),
+                          ("9:05", 545),
+                          ("24:00", None),
+                          (1230, None)])
+def test_minute_of_day(a, expected):
+    """
+    Tests minute_of_day() on valid and invalid times.
+    """
+    assert minute_of_day(a) == expected
+
+
 @pytest.mark.parametrize("a, expected",
                          [("10/10/2022", "10-10-2022"),
                           ("10.10.2022", "10-10-2022"),
@@ -0,0 +1,152 @@
+"""
+Client-side rate limiting and retries of Google Sheets API requests.
+"""
+import random
+import threading
+import time
+from functools import wraps
+import gspread
+import requests
+import urllib3
+
+
+# Sheets API allows 60 requests per minute per user
+QUOTA_PER_MINUTE = 60
+# requests which may be sent at once before throttling starts
+BURST = 10
+# retries of a failed request before the error reaches the user
+RETRIES = 5
+# seconds, the wait before n-th retry is random up to BACKOFF * 2**n
+BACKOFF = 1
+MAX_BACKOFF = 32
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# statuses retried for requests which are not idempotent,
+# other errors may come after the request was carried out
+REJECTED_STATUSES = (429, )
+COUNTERS = {"calls": 0, "throttled": 0, "retried": 0, "failed": 0}
+# "running" is True inside a throttled call of a thread, see throttled()
+ACTIVE = threading.local()
+
+
+class TokenBucket:
+    """
+    Allows up to capacity requests at once and refills
+    at rate requests per second.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waits until there is one if needed.
+        Returns seconds waited.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = 0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+BUCKET = TokenBucket(QUOTA_PER_MINUTE / 60, BURST)
+
+
+def is_retryable(error, idempotent=True):
+    """
+    Checks if a request failed because of quota or a temporary
+    server or network problem. A request which is not idempotent
+    is only retried if it was surely not carried out: it was
+    rejected by quota or it was never sent. Returns boolean.
+    """
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in (
+            RETRY_STATUSES if idempotent else REJECTED_STATUSES)
+    if idempotent:
+        return isinstance(error, (requests.exceptions.ConnectionError,
+                                  requests.exceptions.Timeout))
+    return not_sent(error)
+
+
+def not_sent(error):
+    """
+    Checks if a request failed while connecting, before
+    it was sent. Returns boolean.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def backoff(attempt):
+    """
+    Returns seconds to wait before a retry, random
+    within an exponentially growing limit.
+    """
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF * 2 ** attempt))
+
+
+def throttled(func=None, idempotent=True):
+    """
+    A decorator for methods sending an API request. Keeps
+    requests within quota and retries temporary failures.
+    The last error is raised when retries run out. Used as
+    @throttled(idempotent=False) for requests which must not
+    be carried out twice, see is_retryable(). A throttled call
+    made by another one is not throttled or retried itself,
+    the outer call is retried instead, so retries do not multiply.
+    """
+    if func is None:
+        return lambda func: throttled(func, idempotent)
+
+    @wraps(func)
+    def wrap_func(*args, **kwargs):
+        if getattr(ACTIVE, "running", False):
+            return func(*args, **kwargs)
+        ACTIVE.running = True
+        try:
+            return _retry(func, idempotent, *args, **kwargs)
+        finally:
+            ACTIVE.running = False
+    return wrap_func
+
+
+def _retry(func, idempotent, *args, **kwargs):
+    """
+    Calls func within quota and retries temporary failures,
+    see throttled(). Returns the result of func.
+    """
+    attempt = 0
+    while True:
+        COUNTERS["calls"] += 1
+        if BUCKET.acquire():
+            COUNTERS["throttled"] += 1
+        try:
+            return func(*args, **kwargs)
+        except (gspread.exceptions.APIError,
+                requests.exceptions.RequestException) as error:
+            if not is_retryable(error, idempotent) or attempt >= RETRIES:
+                COUNTERS["failed"] += 1
+                raise
+        COUNTERS["retried"] += 1
+        time.sleep(backoff(attempt))
+        attempt += 1
+
+
+def counters():
+    """
+    Returns a copy of request counters: calls, throttled,
+    retried and failed.
+    """
+    return dict(COUNTERS)
@@ -0,0 +1,251 @@
+"""
+Bulk import and export of worksheets as CSV files.
+
+    python run.py import <worksheet> <file>
+    python run.py export <worksheet> <file>
+
+Import reads the file row by row, checks values like the menus
+do and appends valid rows in large chunks, one request each.
+The number of imported lines is kept in <file>.done, so an import
+stopped by an error continues after the last written chunk when
+it is started again. The chunk being written when it stopped may
+have been appended anyway, its rows already in the worksheet are
+not appended again. Export writes a worksheet page by page,
+so the whole worksheet is never held in memory. Logged events
+are written back to the worksheet first, see spreadsheet.compact().
+"""
+import csv
+import os
+import gspread
+from booking_sys import spreadsheet
+from booking_sys import journal
+from booking_sys import validation as valid
+
+
+# rows appended in one request
+CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK", "500"))
+# rows fetched in one request
+PAGE_SIZE = int(os.environ.get("EXPORT_PAGE", "1000"))
+USAGE = ("usage: python run.py import <worksheet> <file>\n"
+         "       python run.py export <worksheet> <file>")
+
+
+def _date(value):
+    """
+    Takes in a date(str) with any separator. Returns it
+    in dd-mm-yyyy format or False if it is not a date.
+    Dates from the past are valid, unlike in new bookings.
+    """
+    day = valid.convert_date(value)
+    return day if valid.to_date(day) else False
+
+
+def _checked(check):
+    """
+    Takes in a validation function returning boolean. Returns
+    a function returning the value if it is valid or False.
+    """
+    return lambda value: value if check(value) else False
+
+
+# functions returning a valid value(str) or False, by column
+CHECKS = {
+    "staff": {"CONTACT": _checked(valid.phone_num)},
+    "customers": {"PHONE": _checked(valid.phone_num),
+                  "EMAIL": _checked(valid.email),
+                  "BD": valid.birthdate},
+    "bookings": {"DATE": _date, "TIME": _checked(valid.time_input)},
+}
+
+
+def check_row(worksheet, header, line):
+    """
+    Takes in a header and a line(lists of str) of a CSV file.
+    Returns the row(list) in the order of worksheet columns
+    or None if a value is not valid.
+    """
+    if len(line) > len(header) or not any(line):
+        return None
+    values = dict(zip(header, line))
+    for (name, check) in CHECKS.get(worksheet, {}).items():
+        if name in values:
+            value = check(values[name])
+            if value is False:
+                return None
+            values[name] = value
+    if not values.get("NAME"):
+        return None
+    try:
+        return spreadsheet.new_row(worksheet, values)
+    except ValueError:
+        return None
+
+
+def _read_done(path):
+    """
+    Returns the number of lines of a CSV file imported
+    by an earlier, stopped import.
+    """
+    try:
+        with open(f"{path}.done", encoding="utf-8") as file:
+            return int(file.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_done(path, done):
+    """
+    Stores the number of imported lines of a CSV file.
+    """
+    with open(f"{path}.done", "w", encoding="utf-8") as file:
+        file.write(str(done))
+
+
+def _as_key(row):
+    """
+    Returns a row(list) as a tuple of str without empty
+    cells at the end, to compare written and read rows.
+    """
+    row = [str(value) for value in row]
+    while row and row[-1] == "":
+        row.pop()
+    return tuple(row)
+
+
+def _not_written(worksheet, rows):
+    """
+    Returns rows(list of lists) which are not in the worksheet.
+    """
+    written = {_as_key(row)
+               for row in spreadsheet.BACKEND.get_values(worksheet)}
+    return [row for row in rows if _as_key(row) not in written]
+
+
+def import_csv(worksheet, path, chunk=CHUNK_SIZE):
+    """
+    Appends rows of a CSV file to a worksheet. The first line
+    of the file holds column names of the worksheet, in any
+    order. Invalid lines are skipped and reported. Returns
+    a dictionary: "imported" rows, "rejected" line numbers and
+    "error" - None or the error which stopped the import.
+    Raises KeyError if the header has an unknown column.
+    """
+    result = {"imported": 0, "rejected": [], "error": None}
+    if journal.has_pending() and spreadsheet.replay_journal() is None:
+        # imported rows must follow rows saved offline
+        result["error"] = "the journal can not be written yet"
+        return result
+    # an error may come after the last chunk was appended
+    resumed = os.path.exists(f"{path}.done")
+    done = _read_done(path)
+    with open(path, newline="", encoding="utf-8") as file:
+        lines = csv.reader(file)
+        header = [name.strip() for name in next(lines, [])]
+        columns = spreadsheet.schema(worksheet)["columns"]
+        unknown = [name for name in header if name not in columns]
+        if unknown:
+            raise KeyError(f"unknown columns: {', '.join(unknown)}")
+        _write_done(path, done)
+        rows = []
+        count = 0
+        for (count, line) in enumerate(lines, start=1):
+            if count <= done:
+                continue
+            row = check_row(worksheet, header, line)
+            if row is None:
+                result["rejected"].append(count + 1)  # line in the file
+            else:
+                rows.append(row)
+            if len(rows) >= chunk:
+                if not _append(worksheet, path, rows, count, result,
+                               resumed):
+                    return result
+                (rows, resumed) = ([], False)
+        if rows and not _append(worksheet, path, rows, count, result,
+                                resumed):
+            return result
+    if os.path.exists(f"{path}.done"):
+        os.remove(f"{path}.done")
+    return result
+
+
+def _append(worksheet, path, rows, done, result, resumed=False):
+    """
+    Appends a chunk of rows in one request and stores
+    the number of imported lines. The first chunk of a resumed
+    import is appended without rows already written. Returns
+    boolean.
+    """
+    try:
+        missing = _not_written(worksheet, rows) if resumed else rows
+        if missing:
+            spreadsheet.BACKEND.append_rows(worksheet, missing)
+    except spreadsheet.DB_ERRORS as error:
+        result["error"] = str(error)
+        return False
+    finally:
+        # others may read the worksheet meanwhile
+        spreadsheet.invalidate(worksheet)
+    _write_done(path, done)
+    result["imported"] += len(rows)
+    print(f"{worksheet}: {result['imported']} rows imported")
+    return True
+
+
+def export_csv(worksheet, path, page=PAGE_SIZE):
+    """
+    Writes all rows of a worksheet, the header first, to a CSV
+    file, fetching page rows at a time. Returns the number
+    of written rows without the header. Raises GSpreadException
+    if logged events can not be written back to the worksheet.
+    """
+    if not spreadsheet.write_back(worksheet):
+        raise gspread.exceptions.GSpreadException(
+            "logged events could not be written back, try again")
+    written = 0
+    first = 1
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        while True:
+            rows = spreadsheet.BACKEND.get_range(worksheet, first,
+                                                 first + page - 1)
+            writer.writerows(rows)
+            written += len(rows)
+            if len(rows) < page:
+                break
+            first += page
+    return max(written - 1, 0)
+
+
+def command(args):
+    """
+    Runs import or export. Takes in command line arguments
+    (list of str): command, worksheet and file. Returns
+    the exit status(int).
+    """
+    if (len(args) != 3 or args[0] not in ("import", "export")
+            or args[1] not in spreadsheet.WORKSHEETS):
+        print(USAGE)
+        return 2
+    (name, worksheet, path) = args
+    try:
+        if name == "export":
+            print(f"{worksheet}: {export_csv(worksheet, path)} "
+                  f"rows exported to {path}")
+            return 0
+        result = import_csv(worksheet, path)
+    except (OSError, KeyError, csv.Error) as error:
+        print(f"{name} failed: {error}")
+        return 1
+    except spreadsheet.DB_ERRORS as error:
+        print(f"{name} failed, database is not available: {error}")
+        return 1
+    if result["rejected"]:
+        lines = ", ".join(map(str, result["rejected"]))
+        print(f"invalid lines skipped: {lines}")
+    if result["error"]:
+        print(f"import stopped: {result['error']}\n"
+              "Run the same command again to continue.")
+        return 1
+    print(f"{worksheet}: {result['imported']} rows imported from {path}")
+    return 0
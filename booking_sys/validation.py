@@ -3,6 +3,11 @@ Functions for validating user input.
 """
 import re
 from datetime import datetime, date
+from functools import lru_cache
+
+
+# distinct dates and times remembered by day_number and minute_of_day
+PARSED_CACHE = 8192
 
 
 def to_date(string):
@@ -15,6 +20,46 @@ def to_date(string):
         return False
 
 
+def day_number(string):
+    """
+    Takes in a date(str) in dd-mm-yyyy format. Returns its ordinal
+    number(int), which compares in date order, or None if it
+    is not a valid date. Every string is parsed once, so filters
+    and sorts over many rows with the same dates stay cheap.
+    """
+    if not isinstance(string, str):
+        return None
+    return _day_number(string)
+
+
+@lru_cache(maxsize=PARSED_CACHE)
+def _day_number(string):
+    try:
+        return datetime.strptime(string, '%d-%m-%Y').toordinal()
+    except ValueError:
+        return None
+
+
+def minute_of_day(string):
+    """
+    Takes in a time(str) in hh:mm format. Returns minutes since
+    midnight(int) or None if it is not a valid time. Every string
+    is parsed once.
+    """
+    if not isinstance(string, str):
+        return None
+    return _minute_of_day(string)
+
+
+@lru_cache(maxsize=PARSED_CACHE)
+def _minute_of_day(string):
+    try:
+        parsed = datetime.strptime(string, '%H:%M')
+    except ValueError:
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
 def convert_date(new_date):
     """
     Converts a date with various date separators
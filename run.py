@@ -3,7 +3,12 @@ Main module.
 """
 import sys
 import os
-from booking_sys.spreadsheet import get_data
+from booking_sys.spreadsheet import (connect_in_background, request_stats,
+                                     save_snapshot)
+from booking_sys import journal
+from booking_sys import mirror
+from booking_sys import replica
+from booking_sys import transfer
 from booking_sys import booking
 from booking_sys import customer
 from booking_sys import auth
@@ -38,15 +43,39 @@ def start_menu(user):
 
 def cleanup():
     """
-    Deletes not needed files.
+    Deletes not needed files, stops the replica and mirror
+    threads, saves data for the next session.
     """
+    replica.stop()
+    mirror.stop()
+    save_snapshot()
     files = ['stats.pdf', 'stats.csv']
     for file in files:
         if os.path.exists(file):
             os.remove(file)
 
 
+def print_status():
+    """
+    Prints the state of the local journal, of the copy
+    to the sheet, of the replica thread and request counters.
+    """
+    for (name, value) in journal.status().items():
+        print(f"{name}: {value}")
+    for (name, value) in mirror.status().items():
+        print(f"{name}: {value}")
+    for (name, value) in replica.status().items():
+        print(f"replica {name}: {value}")
+    for (name, value) in request_stats().items():
+        print(f"{name}: {value}")
+
+
 if __name__ == '__main__':
-    all_staff = get_data("staff")
-    the_user = auth.staff_login(all_staff)
+    if sys.argv[1:] == ["status"]:
+        print_status()
+        sys.exit()
+    if sys.argv[1:2] in (["import"], ["export"]):
+        sys.exit(transfer.command(sys.argv[1:]))
+    connect_in_background()
+    the_user = auth.staff_login()
     start_menu(the_user)